@@ -5,152 +5,269 @@ import os
 import sys
 import time
 import threading
-import socket
-import re
-
-def check_online_status():
-    """Check internet connectivity by attempting to connect to a known server."""
-    try:
-        # Attempt to connect to Google's public DNS server
-        socket.create_connection(("8.8.8.8", 53), timeout=3)
-        return True
-    except OSError:
-        return False
-
-# Utility to run tasks from dynamically configured programs
-def run_task(stdscr, task_name, script_path, config_file):
-    try:
-        command = ["sudo python3", script_path]
-        if hasattr(script_path, 'launch_args') and script_path.launch_args:
-            command.extend(script_path.launch_args.split())
-        
-        # Launch the program in a new terminal
-        subprocess.Popen([
-            "gnome-terminal", "--", "bash", "-c",
-            f"{' '.join(command)}; echo 'Press Enter to close...'; read"
-        ])
-    except Exception as e:
-        stdscr.addstr(f"Error running {task_name}: {e}\nPress any key to return to the menu.\n")
-    stdscr.getch()
+import locale
+
+# Modules shared with the scripts in programs/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs"))
+from jobs import JobRunner, format_rss
+from warm import WarmPool
+from registry import ProgramRegistry
+from scheduler import Scheduler, QueuedJob, read_capacity
+from telemetry import TelemetryStore
+from appconfig import load_config, load_settings
+from bannercache import read_banner_cache
+from tracing import PROFILE_SIGNAL, read_latest_snapshot
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+ASCII_SPARK_CHARS = "_.-~=*#@"
+HISTORY_WINDOWS = [("1 hour", 3600), ("6 hours", 6 * 3600), ("24 hours", 24 * 3600), ("7 days", 7 * 24 * 3600)]
+
+def sparkline(values, chars=SPARK_CHARS):
+    """Renders a list of numbers (None for gaps) as one character per value."""
+    present = [v for v in values if v is not None]
+    if not present:
+        return " " * len(values)
+    low, high = min(present), max(present)
+    span = (high - low) or 1
+    return "".join(
+        " " if v is None else chars[min(len(chars) - 1, int((v - low) / span * (len(chars) - 1) + 0.5))]
+        for v in values
+    )
+
+def add_clipped(stdscr, y, text, style=0, x=0):
+    """addstr that clips to the window instead of raising at the edges."""
+    height, width = stdscr.getmaxyx()
+    if 0 <= y < height and x < width - 1:
+        stdscr.addstr(y, x, text[:width - 1 - x], style)
 
 class MFProgram:
-    def __init__(self, name, script_path, launch_args=None):
+    def __init__(self, name, script_path, launch_args=None, resources=None, gpu_heavy=False, nice=0, affinity="auto"):
         self.name = name
         self.script_path = script_path
         self.launch_args = launch_args or ""
+        self.resources = resources or {}
+        self.gpu_heavy = gpu_heavy
+        self.nice = nice
+        self.affinity = affinity
+        # Flagged when the menu is built so a dead entry is visible before it is picked
+        self.missing = bool(script_path) and not os.path.exists(script_path)
 
 class MFMenu:
     def __init__(self):
-        self.ping_times = []  # Stores ping times for calculating average
         self.menus = {"Main": [MFProgram("Settings", None)]}
         self.current_menu = "Main"
         self.config_file = "config.json"
-        self.banner = self.load_banner()
+        self.registry = ProgramRegistry("programs")
+        self.load_banner()
         self.load_programs()
-        self.online_status = check_online_status()
+        self.online_status = None  # Unknown until the prober thread's first round
         self.refresh_interval = self.load_refresh_interval()
+        self.ping_config = self.read_config().get("ping", {})
+        self.prober = None  # Built by the status thread, see update_online_status
+        self.telemetry = self.load_telemetry()
+        self.warm_pool = self.load_warm_pool()
+        self.jobs = JobRunner(self.warm_pool)
+        self.scheduler = self.load_scheduler()
         self.stop_refresh = False
-        self.last_ping_update = 0
+        self.invalidate_screen()
+
+    def invalidate_screen(self):
+        """Forces the next render to repaint everything, e.g. after another screen was shown."""
+        self._full_redraw = True
+        self._drawn_status = None
+        self._drawn_title = None
+        self._drawn_rows = []
+
+    def read_config(self):
+        """The parsed config file. It is parsed once and cached until the file changes."""
+        try:
+            return load_config(self.config_file)
+        except Exception as e:
+            print(f"Error loading configuration: {e}")
+            return {}
 
     def load_refresh_interval(self):
         """Load the refresh interval from the config file."""
+        return self.read_config().get("refresh_interval", 1)  # Default to 1 seconds
+
+    def load_prober(self):
+        """Build the latency prober from the ping settings in the config file."""
+        from latency import LatencyProber
+
+        ping_config = self.ping_config
+        targets = ping_config.get("targets")
+        if not isinstance(targets, list) or not targets or \
+                not all(isinstance(t, dict) and t.get("host") for t in targets):
+            if targets is not None:
+                print("Error: ping targets must be a non-empty list of hosts; using 8.8.8.8")
+            targets = [{"host": "8.8.8.8", "port": 53}]
+        history = ping_config.get("history", 60)
+        if isinstance(history, bool) or not isinstance(history, int) or history < 1:
+            print(f"Error: ping history must be a positive number of samples, not {history!r}; using 60")
+            history = 60
+        return LatencyProber(
+            targets,
+            interval=self.refresh_interval,
+            timeout=ping_config.get("timeout", 2),
+            history=history,
+            method=ping_config.get("method", "auto"),
+        )
+
+    def load_telemetry(self):
+        """Open the telemetry store under logs_path from settings.ini."""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, "r") as f:
-                    config_data = json.load(f)
-                    return config_data.get("refresh_interval", 1)  # Default to 1 seconds
+            logs_path = load_settings("settings.ini").get("Paths", "logs_path", fallback="Logs")
+            return TelemetryStore(logs_path)
         except Exception as e:
-            print(f"Error loading refresh interval: {e}")
-        return 5
+            print(f"Error opening telemetry store: {e}")
+            return None
 
     def load_programs(self):
         programs_dir = "programs"
         if not os.path.exists(programs_dir):
             os.makedirs(programs_dir)
 
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, "r") as f:
-                    config_data = json.load(f)
-                    self.menus.update({
-                        menu: [MFProgram(p["name"], p["script_path"]) for p in programs]
-                        for menu, programs in config_data.get("menus", {}).items()
-                    })
-        except Exception as e:
-            print(f"Error loading programs: {e}")
+        self.config_menus = self.read_config().get("menus", {})
+        self.build_menus()
+
+    def build_menus(self):
+        """
+        Merges the menus from the config file with the programs found by the
+        registry. Config entries keep their place; a program whose script no
+        menu entry points at is added under the menu path from its header.
+        """
+        plugins = self.registry.scan()
+        by_path = {os.path.normpath(path): info for path, info in plugins.items()}
+        menus = {"Main": []}
+        for menu, programs in self.config_menus.items():
+            menus[menu] = []
+            for p in programs:
+                info = by_path.pop(os.path.normpath(p["script_path"]), {}) if p["script_path"] else {}
+                menus[menu].append(MFProgram(
+                    p["name"], p["script_path"], p.get("launch_args") or info.get("launch_args", ""),
+                    info.get("resources"), info.get("gpu_heavy", False), info.get("nice", 0), info.get("affinity", "auto"),
+                ))
+
+        for script_path, info in sorted(by_path.items()):
+            parent = "Main"
+            for part in info["menu"].split("/"):
+                if part == "Main":
+                    continue
+                if not any(p.name == part for p in menus.setdefault(parent, [])):
+                    menus[parent].append(MFProgram(part, None))
+                menus.setdefault(part, [])
+                parent = part
+            menus[parent].append(MFProgram(
+                info["name"], script_path, info["launch_args"], info["resources"], info["gpu_heavy"],
+                info["nice"], info["affinity"]))
+
+        self.menus = menus
+        self._cached_options_menu = None  # Rebuild the options of the current menu
 
     def load_banner(self):
-        default_banner = "Error Loading Banner!"
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, "r") as f:
-                    config_data = json.load(f)
-                    return config_data.get("banner", default_banner)
-        except Exception:
-            pass
-        return default_banner
+        config_data = self.read_config()
+        self.set_banner(config_data.get("banner", "Error Loading Banner!"), config_data.get("banner_cache"))
+
+    def set_banner(self, banner, banner_cache=None):
+        """
+        Keeps the banner as a list of lines, read from a banner cache written
+        by JsonifyASCII when one is configured, so it is never split again.
+        """
+        self.banner = banner
+        self.banner_cache = banner_cache
+        self.banner_lines = banner.split("\n") if banner else []
+        if banner_cache:
+            try:
+                self.banner_lines, _, _ = read_banner_cache(banner_cache)
+            except Exception as e:
+                print(f"Error loading banner cache: {e}")
+        self._banner_size = None
+        self._banner_view = []
+
+    def clip_banner(self, stdscr):
+        """Clips the banner to the terminal once per size change instead of on every frame."""
+        size = stdscr.getmaxyx()
+        if size != self._banner_size:
+            height, width = size
+            # Leave room for the status bar and the menu title
+            self._banner_view = [line[:max(0, width - 1)] for line in self.banner_lines[:max(0, height - 3)]]
+            self._banner_size = size
+        return self._banner_view
 
     def update_online_status(self):
+        """Run the latency prober on this thread's own event loop until the menu exits."""
+        # asyncio takes tens of milliseconds to import, so it is kept off the startup path
+        import asyncio
+
+        prober = self.load_prober()
+        prober.listeners.append(self.on_probe_results)
+        self.prober = prober
         while not self.stop_refresh:
             try:
-                current_time = time.time()
-                if current_time - self.last_ping_update >= self.refresh_interval:
-                    self.online_status = check_online_status()
-                    ping_time = self.measure_ping()
-                    if ping_time is not None:
-                        self.ping_times.append(ping_time)
-                        if len(self.ping_times) > 10:  # Keep last 10 readings
-                            self.ping_times.pop(0)
-                    self.last_ping_update = current_time
-                time.sleep(0.1)  # Prevent CPU overuse
+                asyncio.run(self.prober.run(lambda: self.stop_refresh))
             except Exception as e:
                 print(f"Error updating status: {e}")
+                time.sleep(self.refresh_interval)
 
-    def measure_ping(self):
-        try:
-            response = subprocess.run(['ping', '-c', '1', '8.8.8.8'], 
-                                    capture_output=True, text=True, timeout=2)
-            if response.returncode == 0:
-                match = re.search(r'time=([\d.]+)', response.stdout)
-                if match:
-                    return float(match.group(1))
-        except Exception:
-            pass
-        return None
-
-    def add_program(self, menu, name, script_path):
-        if menu not in self.menus:
-            self.menus[menu] = []
-        self.menus[menu].append(MFProgram(name, script_path))
+    def on_probe_results(self, results):
+        self.online_status = self.prober.online()
+        if self.telemetry is not None:
+            self.telemetry.record_latency(results)
+
+    def add_program(self, menu, name, script_path, launch_args=""):
+        self.config_menus.setdefault(menu, []).append(
+            {"name": name, "script_path": script_path, "launch_args": launch_args})
+        self.build_menus()
+
+    def load_warm_pool(self):
+        """Start the warm workers listed in the config file, if they are enabled."""
+        warm_config = self.read_config().get("warm_workers", {})
+        self.warm_config = warm_config
+        if not warm_config.get("enabled", False):
+            return None
+        pool = WarmPool(warm_config.get("programs", {}))
+        pool.start()
+        return pool
+
+    def load_scheduler(self):
+        """Queue launches by their declared resources, unless disabled in the config file."""
+        scheduler_config = self.read_config().get("scheduler", {})
+        self.scheduler_config = scheduler_config
+        if not scheduler_config.get("enabled", True):
+            return None
+        return Scheduler(self.jobs, read_capacity(scheduler_config), scheduler_config.get("backfill_limit", 60))
 
     def export_config(self):
         config_data = {
-            "menus": {menu: [{"name": p.name, "script_path": p.script_path} for p in programs] for menu, programs in self.menus.items()},
+            "menus": {
+                menu: [
+                    {"name": p["name"], "script_path": p["script_path"], **({"launch_args": p["launch_args"]} if p.get("launch_args") else {})}
+                    for p in programs
+                ]
+                for menu, programs in self.config_menus.items()
+            },
             "banner": self.banner,
-            "refresh_interval": self.refresh_interval
+            **({"banner_cache": self.banner_cache} if self.banner_cache else {}),
+            "refresh_interval": self.refresh_interval,
+            "ping": self.ping_config,
+            "warm_workers": self.warm_config,
+            "scheduler": self.scheduler_config
         }
         with open(self.config_file, "w") as f:
             json.dump(config_data, f, indent=4)
 
     def import_config(self):
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, "r") as f:
-                    config_data = json.load(f)
-                    self.banner = config_data.get("banner", self.banner)
-                    self.refresh_interval = config_data.get("refresh_interval", self.refresh_interval)
-                    self.menus = {
-                        menu: [MFProgram(p["name"], p["script_path"], p.get("launch_args", "")) 
-                              for p in programs]
-                        for menu, programs in config_data.get("menus", {}).items()
-                    }
-        except Exception as e:
-            print(f"Error loading configuration: {e}")
+        config_data = self.read_config()
+        if not config_data:
+            return
+        self.set_banner(config_data.get("banner", self.banner), config_data.get("banner_cache"))
+        self.refresh_interval = config_data.get("refresh_interval", self.refresh_interval)
+        self.config_menus = config_data.get("menus", {})
+        self.build_menus()
 
     def render_banner(self, stdscr):
-        if hasattr(self, 'banner') and self.banner:
-            for idx, line in enumerate(self.banner.split('\n')):
-                stdscr.addstr(idx, 0, line)
+        for idx, line in enumerate(self.clip_banner(stdscr)):
+            stdscr.addstr(idx, 0, line)
 
     def get_ping_color(self, ping):
         if ping >= 200:
@@ -165,24 +282,70 @@ class MFMenu:
             return curses.color_pair(1)  # Blue
 
     def render_status_bar(self, stdscr):
-        banner_height = len(self.banner.split('\n')) if hasattr(self, 'banner') and self.banner else 0
-        online_status = "Online" if self.online_status else "Offline"
+        """Redraws the status cells only when their text changed. Returns True if anything was drawn."""
+        banner_height = len(self.clip_banner(stdscr))
+        online_status = {True: "Online", False: "Offline", None: "Checking"}[self.online_status]
+        stats = self.prober.primary_stats() if self.prober is not None else {"p50": None, "loss": 0.0}
+        p50 = stats["p50"] or 0
+        ping_text = f"Ping: {p50:.2f}" if stats["p50"] is not None else "Ping: --"
+        detail_text = (f"p95: {stats['p95']:.1f}  Jitter: {stats['jitter']:.1f}  Loss: {stats['loss']:.0%}"
+                       if stats["p50"] is not None else f"Loss: {stats['loss']:.0%}")
+        status = (online_status, ping_text, detail_text)
+        if status == self._drawn_status:
+            return False
+
         online_color = curses.color_pair(6) if self.online_status else curses.color_pair(7)
-        avg_ping = sum(self.ping_times) / len(self.ping_times) if self.ping_times else 0
-        
-        # Render status with its color
-        stdscr.addstr(banner_height, 0, f"Status: {online_status}", online_color)
-        # Render ping with its gradient color
-        stdscr.addstr(banner_height, 30, f"Ping: {avg_ping:.2f}", self.get_ping_color(avg_ping))
-        stdscr.addstr(banner_height + 1, 0, "\n")
+        # Pad to a fixed width so shorter text overwrites what was there before
+        add_clipped(stdscr, banner_height, f"Status: {online_status}".ljust(16), online_color)
+        add_clipped(stdscr, banner_height, ping_text.ljust(16), self.get_ping_color(p50), x=30)
+        add_clipped(stdscr, banner_height, detail_text.ljust(40), x=46)
+        self._drawn_status = status
+        return True
 
     def render_menu_items(self, stdscr, options, current_row):
-        banner_height = len(self.banner.split('\n')) if hasattr(self, 'banner') and self.banner else 0
-        stdscr.addstr(banner_height + 2, 0, f"Current Menu: {self.current_menu}", curses.A_BOLD)
-        for idx, program in enumerate(options):
-            prefix = "> " if idx == current_row else "  "
-            style = curses.A_REVERSE if idx == current_row else 0
-            stdscr.addstr(banner_height + 3 + idx, 0, f"{prefix}{program.name}", style)
+        """Repaints only the menu rows whose text or highlight changed. Returns True if anything was drawn."""
+        banner_height = len(self.clip_banner(stdscr))
+        changed = False
+        if self._drawn_title != self.current_menu:
+            stdscr.move(banner_height + 2, 0)
+            stdscr.clrtoeol()
+            stdscr.addstr(banner_height + 2, 0, f"Current Menu: {self.current_menu}", curses.A_BOLD)
+            self._drawn_title = self.current_menu
+            changed = True
+
+        rows = [
+            (f"{'> ' if idx == current_row else '  '}{program.name}{' (missing)' if program.missing else ''}",
+             curses.A_REVERSE if idx == current_row else 0)
+            for idx, program in enumerate(options)
+        ]
+        for idx in range(max(len(rows), len(self._drawn_rows))):
+            row = rows[idx] if idx < len(rows) else None
+            if idx < len(self._drawn_rows) and self._drawn_rows[idx] == row:
+                continue
+            stdscr.move(banner_height + 3 + idx, 0)
+            stdscr.clrtoeol()
+            if row is not None:
+                stdscr.addstr(banner_height + 3 + idx, 0, row[0], row[1])
+            changed = True
+        self._drawn_rows = rows
+        return changed
+
+    def render(self, stdscr, options, current_row):
+        """
+        Draws only what changed since the last call and pushes it to the
+        terminal in one doupdate(). The banner is drawn once per full redraw.
+        """
+        changed = False
+        if self._full_redraw:
+            stdscr.clear()
+            self.render_banner(stdscr)
+            self._full_redraw = False
+            changed = True
+        changed |= self.render_status_bar(stdscr)
+        changed |= self.render_menu_items(stdscr, options, current_row)
+        if changed:
+            stdscr.noutrefresh()
+            curses.doupdate()
 
     def get_menu_options(self):
         # Cache menu options to prevent regeneration
@@ -191,6 +354,8 @@ class MFMenu:
             if self.current_menu != "Main":
                 base_options.append(MFProgram("Back", None))
             if self.current_menu == "Main":
+                base_options.append(MFProgram("Jobs", None))
+                base_options.append(MFProgram("Diagnostics", None))
                 base_options.append(MFProgram("Settings", None))
             self._cached_options = base_options
             self._cached_options_menu = self.current_menu
@@ -199,8 +364,17 @@ class MFMenu:
     def handle_menu_selection(self, stdscr, selected_program, current_row):
         if selected_program.name == "Settings":
             self.settings_menu(stdscr)
+        elif selected_program.name == "Jobs" and selected_program.script_path is None:
+            self.jobs_view(stdscr)
+        elif selected_program.name == "Diagnostics" and selected_program.script_path is None:
+            self.diagnostics_view(stdscr)
+        elif selected_program.missing:
+            stdscr.clear()
+            stdscr.addstr(0, 0, f"Script not found: {selected_program.script_path}\nPress any key to return to the menu.\n")
+            stdscr.timeout(-1)
+            stdscr.getch()
         elif selected_program.script_path:
-            run_task(stdscr, selected_program.name, selected_program.script_path, self.config_file)
+            self.run_task(stdscr, selected_program)
         elif selected_program.name in self.menus:
             self.current_menu = selected_program.name
             self._cached_options_menu = None  # Reset cache on menu change
@@ -211,31 +385,251 @@ class MFMenu:
             return 0
         return current_row
 
+    def run_task(self, stdscr, program):
+        """Start the program as a background job and show its output pane, or queue it until it fits."""
+        try:
+            if self.scheduler is not None:
+                job = self.scheduler.submit(program)
+            else:
+                job = self.jobs.start(program.name, program.script_path, program.launch_args, nice=program.nice)
+        except Exception as e:
+            stdscr.clear()
+            stdscr.addstr(0, 0, f"Error running {program.name}: {e}\nPress any key to return to the menu.\n")
+            stdscr.timeout(-1)
+            stdscr.getch()
+            return
+        if isinstance(job, QueuedJob):
+            resources = program.resources
+            stdscr.clear()
+            stdscr.addstr(0, 0, f"{program.name} is queued until gpu={resources.get('gpu', 0)} cpu={resources.get('cpu', 0)} "
+                                f"memory={format_rss(resources.get('memory', 0) // 1024)} are free.\n"
+                                "It starts on its own; follow it in the Jobs view.\n"
+                                "Press any key to return to the menu.\n")
+            stdscr.timeout(-1)
+            stdscr.getch()
+            return
+        self.job_pane(stdscr, job)
+
+    def job_pane(self, stdscr, job):
+        """
+        Live output of one job. Typed text is sent to the job's stdin on Enter.
+        Esc returns to the menu and leaves the job running in the background.
+        """
+        input_line = ""
+        scroll = 0  # Lines scrolled up from the bottom
+        drawn = None
+        stdscr.timeout(100)
+        while True:
+            height, width = stdscr.getmaxyx()
+            view_height = max(1, height - 3)
+            # Whole seconds of runtime are part of the state so the header clock ticks
+            state = (job.version, input_line, scroll, height, width, int(job.runtime) if job.running else None)
+            if state != drawn:
+                lines = job.output()
+                scroll = min(scroll, max(0, len(lines) - view_height))
+                end = len(lines) - scroll
+                visible = lines[max(0, end - view_height):end]
+
+                status = "running" if job.running else f"exited {job.exit_text}"
+                if job.warm:
+                    status += " (warm)"
+                stdscr.erase()
+                add_clipped(stdscr, 0, f"[{job.id}] {job.name}  PID {job.pid}  {status}  "
+                                       f"{job.runtime:.0f}s  peak RSS {format_rss(job.peak_rss_kb)}", curses.A_BOLD)
+                for idx, line in enumerate(visible):
+                    add_clipped(stdscr, 1 + idx, line)
+                add_clipped(stdscr, height - 2, "Esc: back (job keeps running)  PgUp/PgDn: scroll  Ctrl-X: stop job",
+                            curses.A_DIM)
+                add_clipped(stdscr, height - 1, f"Input: {input_line}", curses.A_REVERSE)
+                stdscr.noutrefresh()
+                curses.doupdate()
+                drawn = state
+
+            key = stdscr.getch()
+            if key == curses.ERR:
+                continue
+            elif key == 27:  # Esc
+                return
+            elif key in (curses.KEY_ENTER, 10, 13):
+                job.send(input_line)
+                input_line = ""
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                input_line = input_line[:-1]
+            elif key == 24:  # Ctrl-X
+                job.terminate()
+            elif key == curses.KEY_PPAGE:
+                scroll += view_height
+            elif key == curses.KEY_NPAGE:
+                scroll = max(0, scroll - view_height)
+            elif key == curses.KEY_UP:
+                scroll += 1
+            elif key == curses.KEY_DOWN:
+                scroll = max(0, scroll - 1)
+            elif 32 <= key < 127:
+                input_line += chr(key)
+
+    def jobs_view(self, stdscr):
+        """
+        Table of all jobs started from the menu, then the queued ones and the
+        ones that failed to start. Enter opens a job's output pane, +/- change
+        its nice level, c cancels a queued job or dismisses a failed one.
+        """
+        current_row = 0
+        message = ""
+        stdscr.timeout(1000)  # Refresh runtimes once a second
+        while True:
+            queued = list(self.scheduler.queue) if self.scheduler is not None else []
+            failed = list(self.scheduler.failed) if self.scheduler is not None else []
+            jobs = self.jobs.jobs + queued + failed
+            stdscr.erase()
+            add_clipped(stdscr, 0, f"Jobs ({self.jobs.running_count()} running, {len(queued)} queued)   "
+                                   "Enter: open  +/-: nice  c: cancel queued/dismiss failed  Esc: back", curses.A_BOLD)
+            add_clipped(stdscr, 1, f"{'ID':>3}  {'Name':<24} {'PID':>7}  {'State':<10} {'Runtime':>8}  {'Peak RSS':>8}  {'Nice':>4}  CPUs")
+            if not jobs:
+                add_clipped(stdscr, 3, "No jobs yet. Programs started from the menu show up here.")
+            current_row = max(0, min(current_row, len(jobs) - 1))
+            for idx, job in enumerate(jobs):
+                style = curses.A_REVERSE if idx == current_row else 0
+                if isinstance(job, QueuedJob):
+                    state = "failed" if job.error is not None else "queued"
+                    add_clipped(stdscr, 2 + idx, f"{job.id:>3}  {job.name[:24]:<24} {'-':>7}  {state:<10} "
+                                                 f"{job.waited:>7.0f}s  {'-':>8}  {job.nice:>4}  {job.affinity}", style)
+                    continue
+                state = "running" if job.running else f"exit {job.exit_text}"
+                cpus = ",".join(str(c) for c in job.cpus) if job.cpus else "all"
+                add_clipped(stdscr, 2 + idx, f"{job.id:>3}  {job.name[:24]:<24} {job.pid:>7}  {state:<10} "
+                                             f"{job.runtime:>7.0f}s  {format_rss(job.peak_rss_kb):>8}  {job.nice:>4}  {cpus}", style)
+            row = 3 + len(jobs)
+            for job in failed:
+                add_clipped(stdscr, row, f"Could not start {job.name}: {job.error}")
+                row += 1
+            if message:
+                add_clipped(stdscr, row, message)
+            stdscr.refresh()
+
+            key = stdscr.getch()
+            if key == curses.ERR:
+                continue
+            elif key in (27, curses.KEY_BACKSPACE, 127, ord("q")):
+                break
+            elif key == curses.KEY_UP:
+                current_row = max(0, current_row - 1)
+            elif key == curses.KEY_DOWN:
+                current_row = min(len(jobs) - 1, current_row + 1)
+            elif key in (curses.KEY_ENTER, 10, 13) and jobs and not isinstance(jobs[current_row], QueuedJob):
+                self.job_pane(stdscr, jobs[current_row])
+                stdscr.timeout(1000)
+            elif key in (ord("+"), ord("-")) and jobs:
+                job = jobs[current_row]
+                nice = max(-20, min(19, job.nice + (1 if key == ord("+") else -1)))
+                message = ""
+                if isinstance(job, QueuedJob):
+                    job.nice = nice
+                elif job.running:
+                    try:
+                        self.jobs.renice(job, nice)
+                    except OSError as e:
+                        # Raising priority needs root
+                        message = f"Could not renice {job.name}: {e.strerror}"
+            elif key == ord("c") and jobs and isinstance(jobs[current_row], QueuedJob):
+                self.scheduler.cancel(jobs[current_row])
+        stdscr.timeout(100)
+
+    def diagnostics_view(self, stdscr):
+        """
+        Live per-stage timings of jobs that write traces ([Tracing] in settings.ini).
+        Up/Down pick a job, p records a sampling profile of the selected job.
+        """
+        logs_path = load_settings("settings.ini").get("Paths", "logs_path", fallback="Logs")
+        current_row = 0
+        message = ""
+        stdscr.timeout(1000)  # Traces are flushed about once a second
+        while True:
+            jobs = self.jobs.jobs
+            snapshots = [read_latest_snapshot(logs_path, job.pid, since=job.started) for job in jobs]
+            stdscr.erase()
+            add_clipped(stdscr, 0, "Diagnostics   Up/Down: job  p: sampling profile  Esc: back", curses.A_BOLD)
+            if not jobs:
+                add_clipped(stdscr, 2, "No jobs yet. Programs started from the menu show up here.")
+            current_row = max(0, min(current_row, len(jobs) - 1))
+            for idx, (job, snapshot) in enumerate(zip(jobs, snapshots)):
+                state = "running" if job.running else f"exit {job.exit_text}"
+                trace = (f"RSS {format_rss(snapshot['rss_kb'])}  peak {format_rss(snapshot['peak_rss_kb'])}"
+                         + (f"  {snapshot['workers']} workers" if snapshot["workers"] else "")
+                         if snapshot else "no trace")
+                add_clipped(stdscr, 1 + idx, f"{job.id:>3}  {job.name[:24]:<24} {job.pid:>7}  {state:<10} "
+                                             f"{job.runtime:>7.0f}s  {trace}",
+                            curses.A_REVERSE if idx == current_row else 0)
+
+            row = 2 + len(jobs)
+            snapshot = snapshots[current_row] if jobs else None
+            if jobs and snapshot is None:
+                add_clipped(stdscr, row, "This job has not written a trace. Enable [Tracing] in settings.ini "
+                                         "or start it with TERMINAX_TRACE=1.")
+            elif snapshot is not None:
+                spans = snapshot["spans"]
+                busy = sum(stats["total_s"] for stats in spans.values()) or 1
+                add_clipped(stdscr, row, f"{'Stage':<12} {'Count':>8} {'Total':>9} {'Share':>6} {'Mean':>9} {'Max':>9}",
+                            curses.A_BOLD)
+                for name, stats in sorted(spans.items(), key=lambda item: -item[1]["total_s"]):
+                    row += 1
+                    mean_ms = stats["total_s"] * 1000 / stats["count"]
+                    add_clipped(stdscr, row, f"{name[:12]:<12} {stats['count']:>8} {stats['total_s']:>8.1f}s "
+                                             f"{stats['total_s'] / busy:>6.0%} {mean_ms:>7.1f}ms {stats['max_ms']:>7.1f}ms")
+                elapsed = snapshot["elapsed_s"] or 1
+                counters = "  ".join(f"{name} {value} ({value / elapsed:.1f}/s)"
+                                     for name, value in sorted(snapshot["counters"].items()))
+                add_clipped(stdscr, row + 2, f"Counters: {counters or 'none'}")
+                if snapshot["profiles"]:
+                    add_clipped(stdscr, row + 3, f"Last profile: {snapshot['profiles'][-1]}")
+                row += 3
+            if message:
+                add_clipped(stdscr, row + 2, message)
+            stdscr.refresh()
+
+            key = stdscr.getch()
+            if key == curses.ERR:
+                continue
+            elif key in (27, curses.KEY_BACKSPACE, 127, ord("q")):
+                break
+            elif key == curses.KEY_UP:
+                current_row = max(0, current_row - 1)
+            elif key == curses.KEY_DOWN:
+                current_row = min(len(jobs) - 1, current_row + 1)
+            elif key == ord("p") and jobs:
+                job = jobs[current_row]
+                # Only traced jobs handle the signal; for any other process it is fatal
+                if not job.running or snapshots[current_row] is None:
+                    message = f"{job.name} is not a running, traced job."
+                else:
+                    try:
+                        os.kill(job.pid, PROFILE_SIGNAL)
+                        message = f"Sampling {job.name}; the profile path appears above when it is written."
+                    except OSError as e:
+                        message = f"Could not signal {job.name}: {e.strerror}"
+        stdscr.timeout(100)
+
     def main_loop(self, stdscr):
         current_row = 0
-        last_refresh = time.time()
+        self.invalidate_screen()
+        # Wake up every 100ms to pick up new ping results
+        stdscr.timeout(100)
         try:
             while True:
-                current_time = time.time()
+                if self.registry.changed.is_set():
+                    # A script in programs/ was added, removed or edited
+                    self.registry.changed.clear()
+                    self.build_menus()
                 options = self.get_menu_options()
-                
-                # Set non-blocking input with 100ms timeout
-                stdscr.timeout(100)
-                
-                # Refresh display every second
-                if current_time - last_refresh >= 1:
-                    stdscr.clear()
-                    current_row = max(0, min(current_row, len(options) - 1))
-                    self.render_banner(stdscr)
-                    self.render_status_bar(stdscr)
-                    self.render_menu_items(stdscr, options, current_row)
-                    stdscr.refresh()
-                    last_refresh = current_time
-                
+                current_row = max(0, min(current_row, len(options) - 1))
+                self.render(stdscr, options, current_row)
+
                 # Handle input
                 key = stdscr.getch()
                 if key == curses.ERR:  # No key pressed
                     continue
+                elif key == curses.KEY_RESIZE:
+                    self.invalidate_screen()
                 elif key == curses.KEY_UP:
                     current_row = max(0, current_row - 1)
                 elif key == curses.KEY_DOWN:
@@ -244,17 +638,18 @@ class MFMenu:
                     if 0 <= current_row < len(options):
                         selected_program = options[current_row]
                         current_row = self.handle_menu_selection(stdscr, selected_program, current_row)
-                
-                # Refresh on input
-                if key != curses.ERR:
-                    stdscr.clear()
-                    self.render_banner(stdscr)
-                    self.render_status_bar(stdscr)
-                    self.render_menu_items(stdscr, options, current_row)
-                    stdscr.refresh()
+                        # Other screens may have drawn over the menu
+                        self.invalidate_screen()
+                        stdscr.timeout(100)
         finally:
             self.stop_refresh = True
             stdscr.timeout(-1)  # Reset timeout to blocking mode
+            # Jobs write to pipes owned by the menu, so they cannot outlive it
+            self.jobs.terminate_all()
+            if self.warm_pool is not None:
+                self.warm_pool.stop()
+            if self.telemetry is not None:
+                self.telemetry.close()
 
     def display(self, stdscr):
         curses.curs_set(0)
@@ -262,14 +657,14 @@ class MFMenu:
         # Start the online status updater thread
         refresh_thread = threading.Thread(target=self.update_online_status, daemon=True)
         refresh_thread.start()
+        self.registry.watch()
 
         self.main_loop(stdscr)
 
     def install_dependencies(self, stdscr):
         try:
-            with open(self.config_file, 'r') as f:
-                config = json.load(f)
-            
+            config = load_config(self.config_file)
+
             apt_deps = config.get('apt_install', [])
             pip_deps = config.get('pip_install', [])
             
@@ -298,9 +693,70 @@ class MFMenu:
             stdscr.refresh()
             stdscr.getch()
 
+    def history_view(self, stdscr):
+        """Sparklines of stored latency, loss and bandwidth results. Left/Right change the time range."""
+        if self.telemetry is None:
+            stdscr.addstr("Telemetry store is not available. Press any key to continue.\n")
+            stdscr.getch()
+            return
+
+        try:
+            SPARK_CHARS.encode(locale.getpreferredencoding())
+            chars = SPARK_CHARS
+        except UnicodeEncodeError:
+            chars = ASCII_SPARK_CHARS
+
+        window = 0
+        stdscr.timeout(5000)  # Redraw every few seconds as new samples land
+        try:
+            while True:
+                label, seconds = HISTORY_WINDOWS[window]
+                height, width = stdscr.getmaxyx()
+                graph_width = max(10, width - 2)
+                lines = [(f"Network History: last {label}   (Left/Right: range, any other key: back)", curses.A_BOLD)]
+
+                for target in self.telemetry.latency_targets():
+                    history = self.telemetry.latency_history(target, seconds, graph_width)
+                    means = [mean for mean, _ in history]
+                    present = [m for m in means if m is not None]
+                    losses = [loss for _, loss in history if loss is not None]
+                    summary = (f"min {min(present):.1f}  avg {sum(present) / len(present):.1f}  max {max(present):.1f} ms"
+                               if present else "no replies")
+                    loss_text = f"  loss {sum(losses) / len(losses):.1%}" if losses else ""
+                    lines.append((f"{target}: {summary}{loss_text}", 0))
+                    lines.append((sparkline(means, chars), curses.color_pair(1)))
+                    lines.append(("".join(" " if loss is None or loss == 0 else "!" for _, loss in history),
+                                  curses.color_pair(5)))
+
+                bandwidth = self.telemetry.bandwidth_history(graph_width)
+                if bandwidth:
+                    lines.append(("Bandwidth (received Mbps, most recent last):", curses.A_BOLD))
+                    lines.append((sparkline([row[7] for row in bandwidth], chars), curses.color_pair(1)))
+                    for ts, server, port, protocol, direction, streams, sent, received, error in bandwidth[-5:]:
+                        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+                        result = error or f"sent {sent or 0:.1f} / received {received or 0:.1f} Mbps"
+                        lines.append((f"{when}  {server}:{port} {protocol} {direction} x{streams}  {result}", 0))
+
+                stdscr.erase()
+                for y, (text, style) in enumerate(lines[:height - 1]):
+                    stdscr.addstr(y, 0, text[:width - 1], style)
+                stdscr.refresh()
+
+                key = stdscr.getch()
+                if key == curses.ERR or key == curses.KEY_RESIZE:
+                    continue
+                elif key == curses.KEY_LEFT:
+                    window = max(0, window - 1)
+                elif key == curses.KEY_RIGHT:
+                    window = min(len(HISTORY_WINDOWS) - 1, window + 1)
+                else:
+                    break
+        finally:
+            stdscr.timeout(100)
+
     def settings_menu(self, stdscr):
         current_row = 0
-        settings_options = ["Export Config", "Import Config", "Install Dependencies", "Back"]
+        settings_options = ["Export Config", "Import Config", "Install Dependencies", "Network History", "Back"]
         
         while True:
             stdscr.clear()
@@ -331,12 +787,15 @@ class MFMenu:
                 elif current_row == 2:
                     self.install_dependencies(stdscr)
                 elif current_row == 3:
+                    self.history_view(stdscr)
+                elif current_row == 4:
                     break
 
             stdscr.refresh()
 
 if __name__ == "__main__":
     def main(stdscr):
+        curses.set_escdelay(25)  # Esc leaves job panes without a one-second delay
         # Initialize color pairs for the online indicator
         curses.start_color()
         curses.init_pair(1, 12, curses.COLOR_BLACK)  # Light Blue
@@ -351,4 +810,5 @@ if __name__ == "__main__":
         menu = MFMenu()
         menu.display(stdscr)
 
+    locale.setlocale(locale.LC_ALL, "")  # Needed for the sparkline characters
     curses.wrapper(main)
@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+import importlib.util
+import numpy as np
+import cv2
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+PROGRAMS_DIR = os.path.join(REPO_DIR, "programs")
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, PROGRAMS_DIR)
+
+IMAGE_COUNT = 48
+IMAGE_SIZE = (480, 640)  # height, width
+VIDEO_COUNT = 3
+VIDEO_SECONDS = 4
+VIDEO_FPS = 30
+VIDEO_SIZE = (360, 640)
+INFERENCE_IMAGES = 16
+INFERENCE_IMGSZ = 320
+LABEL_CALLS = 500
+RENDER_FRAMES = 300
+CONFIG_LOADS = 200
+# A stage regresses when it gets this much worse than the baseline run
+DEFAULT_TOLERANCE = 0.10
+
+def load_program(file_name, module_name):
+    """Loads a script from programs/ (the file names are not importable)."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(PROGRAMS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def synthetic_image(rng, height, width):
+    """Noise with a few filled shapes, so encoders and the model have edges to work on."""
+    image = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+    for _ in range(6):
+        color = tuple(int(c) for c in rng.integers(64, 256, 3))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(10, min(height, width) // 3))
+        if rng.random() < 0.5:
+            cv2.rectangle(image, (x, y), (x + size, y + size), color, -1)
+        else:
+            cv2.circle(image, (x, y), size // 2, color, -1)
+    return image
+
+def write_images(folder, count, rng, extension=".png"):
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        cv2.imwrite(os.path.join(folder, f"image_{i:04d}{extension}"), synthetic_image(rng, *IMAGE_SIZE))
+
+def write_video(path, rng):
+    """A short clip of shapes moving across noise."""
+    height, width = VIDEO_SIZE
+    background = synthetic_image(rng, height, width)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), VIDEO_FPS, (width, height))
+    for i in range(VIDEO_SECONDS * VIDEO_FPS):
+        frame = np.roll(background, i * 4, axis=1)
+        cv2.circle(frame, ((i * 7) % width, height // 2), 30, (0, 200, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+def tiny_model():
+    """A randomly initialised YOLOv8n, built from its config so nothing is downloaded."""
+    from ultralytics import YOLO
+
+    yolo = YOLO("yolov8n.yaml")
+    return lambda images: yolo(images, imgsz=INFERENCE_IMGSZ, verbose=False)
+
+class FakeBoxes:
+    def __init__(self, data):
+        self.data = data
+
+class FakeResult:
+    def __init__(self, data):
+        self.boxes = FakeBoxes(data)
+
+# Each stage takes a scratch folder and returns (unit, per-item latencies in seconds, wall time)
+
+def stage_config_loading(workdir):
+    import appconfig
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(CONFIG_LOADS):
+        # Cold loads: drop the cache so every call parses and validates both files
+        appconfig._cache.clear()
+        item_start = time.perf_counter()
+        appconfig.load_settings(os.path.join(REPO_DIR, "settings.ini"))
+        appconfig.load_config(os.path.join(REPO_DIR, "config.json"))
+        latencies.append(time.perf_counter() - item_start)
+    return "loads", latencies, time.perf_counter() - start
+
+def stage_convert_images_to_jpg(workdir):
+    prep = load_program("Prep-Media.py", "prep_media")
+    input_folder = os.path.join(workdir, "convert_in")
+    write_images(input_folder, IMAGE_COUNT, np.random.default_rng(1))
+    output_folder = os.path.join(workdir, "convert_out")
+    os.makedirs(output_folder, exist_ok=True)
+
+    # convert_images_to_jpg with one worker, one call per file so each is timed
+    latencies = []
+    start = time.perf_counter()
+    for file in sorted(os.listdir(input_folder)):
+        item_start = time.perf_counter()
+        _, error = prep.convert_image_file(os.path.join(input_folder, file), output_folder)
+        if error is not None:
+            raise RuntimeError(f"convert_image_file failed on {file}: {error}")
+        latencies.append(time.perf_counter() - item_start)
+    return "images", latencies, time.perf_counter() - start
+
+def stage_extract_frames(workdir):
+    prep = load_program("Prep-Media.py", "prep_media")
+    rng = np.random.default_rng(2)
+    videos = []
+    for i in range(VIDEO_COUNT):
+        path = os.path.join(workdir, f"clip_{i}.mp4")
+        write_video(path, rng)
+        videos.append(path)
+
+    # One latency per extracted frame: the video's time spread over its frames
+    latencies = []
+    start = time.perf_counter()
+    for path in videos:
+        item_start = time.perf_counter()
+        count = prep.extract_frames(path, os.path.join(workdir, "frames", os.path.basename(path)), fps_interval=0.1)
+        if count:
+            latencies.extend([(time.perf_counter() - item_start) / count] * count)
+    return "frames", latencies, time.perf_counter() - start
+
+def run_inference_stage(workdir, batched):
+    infer = load_program("Model-Infrence.py", "model_infrence")
+    input_folder = os.path.join(workdir, "infer_in")
+    output_folder = os.path.join(workdir, "infer_out")
+    write_images(input_folder, INFERENCE_IMAGES, np.random.default_rng(3), ".jpg")
+    os.makedirs(output_folder, exist_ok=True)
+    model = tiny_model()
+    # Build the predictor outside the timed part, as a warm worker would
+    model([synthetic_image(np.random.default_rng(4), *IMAGE_SIZE)])
+
+    # One latency per image: each model call's time spread over the images it
+    # was given, since decoding and writing overlap inference in the batched run
+    latencies = []
+    def timed_model(images):
+        item_start = time.perf_counter()
+        results = model(images)
+        count = len(images) if isinstance(images, list) else 1
+        latencies.extend([(time.perf_counter() - item_start) / count] * count)
+        return results
+
+    start = time.perf_counter()
+    if batched:
+        infer.process_images_batched(input_folder, output_folder, timed_model, batch_size=8)
+    else:
+        infer.process_images(input_folder, output_folder, timed_model)
+    wall = time.perf_counter() - start
+    return "images", latencies, wall
+
+def stage_process_images(workdir):
+    return run_inference_stage(workdir, batched=False)
+
+def stage_process_images_batched(workdir):
+    return run_inference_stage(workdir, batched=True)
+
+def stage_save_yolo_labels(workdir):
+    infer = load_program("Model-Infrence.py", "model_infrence")
+    rng = np.random.default_rng(5)
+    height, width = 1080, 1920
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    x1, y1 = rng.uniform(0, width - 100, 100), rng.uniform(0, height - 100, 100)
+    data = np.column_stack((x1, y1, x1 + 80, y1 + 60, rng.uniform(0.25, 1, 100), rng.integers(0, 80, 100)))
+    results = [FakeResult(data.astype(np.float32))]
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(LABEL_CALLS):
+        item_start = time.perf_counter()
+        infer.save_yolo_labels(image, results, f"frame_{i % 8}.jpg", workdir)
+        latencies.append(time.perf_counter() - item_start)
+    return "files", latencies, time.perf_counter() - start
+
+def stage_render_loop(workdir):
+    """Draws the main menu on a pseudo terminal, moving the selection each frame."""
+    import pty
+    import curses
+    import configparser
+    import fcntl
+    import struct
+    import termios
+    import threading
+
+    master, slave = pty.openpty()
+    fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack("HHHH", 40, 120, 0, 0))
+    def drain():
+        # Keep reading the terminal's output so curses never blocks on a full pty
+        while True:
+            os.read(master, 65536)
+    threading.Thread(target=drain, daemon=True).start()
+    saved = os.dup(0), os.dup(1)
+    os.dup2(slave, 0)
+    os.dup2(slave, 1)
+    os.environ["TERM"] = "xterm-256color"
+    # The menu reads config.json and settings.ini from the working directory;
+    # run it from workdir so its telemetry store is not opened under the repo's Logs/
+    shutil.copy(os.path.join(REPO_DIR, "config.json"), workdir)
+    settings = configparser.ConfigParser()
+    settings.read(os.path.join(REPO_DIR, "settings.ini"))
+    settings["Paths"]["logs_path"] = os.path.join(workdir, "Logs")
+    with open(os.path.join(workdir, "settings.ini"), "w") as f:
+        settings.write(f)
+    os.symlink(PROGRAMS_DIR, os.path.join(workdir, "programs"))
+    os.chdir(workdir)
+    latencies = []
+    try:
+        import TerminaX
+
+        stdscr = curses.initscr()
+        try:
+            curses.start_color()
+            menu = TerminaX.MFMenu()
+            options = menu.get_menu_options()
+            start = time.perf_counter()
+            for frame in range(RENDER_FRAMES):
+                if frame % 50 == 0:
+                    menu.invalidate_screen()
+                item_start = time.perf_counter()
+                menu.render(stdscr, options, frame % len(options))
+                latencies.append(time.perf_counter() - item_start)
+            wall = time.perf_counter() - start
+        finally:
+            curses.endwin()
+    finally:
+        os.dup2(saved[0], 0)
+        os.dup2(saved[1], 1)
+    return "frames", latencies, wall
+
+STAGES = {
+    "config_loading": stage_config_loading,
+    "convert_images_to_jpg": stage_convert_images_to_jpg,
+    "extract_frames": stage_extract_frames,
+    "process_images": stage_process_images,
+    "process_images_batched": stage_process_images_batched,
+    "save_yolo_labels": stage_save_yolo_labels,
+    "render_loop": stage_render_loop,
+}
+
+def run_stage(name, workdir, result_path):
+    """Runs in the stage's own process and writes its timings to result_path."""
+    unit, latencies, wall = STAGES[name](workdir)
+    latencies_ms = np.array(latencies) * 1000
+    with open(result_path, "w") as f:
+        json.dump({
+            "unit": unit,
+            "items": len(latencies),
+            "seconds": round(wall, 4),
+            "throughput": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+            "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3) if len(latencies) else None,
+            "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3) if len(latencies) else None,
+        }, f)
+
+def run_all(stage_names):
+    """
+    Runs every stage in a fresh interpreter, so one stage's imports and
+    caches do not skew the next and each gets its own peak RSS.
+    """
+    results = {}
+    for name in stage_names:
+        workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+        result_path = os.path.join(workdir, "result.json")
+        with open(os.path.join(workdir, "output.log"), "w") as log:
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "stage", name, workdir, result_path],
+                                       stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+            _, status, usage = os.wait4(process.pid, 0)
+        try:
+            if os.waitstatus_to_exitcode(status) != 0:
+                with open(os.path.join(workdir, "output.log"), "r") as log:
+                    print(f"{name} failed:\n{log.read()[-2000:]}")
+                continue
+            with open(result_path, "r") as f:
+                results[name] = json.load(f)
+            # ru_maxrss is in kilobytes on Linux
+            results[name]["peak_rss_kb"] = usage.ru_maxrss
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        stage = results[name]
+        print(f"{name:<24} {stage['throughput']:>10.1f} {stage['unit']}/s   p50 {stage['p50_ms']:>9.3f} ms   "
+              f"p99 {stage['p99_ms']:>9.3f} ms   peak RSS {stage['peak_rss_kb'] / 1024:>7.1f} MB")
+    return results
+
+def compare(baseline_path, current_path, tolerance=DEFAULT_TOLERANCE):
+    """
+    Prints how each stage changed between two result files. Lower throughput,
+    or higher p99 or peak RSS, by more than tolerance counts as a regression.
+    Returns the number of regressions.
+    """
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)["stages"]
+    with open(current_path, "r") as f:
+        current = json.load(f)["stages"]
+
+    regressions = 0
+    print(f"{'stage':<24} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(set(baseline) & set(current)):
+        # (metric, True when higher is better)
+        for metric, higher_is_better in (("throughput", True), ("p99_ms", False), ("peak_rss_kb", False)):
+            old, new = baseline[name].get(metric), current[name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            regressions += bool(flag)
+            print(f"{name:<24} {metric:<12} {old:>12.2f} {new:>12.2f} {change:>+7.1%}{flag}")
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f"{name:<24} only in {'the baseline' if name in baseline else 'the current run'}")
+    print(f"{regressions} regressions beyond {tolerance:.0%}")
+    return regressions
+
+def main(output_path="bench_pipeline.json", stage_names=None):
+    results = run_all(stage_names or list(STAGES))
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "stages": results,
+    }
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {output_path}")
+    return 0 if len(results) == len(stage_names or STAGES) else 1
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "stage":
+        run_stage(sys.argv[2], sys.argv[3], sys.argv[4])
+    elif len(sys.argv) in (4, 5) and sys.argv[1] == "compare":
+        tolerance = float(sys.argv[4]) if len(sys.argv) == 5 else DEFAULT_TOLERANCE
+        sys.exit(1 if compare(sys.argv[2], sys.argv[3], tolerance) else 0)
+    elif all(name in STAGES for name in sys.argv[2:]):
+        sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else "bench_pipeline.json", sys.argv[2:] or None))
+    else:
+        print("Usage: python3 bench_pipeline.py [output.json [stage ...]]")
+        print("       python3 bench_pipeline.py compare <baseline.json> <current.json> [tolerance]")
+        print(f"Stages: {', '.join(STAGES)}")
+        sys.exit(1)
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import tempfile
+import importlib.util
+import numpy as np
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "programs")
+# Model-Infrence imports its sibling modules (shards, labelstore, ...) by name
+sys.path.insert(0, PROGRAMS_DIR)
+
+def load_program(file_name, module_name):
+    """Loads a script from programs/ (the file names are not importable)."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(PROGRAMS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class FakeBoxes:
+    def __init__(self, data):
+        self.data = data
+
+class FakeResult:
+    def __init__(self, data):
+        self.boxes = FakeBoxes(data)
+
+def legacy_save_yolo_labels(image, results, image_name, output_folder):
+    """The original per-box implementation, kept as the reference output."""
+    height, width, _ = image.shape
+    label_file_path = os.path.join(output_folder, os.path.splitext(image_name)[0] + ".txt")
+
+    with open(label_file_path, "w") as f:
+        for result in results:
+            for bbox in result.boxes.data.tolist():
+                x1, y1, x2, y2, score, class_id = bbox[:6]
+                x_center = ((x1 + x2) / 2) / width
+                y_center = ((y1 + y2) / 2) / height
+                bbox_width = (x2 - x1) / width
+                bbox_height = (y2 - y1) / height
+                f.write(f"{int(class_id)} {x_center:.6f} {y_center:.6f} {bbox_width:.6f} {bbox_height:.6f}\n")
+
+def make_results(box_count, width, height, rng):
+    """Random float32 detections shaped like ultralytics boxes.data."""
+    x1 = rng.uniform(0, width - 1, box_count)
+    y1 = rng.uniform(0, height - 1, box_count)
+    x2 = np.minimum(x1 + rng.uniform(1, width / 4, box_count), width)
+    y2 = np.minimum(y1 + rng.uniform(1, height / 4, box_count), height)
+    score = rng.uniform(0.25, 1.0, box_count)
+    class_id = rng.integers(0, 80, box_count)
+    data = np.column_stack((x1, y1, x2, y2, score, class_id)).astype(np.float32)
+    return [FakeResult(data)]
+
+def time_calls(func, image, results, output_folder, repeats):
+    start = time.perf_counter()
+    for i in range(repeats):
+        func(image, results, f"frame_{i % 8}.jpg", output_folder)
+    return (time.perf_counter() - start) / repeats
+
+def main(box_counts=(10, 100, 1000, 5000), repeats=200):
+    model_inference = load_program("Model-Infrence.py", "model_inference")
+    rng = np.random.default_rng(0)
+    image = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+    with tempfile.TemporaryDirectory() as legacy_dir, tempfile.TemporaryDirectory() as vector_dir:
+        print(f"{'boxes':>8} {'legacy (ms)':>12} {'vector (ms)':>12} {'speedup':>8}")
+        for box_count in box_counts:
+            results = make_results(box_count, image.shape[1], image.shape[0], rng)
+
+            legacy_save_yolo_labels(image, results, "check.jpg", legacy_dir)
+            model_inference.save_yolo_labels(image, results, "check.jpg", vector_dir)
+            with open(os.path.join(legacy_dir, "check.txt"), "rb") as f:
+                expected = f.read()
+            with open(os.path.join(vector_dir, "check.txt"), "rb") as f:
+                actual = f.read()
+            if actual != expected:
+                print(f"Output mismatch with {box_count} boxes")
+                return 1
+
+            legacy = time_calls(legacy_save_yolo_labels, image, results, legacy_dir, repeats)
+            vector = time_calls(model_inference.save_yolo_labels, image, results, vector_dir, repeats)
+            print(f"{box_count:>8} {legacy * 1000:>12.3f} {vector * 1000:>12.3f} {legacy / vector:>7.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
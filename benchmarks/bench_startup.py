@@ -0,0 +1,97 @@
+import os
+import pty
+import sys
+import time
+import shutil
+import select
+import signal
+import tempfile
+import statistics
+import configparser
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+READY_MARKER = b"Current Menu:"
+BUDGET_MS = 100
+
+def prepare_workdir(workdir):
+    """
+    Sets workdir up to run TerminaX from: config.json, the programs folder
+    and a settings.ini whose logs_path is inside workdir, so the telemetry
+    store is not created under the configured logs_path on this machine.
+    """
+    shutil.copy(os.path.join(REPO_DIR, "config.json"), workdir)
+    settings = configparser.ConfigParser()
+    settings.read(os.path.join(REPO_DIR, "settings.ini"))
+    settings["Paths"]["logs_path"] = os.path.join(workdir, "Logs")
+    with open(os.path.join(workdir, "settings.ini"), "w") as f:
+        settings.write(f)
+    os.symlink(os.path.join(REPO_DIR, "programs"), os.path.join(workdir, "programs"))
+
+def time_to_menu(command, cwd, timeout=10.0):
+    """
+    Runs command in cwd on a pseudo terminal and returns the milliseconds
+    until the menu is drawn, i.e. until it is ready for input.
+    """
+    start = time.perf_counter()
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.chdir(cwd)
+        os.environ["TERM"] = "xterm-256color"  # The menu uses 256 colour pairs
+        os.execvp(command[0], command)
+
+    output = b""
+    elapsed = None
+    try:
+        while time.perf_counter() - start < timeout:
+            ready, _, _ = select.select([fd], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                output += os.read(fd, 65536)
+            except OSError:
+                break
+            if READY_MARKER in output:
+                elapsed = (time.perf_counter() - start) * 1000
+                break
+    finally:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        os.close(fd)
+    return elapsed
+
+def measure(command, runs, cwd):
+    times = []
+    for _ in range(runs):
+        elapsed = time_to_menu(command, cwd)
+        if elapsed is None:
+            return None
+        times.append(elapsed)
+    return times
+
+def main(runs=10):
+    # A bare interpreter printing the marker; its startup cost depends on the
+    # installed site-packages, not on TerminaX, so it is reported separately
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        prepare_workdir(workdir)
+        baseline = measure([sys.executable, "-c", f"print({READY_MARKER.decode()!r})"], runs, workdir)
+        times = measure([sys.executable, os.path.join(REPO_DIR, "TerminaX.py")], runs, workdir)
+    finally:
+        shutil.rmtree(workdir)
+    if times is None:
+        print("TerminaX did not draw its menu within the timeout")
+        return 1
+
+    median = statistics.median(times)
+    overhead = median - statistics.median(baseline)
+    print(f"Time to interactive menu over {runs} runs: "
+          f"min {min(times):.1f} ms, median {median:.1f} ms, max {max(times):.1f} ms")
+    print(f"Interpreter startup: median {statistics.median(baseline):.1f} ms, "
+          f"TerminaX startup on top of it: {overhead:.1f} ms")
+    if overhead > BUDGET_MS:
+        print(f"TerminaX startup is over the {BUDGET_MS} ms budget")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
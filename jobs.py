@@ -0,0 +1,253 @@
+import codecs
+import os
+import selectors
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+class Job:
+    """
+    One program started by the menu: its process, captured output and resource usage.
+    Output is kept as complete lines plus the current partial line, so
+    carriage-return progress bars overwrite themselves instead of piling up.
+    """
+    def __init__(self, job_id, name, command, process, max_lines=5000):
+        self.id = job_id
+        self.name = name
+        self.command = command
+        self.process = process
+        self.pid = process.pid
+        self.warm = hasattr(process, "reap")  # Forked from a warm worker
+        self.started = time.time()
+        self.finished = None
+        self.exit_code = None
+        self.peak_rss_kb = 0
+        self.lines = deque(maxlen=max_lines)
+        self.partial = ""
+        self.version = 0  # Bumped on every change so views know when to redraw
+        self._lock = threading.Lock()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    @property
+    def exit_text(self):
+        """The exit code for display; "?" when it could not be collected."""
+        return "?" if self.exit_code is None else str(self.exit_code)
+
+    @property
+    def runtime(self):
+        return (self.finished or time.time()) - self.started
+
+    def feed(self, data, final=False):
+        with self._lock:
+            text = self.partial + self._decoder.decode(data, final)
+            parts = text.split("\n")
+            for line in parts[:-1]:
+                self.lines.append(line.rstrip("\r").rpartition("\r")[2])
+            # Keep a trailing \r so the next chunk overwrites this line
+            last = parts[-1]
+            self.partial = last.rstrip("\r").rpartition("\r")[2] + ("\r" if last.endswith("\r") else "")
+            self.version += 1
+
+    def output(self):
+        """All output lines, including the line still being written."""
+        with self._lock:
+            partial = self.partial.rstrip("\r")
+            return list(self.lines) + ([partial] if partial else [])
+
+    def send(self, text):
+        """Writes a line to the program's stdin, for scripts that prompt with input()."""
+        if not self.running or self.process.stdin is None:
+            return
+        try:
+            self.process.stdin.write((text + "\n").encode())
+            self.process.stdin.flush()
+            with self._lock:
+                self.lines.append(f"> {text}")
+                self.version += 1
+        except OSError:
+            pass
+
+    def terminate(self):
+        """Stops the job and everything it started, e.g. process pool workers."""
+        if self.running:
+            # Jobs lead their own session and process group
+            try:
+                os.killpg(self.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+class JobRunner:
+    """
+    Runs programs as child processes with piped output. A background thread
+    reads their output with non-blocking reads and reaps finished jobs, so
+    pipes never fill up while the menu shows another screen.
+    """
+    def __init__(self, warm_pool=None):
+        self.warm_pool = warm_pool
+        self.jobs = []
+        self.selector = selectors.DefaultSelector()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._pump = None
+
+    def start(self, name, script_path, launch_args="", cwd=None, env=None, cpus=None, nice=0):
+        """
+        Starts a job. env is added to the environment, cpus pins the job to
+        those CPU ids and nice lowers its priority; children inherit all three.
+        """
+        args = shlex.split(launch_args or "")
+        command = [sys.executable, script_path] + args
+        process = None
+        if self.warm_pool is not None:
+            # Falls back to a fresh interpreter while the worker is still warming up
+            process = self.warm_pool.launch(script_path, args, cwd, env, cpus, nice)
+        if process is None:
+            process = subprocess.Popen(
+                command, cwd=cwd, env=dict(os.environ, PYTHONUNBUFFERED="1", **(env or {})),
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                bufsize=0, start_new_session=True,
+            )
+            # Placed from here rather than in a preexec_fn, which is unsafe in a
+            # threaded parent. Popen returns once the child has exec'd, before
+            # the interpreter starts any threads, so they inherit the placement.
+            try:
+                apply_placement(cpus, nice, process.pid)
+            except OSError:
+                process.kill()
+                process.wait()
+                raise
+        os.set_blocking(process.stdout.fileno(), False)
+        with self._lock:
+            job = Job(self._next_id, name, command, process)
+            job.cpus, job.nice = cpus, nice
+            self._next_id += 1
+            self.jobs.append(job)
+            self.selector.register(process.stdout, selectors.EVENT_READ, job)
+            # Decided under the lock the pump exits under, so a job is never left unpumped
+            if self._pump is None:
+                self._pump = threading.Thread(target=self._pump_output, daemon=True)
+                self._pump.start()
+        return job
+
+    def _pump_output(self):
+        while True:
+            with self._lock:
+                if not self.selector.get_map():
+                    if not self.running_count():
+                        self._pump = None
+                        return
+                    # Output closed but the process is still exiting
+                    self._poll(timeout=0)
+                    waiting = True
+                else:
+                    self._poll(timeout=0.1)
+                    waiting = False
+            if waiting:
+                time.sleep(0.1)
+
+    def poll(self, timeout=0):
+        """Reads any pending output and reaps finished jobs. Returns True if anything changed."""
+        with self._lock:
+            return self._poll(timeout)
+
+    def _poll(self, timeout):
+        changed = False
+        ready = self.selector.select(timeout=timeout) if self.selector.get_map() else []
+        for key, _ in ready:
+            job = key.data
+            try:
+                data = os.read(key.fd, 65536)
+            except BlockingIOError:
+                continue
+            if data:
+                job.feed(data)
+            else:
+                job.feed(b"", final=True)
+                self.selector.unregister(key.fileobj)
+                key.fileobj.close()
+            changed = True
+
+        for job in self.jobs:
+            if job.running:
+                job.peak_rss_kb = max(job.peak_rss_kb, read_peak_rss_kb(job.pid))
+                changed |= self._reap(job)
+        return changed
+
+    def _reap(self, job):
+        if hasattr(job.process, "reap"):
+            # Warm jobs are reaped by their worker, which reports the result
+            finished = job.process.reap()
+            if finished is None:
+                return False
+            exit_code, peak_rss_kb = finished
+        else:
+            try:
+                pid, status, usage = os.wait4(job.pid, os.WNOHANG)
+            except ChildProcessError:
+                # Already reaped elsewhere, so its exit status is unknown
+                pid, status, usage = job.pid, None, None
+            if pid == 0:
+                return False
+            exit_code = os.waitstatus_to_exitcode(status) if status is not None else None
+            # ru_maxrss is in kilobytes on Linux
+            peak_rss_kb = usage.ru_maxrss if usage is not None else 0
+
+        job.peak_rss_kb = max(job.peak_rss_kb, peak_rss_kb)
+        if job.process.stdin is not None:
+            try:
+                job.process.stdin.close()
+            except OSError:
+                pass
+        with job._lock:
+            job.exit_code = exit_code
+            # Popen must not wait on the pid again; it may belong to a new child by now
+            job.process.returncode = exit_code if exit_code is not None else -1
+            job.finished = time.time()
+            job.version += 1
+        return True
+
+    def renice(self, job, nice):
+        """Changes the nice level of a running job and every process in its session."""
+        # Jobs lead their own process group, so this also reaches data loader workers
+        os.setpriority(os.PRIO_PGRP, job.pid, nice)
+        job.nice = nice
+
+    def running_count(self):
+        return sum(1 for job in self.jobs if job.running)
+
+    def terminate_all(self):
+        for job in self.jobs:
+            job.terminate()
+
+def apply_placement(cpus=None, nice=0, pid=0):
+    """Pins process pid (0 for the calling process) to cpus and lowers its priority by nice."""
+    if cpus:
+        os.sched_setaffinity(pid, cpus)
+    if nice:
+        os.setpriority(os.PRIO_PROCESS, pid, min(19, os.getpriority(os.PRIO_PROCESS, pid) + nice))
+
+def read_peak_rss_kb(pid):
+    """Peak resident set size of a running process from /proc, or 0 when unavailable."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def format_rss(kilobytes):
+    if kilobytes >= 1024 * 1024:
+        return f"{kilobytes / (1024 * 1024):.1f}G"
+    if kilobytes >= 1024:
+        return f"{kilobytes / 1024:.0f}M"
+    return f"{kilobytes}K"
@@ -0,0 +1,171 @@
+import asyncio
+import itertools
+import os
+import socket
+import struct
+import time
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+class LatencyRing:
+    """
+    Fixed-size ring buffer of latency samples in milliseconds.
+    A lost probe is stored as None so loss can be reported alongside latency.
+    """
+    def __init__(self, size=60):
+        self.size = size
+        self.samples = [None] * size
+        self.count = 0
+        self.index = 0
+
+    def add(self, latency):
+        self.samples[self.index] = latency
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def ordered(self):
+        """Samples from oldest to newest."""
+        if self.count < self.size:
+            return self.samples[:self.count]
+        return self.samples[self.index:] + self.samples[:self.index]
+
+    def last(self):
+        return self.samples[(self.index - 1) % self.size] if self.count else None
+
+    def stats(self):
+        """Returns p50, p95, mean, jitter (mean change between replies) and loss (0-1)."""
+        ordered = self.ordered()
+        received = [s for s in ordered if s is not None]
+        if not received:
+            return {"p50": None, "p95": None, "mean": None, "jitter": None, "loss": 1.0 if ordered else 0.0}
+        ranked = sorted(received)
+        jitter = (sum(abs(b - a) for a, b in zip(received, received[1:])) / (len(received) - 1)
+                  if len(received) > 1 else 0.0)
+        return {
+            "p50": percentile(ranked, 50),
+            "p95": percentile(ranked, 95),
+            "mean": sum(received) / len(received),
+            "jitter": jitter,
+            "loss": 1 - len(received) / len(ordered),
+        }
+
+def percentile(ranked, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, -(-len(ranked) * percent // 100))
+    return ranked[int(rank) - 1]
+
+def icmp_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def icmp_available():
+    """True when unprivileged ICMP echo sockets are allowed (net.ipv4.ping_group_range)."""
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP).close()
+        return True
+    except OSError:
+        return False
+
+class LatencyProber:
+    """
+    Measures latency to several targets in-process with asyncio.
+    Each target is {"host": ..., "port": ...}; ICMP echo is used when the
+    system allows it, otherwise the time to open a TCP connection to port.
+    """
+    def __init__(self, targets, interval=1.0, timeout=2.0, history=60, method="auto"):
+        self.targets = targets
+        self.interval = interval
+        self.timeout = timeout
+        self.rings = {self.target_name(t): LatencyRing(history) for t in targets}
+        if method == "auto":
+            method = "icmp" if icmp_available() else "tcp"
+        self.method = method
+        self._sequence = itertools.count(1)
+        self.listeners = []
+
+    @staticmethod
+    def target_name(target):
+        return f"{target['host']}:{target.get('port', 53)}"
+
+    async def probe_tcp(self, host, port):
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.timeout)
+        except ConnectionRefusedError:
+            # A refusal is still a round trip to the host
+            return (time.perf_counter() - start) * 1000
+        except (OSError, asyncio.TimeoutError):
+            return None
+        latency = (time.perf_counter() - start) * 1000
+        writer.close()
+        return latency
+
+    async def probe_icmp(self, host):
+        loop = asyncio.get_running_loop()
+        sequence = next(self._sequence) & 0xFFFF
+        identifier = os.getpid() & 0xFFFF
+        payload = struct.pack("!d", time.perf_counter())
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+        packet = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, icmp_checksum(header + payload),
+                             identifier, sequence) + payload
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except OSError:
+            return None
+        with sock:
+            sock.setblocking(False)
+            try:
+                address = (await loop.getaddrinfo(host, None, family=socket.AF_INET))[0][4][0]
+                start = time.perf_counter()
+                await loop.sock_sendto(sock, packet, (address, 0))
+                deadline = start + self.timeout
+                while True:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        return None
+                    reply = await asyncio.wait_for(loop.sock_recv(sock, 1024), remaining)
+                    # The kernel rewrites the identifier, so match on sequence only
+                    reply_type, _, _, _, reply_sequence = struct.unpack("!BBHHH", reply[:8])
+                    if reply_type == ICMP_ECHO_REPLY and reply_sequence == sequence:
+                        return (time.perf_counter() - start) * 1000
+            except (OSError, asyncio.TimeoutError):
+                return None
+
+    async def probe(self, target):
+        if self.method == "icmp":
+            return await self.probe_icmp(target["host"])
+        return await self.probe_tcp(target["host"], target.get("port", 53))
+
+    async def probe_all(self):
+        """Probes every target concurrently and records the results."""
+        latencies = await asyncio.gather(*(self.probe(t) for t in self.targets))
+        results = {}
+        for target, latency in zip(self.targets, latencies):
+            name = self.target_name(target)
+            self.rings[name].add(latency)
+            results[name] = latency
+        for listener in self.listeners:
+            listener(results)
+        return results
+
+    async def run(self, should_stop):
+        """Probes every interval until should_stop() returns True."""
+        while not should_stop():
+            started = time.monotonic()
+            await self.probe_all()
+            # Sleep in short steps so a stop request is noticed quickly
+            while not should_stop() and time.monotonic() - started < self.interval:
+                await asyncio.sleep(min(0.1, self.interval))
+
+    def online(self):
+        """True when the most recent probe of any target got a reply."""
+        return any(ring.last() is not None for ring in self.rings.values())
+
+    def primary_stats(self):
+        return self.rings[self.target_name(self.targets[0])].stats()
@@ -1,5 +1,42 @@
+# [terminax]
+# name = Bandwidth Check
+# menu = Tools
+# args =
+# resources = cpu=1 memory=256M
+# gpu_heavy = false
+import os
+import json
 import iperf3
 import time
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from telemetry import record_bandwidth_result
+from appconfig import load_settings
+
+def read_logs_path(settings_file="settings.ini"):
+    config = load_settings(settings_file)
+    return config.get("Paths", "logs_path", fallback=None)
+
+def save_result(server_ip, port, reverse, result=None, error=None):
+    """Stores the result in the telemetry store under logs_path, if configured."""
+    logs_path = read_logs_path()
+    if not logs_path:
+        return
+    try:
+        record_bandwidth_result(
+            logs_path,
+            server=server_ip,
+            port=port,
+            protocol=result.protocol if result is not None else None,
+            direction="download" if reverse else "upload",
+            streams=1,
+            sent_mbps=result.sent_Mbps if result is not None else None,
+            received_mbps=result.received_Mbps if result is not None else None,
+            duration=result.duration if result is not None else None,
+            error=error,
+        )
+    except Exception as e:
+        print(f"Could not save result to telemetry store: {e}")
 
 def get_user_input(prompt, default=None):
     """Get user input with an optional default value."""
@@ -19,7 +56,9 @@ def check_bandwidth(server_ip, port, duration, reverse):
         result = client.run()
         if result.error:
             print(f"Error: {result.error}")
+            save_result(server_ip, port, reverse, error=result.error)
         else:
+            save_result(server_ip, port, reverse, result)
             print(f"Test Completed:\n"
                   f"  Protocol: {result.protocol}\n"
                   f"  Sent Bandwidth: {result.sent_Mbps:.2f} Mbps\n"
@@ -28,12 +67,182 @@ def check_bandwidth(server_ip, port, duration, reverse):
     except Exception as e:
         print(f"An error occurred: {e}")
 
+def read_batch_settings(settings_file="settings.ini"):
+    """
+    Reads the [Bandwidth] section of settings.ini used by the batch mode.
+    servers is a comma separated list of host:port entries.
+    """
+    config = load_settings(settings_file)
+    servers = []
+    for entry in config.get("Bandwidth", "servers", fallback="").split(","):
+        host, _, port = entry.strip().rpartition(":")
+        if entry.strip():
+            servers.append((host or entry.strip(), int(port) if host else 5201))
+    directions = [d.strip() for d in config.get("Bandwidth", "directions", fallback="upload,download").split(",")]
+    return {
+        "servers": servers,
+        "duration": config.getint("Bandwidth", "duration", fallback=10),
+        "num_streams": config.getint("Bandwidth", "num_streams", fallback=4),
+        "directions": [d for d in directions if d in ("upload", "download")],
+        "udp": config.getboolean("Bandwidth", "udp", fallback=False),
+        "udp_bandwidth": config.getint("Bandwidth", "udp_bandwidth", fallback=100_000_000),
+        "max_workers": config.getint("Bandwidth", "max_workers", fallback=4),
+    }
+
+def interval_throughput(result_json):
+    """Per-interval throughput in Mbps from the iperf3 JSON report."""
+    intervals = []
+    for interval in result_json.get("intervals", []):
+        total = interval.get("sum", {})
+        intervals.append({
+            "start": total.get("start"),
+            "end": total.get("end"),
+            "mbps": total.get("bits_per_second", 0) / 1e6,
+        })
+    return intervals
+
+def run_test(server_ip, port, direction, protocol, num_streams, duration, udp_bandwidth):
+    """Runs one iperf3 test and returns its result as a dict."""
+    client = iperf3.Client()
+    client.server_hostname = server_ip
+    client.port = port
+    client.duration = duration
+    client.reverse = direction == "download"
+    client.num_streams = num_streams
+    client.protocol = protocol
+    if protocol == "udp":
+        client.bandwidth = udp_bandwidth
+
+    test = {
+        "server": server_ip,
+        "port": port,
+        "direction": direction,
+        "protocol": protocol,
+        "streams": num_streams,
+        "duration": duration,
+    }
+    result = client.run()
+    if result is None or result.error:
+        test["error"] = result.error if result is not None else "no result from iperf3"
+        return test
+
+    if protocol == "udp":
+        test.update({
+            "sent_mbps": result.Mbps,
+            "received_mbps": result.Mbps * (1 - result.lost_percent / 100),
+            "jitter_ms": result.jitter_ms,
+            "lost_percent": result.lost_percent,
+        })
+    else:
+        test.update({"sent_mbps": result.sent_Mbps, "received_mbps": result.received_Mbps})
+    test["intervals"] = interval_throughput(result.json)
+    return test
+
+def run_batch(settings):
+    """
+    Tests every configured server in both directions with parallel streams,
+    and optionally UDP. Every test runs in a fresh process, because libiperf
+    is not safe to run twice in one process. An iperf3 server only accepts
+    one test at a time, so the tests of one server run one after another
+    and only different servers are tested concurrently.
+    Returns the aggregated report.
+    """
+    protocols = ["tcp", "udp"] if settings["udp"] else ["tcp"]
+    tests = [
+        (direction, protocol, settings["num_streams"], settings["duration"], settings["udp_bandwidth"])
+        for protocol in protocols for direction in settings["directions"]
+    ]
+    servers = settings["servers"]
+    remaining = [list(tests) for _ in servers]
+    results = [[] for _ in servers]
+
+    started = time.time()
+    # max_tasks_per_child needs the spawn start method
+    with ProcessPoolExecutor(max_workers=max(1, min(settings["max_workers"], len(servers))),
+                             mp_context=multiprocessing.get_context("spawn"), max_tasks_per_child=1) as executor:
+        running = {}
+
+        def submit_next(index):
+            if remaining[index]:
+                host, port = servers[index]
+                test = remaining[index].pop(0)
+                running[executor.submit(run_test, host, port, *test)] = (index, test)
+
+        for index in range(len(servers)):
+            submit_next(index)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, (direction, protocol, *_) = running.pop(future)
+                host, port = servers[index]
+                try:
+                    results[index].append(future.result())
+                except Exception as e:
+                    results[index].append({"server": host, "port": port, "direction": direction,
+                                           "protocol": protocol, "error": str(e)})
+                submit_next(index)
+    results = [test for server_results in results for test in server_results]
+
+    for test in results:
+        save_batch_result(test)
+    return {"started": started, "finished": time.time(), "results": results}
+
+def save_batch_result(test):
+    logs_path = read_logs_path()
+    if not logs_path:
+        return
+    try:
+        record_bandwidth_result(
+            logs_path,
+            server=test["server"],
+            port=test.get("port"),
+            protocol=test.get("protocol"),
+            direction=test.get("direction"),
+            streams=test.get("streams"),
+            sent_mbps=test.get("sent_mbps"),
+            received_mbps=test.get("received_mbps"),
+            duration=test.get("duration"),
+            error=test.get("error"),
+            details=test.get("intervals"),
+        )
+    except Exception as e:
+        print(f"Could not save result to telemetry store: {e}")
+
+def batch_mode():
+    settings = read_batch_settings()
+    if not settings["servers"]:
+        print("No servers configured. Add 'servers = host:port, ...' to the [Bandwidth] section of settings.ini.")
+        return
+
+    print(f"Testing {len(settings['servers'])} servers with {settings['num_streams']} streams...")
+    report = run_batch(settings)
+    for test in report["results"]:
+        name = f"{test['server']}:{test.get('port')} {test.get('protocol', '')} {test.get('direction', '')}"
+        if "error" in test:
+            print(f"  {name}: error: {test['error']}")
+        else:
+            print(f"  {name}: sent {test['sent_mbps']:.2f} Mbps, received {test['received_mbps']:.2f} Mbps")
+
+    logs_path = read_logs_path() or "."
+    os.makedirs(logs_path, exist_ok=True)
+    report_path = os.path.join(logs_path, time.strftime("bandwidth-%Y%m%d-%H%M%S.json"))
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved to {report_path}")
+
 def main():
     print("=== Bandwidth Checker ===")
+    print("1. Single test")
+    print("2. Batch test of the servers in settings.ini")
+    choice = get_user_input("Enter your choice (1/2)", "1")
+    if choice == "2":
+        batch_mode()
+        return
+
     server_ip = get_user_input("Enter the server IP address")
     port = int(get_user_input("Enter the port number"))
     duration = int(get_user_input("Enter the test duration"))
-    reverse = get_user_input("Run in reverse mode? (Y/N)", "N").lower() == "Y"
+    reverse = get_user_input("Run in reverse mode? (Y/N)", "N").lower() == "y"
 
     check_bandwidth(server_ip, port, duration, reverse)
 
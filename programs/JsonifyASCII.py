@@ -1,37 +1,58 @@
+# [terminax]
+# name = Jsonify ASCII Art
+# menu = Tools
+# args =
+# resources = cpu=1 memory=256M
+# gpu_heavy = false
 import json
-import configparser
 import os
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from appconfig import load_settings
+from bannercache import write_banner_cache
 
-def ascii_art_to_json(input_path, output_path):
+def convert_art_file(input_file, output_folder):
+    """
+    Converts one ASCII art file to JSON and to a banner cache that TerminaX
+    can load directly. Returns (file name, error).
+    """
+    file_name = os.path.basename(input_file)
+    base_name = os.path.join(output_folder, os.path.splitext(file_name)[0])
+    try:
+        with open(input_file, 'r') as f:
+            lines = [line.rstrip() for line in f]  # Preserve spaces at the start
+
+        # Create a JSON-friendly single-line string
+        with open(base_name + ".json", 'w') as f:
+            json.dump({"ascii_art": "\n".join(lines)}, f, indent=4)
+
+        write_banner_cache(base_name + ".banner", lines)
+        return file_name, None
+    except Exception as e:
+        return file_name, str(e)
+
+def ascii_art_to_json(input_path, output_path, workers=1):
     try:
         # Ensure the output directory exists
         os.makedirs(output_path, exist_ok=True)
-        
-        # Process all .txt files in the input directory
-        for file_name in os.listdir(input_path):
-            if file_name.endswith(".txt"):
-                input_file = os.path.join(input_path, file_name)
-                output_file = os.path.join(output_path, f"{os.path.splitext(file_name)[0]}.json")
-
-                # Read ASCII art from the input file
-                with open(input_file, 'r') as f:
-                    lines = f.readlines()
-                
-                # Create a JSON-friendly single-line string
-                formatted_art = " \n".join(line.rstrip() for line in lines)  # Preserve spaces at the start
-                
-                # Save it to a JSON file
-                with open(output_file, 'w') as f:
-                    json.dump({"ascii_art": formatted_art}, f, indent=4)
-                
-                print(f"Converted {file_name} to JSON: {output_file}")
+
+        art_files = (entry.path for entry in os.scandir(input_path) if entry.is_file() and entry.name.endswith(".txt"))
+        failures = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for file_name, error in executor.map(convert_art_file, art_files, repeat(output_path), chunksize=16):
+                if error:
+                    failures.append(file_name)
+                    print(f"Error converting {file_name}: {error}")
+                else:
+                    print(f"Converted {file_name} to JSON and banner cache in {output_path}")
+        if failures:
+            print(f"{len(failures)} file(s) could not be converted.")
     except Exception as e:
         print(f"Error: {e}")
 
 def main():
     # Load settings from settings.ini
-    config = configparser.ConfigParser()
-    config.read("settings.ini")
+    config = load_settings("settings.ini")
     
     try:
         input_path = config["Paths"]["input_path"]
@@ -41,8 +62,10 @@ def main():
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Input path does not exist: {input_path}")
 
+        workers = config.getint("Jsonify", "workers", fallback=0)
+
         # Convert ASCII art to JSON
-        ascii_art_to_json(input_path, output_path)
+        ascii_art_to_json(input_path, output_path, workers if workers > 0 else (os.cpu_count() or 1))
     except KeyError as e:
         print(f"Missing configuration in settings.ini: {e}")
     except Exception as e:
@@ -1,11 +1,30 @@
+# [terminax]
+# name = Model Infrence
+# menu = Machine Vision/Use Model
+# args =
+# resources = gpu=1 cpu=4 memory=4G
+# gpu_heavy = true
 import os
+import time
+import json
+import hashlib
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import cv2
-from ultralytics import YOLO
-import configparser
+import numpy as np
+from shards import ShardReader, find_shard_folders
+from video import device_index, is_video_file, iter_sampled_frames, open_capture, source_name
+from backends import find_onnx_model, load_model, read_backend_settings
+from appconfig import load_settings
+from tracing import span, count, traced_iter
+from labelstore import format_labels
+import labelstore
+import tracing
 
 def read_settings(settings_file):
-    config = configparser.ConfigParser()
-    config.read(settings_file)
+    config = load_settings(settings_file)
 
     try:
         input_path = config["Paths"]["input_path"]
@@ -16,21 +35,561 @@ def read_settings(settings_file):
         print(f"Error: Missing key in settings file: {e}")
         return None, None, None
 
+def read_inference_settings(settings_file):
+    """
+    Reads the batching options from the [Inference] section of settings.ini.
+    Returns a tuple (batch_size, queue_depth, decode_workers).
+    """
+    config = load_settings(settings_file)
+
+    batch_size = config.getint("Inference", "batch_size", fallback=1)
+    queue_depth = config.getint("Inference", "queue_depth", fallback=4)
+    decode_workers = config.getint("Inference", "decode_workers", fallback=4)
+    return max(1, batch_size), max(1, queue_depth), max(1, decode_workers)
+
+def read_video_settings(settings_file):
+    """
+    Reads the video options from the [Inference] section of settings.ini.
+    Returns a dict with frame_interval, extract_mode, save_frames and jpeg_quality.
+    """
+    config = load_settings(settings_file)
+
+    return {
+        "frame_interval": config.getfloat("Inference", "frame_interval", fallback=1.0),
+        "extract_mode": config.get("Inference", "extract_mode", fallback="seek"),
+        "save_frames": config.getboolean("Inference", "save_frames", fallback=False),
+        "jpeg_quality": config.getint("Inference", "jpeg_quality", fallback=95),
+    }
+
+def read_label_store_setting(settings_file):
+    """True when [Inference] label_store asks for labels to be indexed in output_path/labels.db too."""
+    config = load_settings(settings_file)
+
+    return config.getboolean("Inference", "label_store", fallback=False)
+
+MANIFEST_FILE_NAME = "labels_manifest.jsonl"
+
+def file_fingerprint(path):
+    """Cheap change detection for an image: [size, mtime_ns]."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def model_fingerprint(model_path):
+    """
+    Hashes the model weights so labels are invalidated when the model changes.
+    Directories are hashed by the names, sizes and mtimes of their files.
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(model_path):
+        for root, _, files in sorted(os.walk(model_path)):
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                digest.update(os.path.relpath(file_path, model_path).encode())
+                digest.update(str(file_fingerprint(file_path)).encode())
+    elif os.path.isfile(model_path):
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+# Backend options that change which boxes the model returns
+LABELLING_OPTIONS = ("backend", "imgsz", "conf", "iou")
+
+def labelling_key(model_path, backend_settings=None):
+    """
+    Everything that decides the labels: the model path and weights, and the
+    backend options that change detections. For the ONNX backend this also
+    covers the exported file, which can be replaced by a re-export or an
+    int8 quantized copy without the model folder changing.
+    """
+    key = {"model_path": model_path, "model_hash": model_fingerprint(model_path)}
+    if backend_settings:
+        key.update({option: backend_settings.get(option) for option in LABELLING_OPTIONS})
+        if backend_settings.get("backend") == "onnx":
+            onnx_path = backend_settings.get("onnx_model_path") or find_onnx_model(model_path)
+            key["onnx_model_path"] = onnx_path
+            key["onnx_hash"] = model_fingerprint(onnx_path) if onnx_path else None
+    return key
+
+class LabelManifest:
+    """
+    Records which images already have up-to-date labels in output_folder.
+    The manifest is an append-only journal: a header line with the
+    labelling_key that produced the labels, then one line per labelled image
+    with its fingerprint, the last line for an image winning. Recording an
+    image appends one line, so large folders never rewrite the whole file.
+    A journal for a different key is stale and is started over.
+    """
+    def __init__(self, output_folder, model_path, flush_every=100, backend_settings=None):
+        self.path = os.path.join(output_folder, MANIFEST_FILE_NAME)
+        self.output_folder = output_folder
+        self.model_path = model_path
+        self.key = labelling_key(model_path, backend_settings)
+        self.flush_every = flush_every
+        self.entries = {}
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self.load()
+
+    def load(self):
+        lines = 0
+        try:
+            with open(self.path, "r") as f:
+                header = json.loads(f.readline() or "null")
+                if isinstance(header, dict) and header.get("key") == self.key:
+                    for line in f:
+                        try:
+                            image_name, fingerprint = json.loads(line)
+                        except ValueError:
+                            # A line cut short by a crash
+                            continue
+                        self.entries[image_name] = fingerprint
+                        lines += 1
+        except (OSError, ValueError):
+            pass
+        if self.entries and lines <= 2 * len(self.entries):
+            self._file = open(self.path, "a")
+        else:
+            # New, stale or mostly superseded: write a compact journal
+            self._rewrite()
+
+    def _rewrite(self):
+        # Write through a temp file so a crash never leaves a truncated manifest
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(json.dumps({"key": self.key}) + "\n")
+            for image_name, fingerprint in self.entries.items():
+                f.write(json.dumps([image_name, fingerprint]) + "\n")
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "a")
+
+    def save(self):
+        """Flushes the recorded images to disk."""
+        with self._lock:
+            self._file.flush()
+            self._dirty = 0
+
+    def is_current(self, input_folder, image_name):
+        label_path = os.path.join(self.output_folder, os.path.splitext(image_name)[0] + ".txt")
+        if image_name not in self.entries or not os.path.exists(label_path):
+            return False
+        try:
+            return self.entries[image_name] == file_fingerprint(os.path.join(input_folder, image_name))
+        except OSError:
+            return False
+
+    def record(self, input_folder, image_name):
+        fingerprint = file_fingerprint(os.path.join(input_folder, image_name))
+        with self._lock:
+            self.entries[image_name] = fingerprint
+            self._file.write(json.dumps([image_name, fingerprint]) + "\n")
+            self._dirty += 1
+            if self._dirty >= self.flush_every:
+                self._file.flush()
+                self._dirty = 0
+
+def list_images(input_folder, manifest=None):
+    """Lists the JPG files in input_folder that still need labels."""
+    images = [f for f in os.listdir(input_folder) if f.lower().endswith('.jpg')]
+    if manifest is None:
+        return images
+
+    pending = [f for f in images if not manifest.is_current(input_folder, f)]
+    skipped = len(images) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} images with up-to-date labels")
+    return pending
+
+def read_image(image_path):
+    with span("decode"):
+        return cv2.imread(image_path)
+
 # Function to process images
-def process_images(input_folder, output_folder, model):
+def process_images(input_folder, output_folder, model, manifest=None):
     # List all JPG files in the input folder
-    images = [f for f in os.listdir(input_folder) if f.lower().endswith('.jpg')]
+    images = list_images(input_folder, manifest)
 
     for image_name in images:
         # Read the image
-        image_path = os.path.join(input_folder, image_name)
-        image = cv2.imread(image_path)
+        image = read_image(os.path.join(input_folder, image_name))
+        if image is None:
+            print(f"Failed to read image: {image_name}")
+            continue
         # Run inference
-        results = model(image)
+        with span("infer"):
+            results = model(image)
+        count("images")
         # Save labels in YOLO format
         save_yolo_labels(image, results, image_name, output_folder)
+        if manifest is not None:
+            manifest.record(input_folder, image_name)
         print(f"Processed and saved labels for: {image_name}")
 
+    if manifest is not None:
+        manifest.save()
+
+class LabelWriter:
+    """
+    Calls write_batch on a background thread for every batch put on its
+    queue. If write_batch raises (disk full, no permission), the thread
+    drops the remaining batches and the exception is raised again from the
+    next put() or check(), so the run stops instead of blocking on a full
+    queue. written counts the items of the batches written successfully.
+    """
+    def __init__(self, write_batch, queue_depth=4):
+        self.write_batch = write_batch
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.error = None
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.write_batch(batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.error = e
+
+    def put(self, batch):
+        self.check()
+        self.queue.put(batch)
+
+    def check(self):
+        """Raises the exception that stopped the writer, if any."""
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """Waits for the queued batches to be written."""
+        self.queue.put(None)
+        self._thread.join()
+
+# Function to process images in batches
+def process_images_batched(input_folder, output_folder, model, batch_size=16, queue_depth=4, decode_workers=4, manifest=None):
+    """
+    Runs inference over the input folder in fixed-size batches.
+    A thread pool decodes images ahead of the model, and a writer thread
+    saves the labels so the model never waits on disk.
+    """
+    images = list_images(input_folder, manifest)
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+
+    start_time = time.perf_counter()
+
+    def write_batch(batch):
+        for image, result, image_name in batch:
+            save_yolo_labels(image, [result], image_name, output_folder)
+            if manifest is not None:
+                manifest.record(input_folder, image_name)
+            print(f"Processed and saved labels for: {image_name}")
+
+    writer = LabelWriter(write_batch, queue_depth)
+
+    try:
+        with ThreadPoolExecutor(max_workers=decode_workers) as decode_pool:
+            pending = deque()
+            batch_iter = iter(batches)
+
+            def submit_next_batch():
+                batch = next(batch_iter, None)
+                if batch is None:
+                    return False
+                pending.append([
+                    (name, decode_pool.submit(read_image, os.path.join(input_folder, name)))
+                    for name in batch
+                ])
+                return True
+
+            # Keep up to queue_depth batches decoding ahead of the model
+            for _ in range(queue_depth):
+                if not submit_next_batch():
+                    break
+
+            while pending:
+                decoded = []
+                for image_name, future in pending.popleft():
+                    image = future.result()
+                    if image is None:
+                        print(f"Failed to read image: {image_name}")
+                        continue
+                    decoded.append((image_name, image))
+                submit_next_batch()
+
+                if not decoded:
+                    continue
+
+                # Run inference on the whole batch in one call
+                with span("infer"):
+                    results = model([image for _, image in decoded])
+                count("images", len(decoded))
+                writer.put([
+                    (image, result, image_name)
+                    for (image_name, image), result in zip(decoded, results)
+                ])
+    finally:
+        writer.close()
+        if manifest is not None:
+            manifest.save()
+    writer.check()
+
+    processed_count = writer.written
+    elapsed = time.perf_counter() - start_time
+    rate = processed_count / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {processed_count} images in {elapsed:.2f}s ({rate:.2f} images/sec)")
+
+# Function to process images packed into shards
+def process_shards(input_folder, output_folder, model, batch_size=16, decode_workers=4, subfolder=""):
+    """
+    Runs inference on images read straight out of the shards in input_folder,
+    writing one label file per sample key into output_folder/subfolder.
+    """
+    reader = ShardReader(input_folder)
+    os.makedirs(os.path.join(output_folder, subfolder), exist_ok=True)
+    processed_count = 0
+
+    def read_sample(index):
+        with span("decode"):
+            return reader.read_image(index)
+
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=decode_workers) as decode_pool:
+        for first in range(0, len(reader), batch_size):
+            indices = range(first, min(first + batch_size, len(reader)))
+            decoded = [
+                (reader.key(i), image)
+                for i, image in zip(indices, decode_pool.map(read_sample, indices))
+                if image is not None
+            ]
+            if not decoded:
+                continue
+
+            with span("infer"):
+                results = model([image for _, image in decoded])
+            count("images", len(decoded))
+            for (key, image), result in zip(decoded, results):
+                save_yolo_labels(image, [result], os.path.join(subfolder, f"{key}.jpg"), output_folder)
+            processed_count += len(decoded)
+            print(f"Processed and saved labels for {processed_count}/{len(reader)} shard samples")
+
+    elapsed = time.perf_counter() - start_time
+    rate = processed_count / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {processed_count} images in {elapsed:.2f}s ({rate:.2f} images/sec)")
+
+FRAME_INDEX_FILE_NAME = "frames.csv"
+
+def decode_frames(video_capture, frame_queue, stop, frame_interval=1.0, mode="seek", live=False):
+    """
+    Producer thread: puts (frame_index, timestamp, frame) for every sampled
+    frame on frame_queue, then None. Timestamps are seconds from the start
+    of the video, or from when reading began for a live device.
+    """
+    fps = video_capture.get(cv2.CAP_PROP_FPS)
+    started = time.monotonic()
+    try:
+        for frame_index, frame in traced_iter("decode", iter_sampled_frames(video_capture, frame_interval, mode=mode)):
+            if stop.is_set():
+                break
+            if live or fps <= 0:
+                timestamp = time.monotonic() - started
+            else:
+                timestamp = frame_index / fps
+            if live:
+                put_latest(frame_queue, (frame_index, timestamp, frame))
+            else:
+                frame_queue.put((frame_index, timestamp, frame))
+    finally:
+        frame_queue.put(None)
+
+def put_latest(frame_queue, item):
+    """
+    Puts item without ever blocking, dropping the oldest queued frame when
+    the queue is full. A live device keeps being read while the model is
+    busy, so the next batch holds the newest frames, not stale ones.
+    """
+    while True:
+        try:
+            frame_queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        try:
+            frame_queue.get_nowait()
+            count("dropped")
+        except queue.Empty:
+            pass
+
+def next_frame_batch(frame_queue, batch_size, live=False):
+    """
+    Collects up to batch_size frames. A live device does not wait for a full
+    batch once the queue runs dry, and with put_latest dropping old frames
+    the labels stay within about one batch of the camera.
+    Returns (batch, finished).
+    """
+    batch = []
+    while len(batch) < batch_size:
+        if live and batch:
+            try:
+                item = frame_queue.get_nowait()
+            except queue.Empty:
+                break
+        else:
+            item = frame_queue.get()
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+# Function to run inference directly on a video file or device
+def process_video(source, output_folder, model, batch_size=16, queue_depth=4, frame_interval=1.0,
+                  mode="seek", save_frames=False, jpeg_quality=95):
+    """
+    Runs inference on frames decoded straight from a video file or device,
+    without writing them to disk first. Labels go to output_folder/<video>/
+    as frame_<index>.txt, and frames.csv records the timestamp and detection
+    count of every sampled frame. It is written as frames.csv.partial and
+    only renamed once the whole video has been labelled. With save_frames, frames that have at
+    least one detection are also written as frame_<index>.jpg.
+    """
+    video_capture = open_capture(source)
+    if not video_capture.isOpened():
+        print(f"Error: Unable to open video source {source}")
+        return 0
+
+    live = device_index(source) is not None
+    name = source_name(source)
+    video_output_folder = os.path.join(output_folder, name)
+    os.makedirs(video_output_folder, exist_ok=True)
+
+    # A live device only keeps one batch of the latest frames waiting
+    frame_queue = queue.Queue(maxsize=batch_size if live else batch_size * queue_depth)
+    stop = threading.Event()
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    detection_count = 0
+    start_time = time.perf_counter()
+    # frames.csv only appears once the whole video is done, so Watch Input can tell
+    # a finished video from one that was interrupted and needs labelling again
+    index_path = os.path.join(video_output_folder, FRAME_INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    index_file = open(index_path + ".partial", "w")
+    index_file.write("frame,timestamp,detections\n")
+
+    def write_batch(batch):
+        for frame_index, timestamp, frame, result in batch:
+            frame_name = f"frame_{frame_index:06d}"
+            with span("write"):
+                boxes = boxes_to_array([result])
+                height, width = frame.shape[:2]
+                labels = normalize_boxes(boxes, width, height)
+                with open(os.path.join(video_output_folder, frame_name + ".txt"), "w") as f:
+                    f.write(format_labels(labels))
+                labelstore.record(f"{name}/{frame_name}", width, height, labels, boxes[:, 4],
+                                  source=source, frame=frame_index, timestamp=timestamp)
+                if save_frames and len(boxes):
+                    if not cv2.imwrite(os.path.join(video_output_folder, frame_name + ".jpg"), frame, params):
+                        raise OSError(f"Unable to write {frame_name}.jpg")
+                index_file.write(f"{frame_index},{timestamp:.3f},{len(boxes)}\n")
+            count("detections", len(boxes))
+        index_file.flush()
+
+    producer = threading.Thread(target=decode_frames, daemon=True,
+                                args=(video_capture, frame_queue, stop, frame_interval, mode, live))
+    writer = LabelWriter(write_batch, queue_depth)
+    producer.start()
+
+    finished = False
+    try:
+        while not finished:
+            batch, finished = next_frame_batch(frame_queue, batch_size, live)
+            if not batch:
+                continue
+            # Run inference on the whole batch in one call
+            with span("infer"):
+                results = model([frame for _, _, frame in batch])
+            count("frames", len(batch))
+            writer.put([
+                (frame_index, timestamp, frame, result)
+                for (frame_index, timestamp, frame), result in zip(batch, results)
+            ])
+            detection_count += sum(len(result.boxes) for result in results)
+            print(f"[{name}] {writer.written} frames, {detection_count} detections")
+    except KeyboardInterrupt:
+        print(f"[{name}] Stopping.")
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue
+        while producer.is_alive():
+            try:
+                frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        writer.close()
+        index_file.close()
+        video_capture.release()
+    writer.check()
+    # A live device has no end, so stopping it also completes its index
+    if finished or live:
+        os.replace(index_path + ".partial", index_path)
+
+    processed_count = writer.written
+    elapsed = time.perf_counter() - start_time
+    rate = processed_count / elapsed if elapsed > 0 else 0.0
+    print(f"[{name}] Processed {processed_count} frames in {elapsed:.2f}s ({rate:.2f} frames/sec), "
+          f"labels saved to {video_output_folder}")
+    return processed_count
+
+def list_videos(input_folder):
+    """Lists the .mov and .mp4 files in input_folder."""
+    return sorted(os.path.join(input_folder, f) for f in os.listdir(input_folder) if is_video_file(f))
+
+def boxes_to_array(results):
+    """
+    Stacks the raw box data of every result into one float64 array
+    with rows of (x1, y1, x2, y2, score, class_id).
+    """
+    arrays = []
+    for result in results:
+        data = result.boxes.data
+        if hasattr(data, "cpu"):
+            data = data.cpu().numpy()
+        data = np.asarray(data, dtype=np.float64)
+        if data.size:
+            arrays.append(data.reshape(len(data), -1)[:, :6])
+    if not arrays:
+        return np.empty((0, 6), dtype=np.float64)
+    return np.concatenate(arrays)
+
+def normalize_boxes(boxes, width, height):
+    """
+    Converts a boxes array to YOLO rows of (class_id, x_center, y_center, width, height)
+    normalized to the image size.
+    """
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+
+    # Normalize YOLO bounding box format for every box at once
+    return np.column_stack((
+        boxes[:, 5],
+        ((x1 + x2) / 2) / width,
+        ((y1 + y2) / 2) / height,
+        (x2 - x1) / width,
+        (y2 - y1) / height,
+    ))
+
+def format_yolo_labels(boxes, width, height):
+    """
+    Normalizes a boxes array to YOLO format and returns the label file text.
+    """
+    return format_labels(normalize_boxes(boxes, width, height))
+
 # Function to save YOLO labels
 def save_yolo_labels(image, results, image_name, output_folder):
     """
@@ -40,19 +599,13 @@ def save_yolo_labels(image, results, image_name, output_folder):
     label_file_name = os.path.splitext(image_name)[0] + ".txt"
     label_file_path = os.path.join(output_folder, label_file_name)
 
-    with open(label_file_path, "w") as f:
-        for result in results:
-            for bbox in result.boxes.data.tolist():
-                x1, y1, x2, y2, score, class_id = bbox[:6]
-
-                # Normalize YOLO bounding box format
-                x_center = ((x1 + x2) / 2) / width
-                y_center = ((y1 + y2) / 2) / height
-                bbox_width = (x2 - x1) / width
-                bbox_height = (y2 - y1) / height
-
-                # Write label to file
-                f.write(f"{int(class_id)} {x_center:.6f} {y_center:.6f} {bbox_width:.6f} {bbox_height:.6f}\n")
+    with span("write"):
+        boxes = boxes_to_array(results)
+        labels = normalize_boxes(boxes, width, height)
+        with open(label_file_path, "w") as f:
+            f.write(format_labels(labels))
+        # Also indexed in output_folder/labels.db when [Inference] label_store is on
+        labelstore.record(os.path.splitext(image_name)[0], width, height, labels, boxes[:, 4])
 
 if __name__ == "__main__":
     # Path to the settings file
@@ -68,8 +621,53 @@ if __name__ == "__main__":
     # Ensure output folder exists
     os.makedirs(output_folder, exist_ok=True)
 
-    # Load the custom YOLOv8 model
-    model = YOLO(current_model_path)
+    # input_path may also name a single video file or a video device such as /dev/video0
+    single_video = is_video_file(input_folder) or device_index(input_folder) is not None
+    if not single_video and not os.path.isdir(input_folder):
+        print(f"Error: Input path {input_folder} does not exist.")
+        exit(1)
+
+    # Per-stage timings go to logs_path when [Tracing] is enabled
+    tracing.start("Model Infrence", settings_file)
+
+    # Labels are also appended to output_folder/labels.db when [Inference] label_store is on
+    if read_label_store_setting(settings_file):
+        labelstore.start(output_folder)
+
+    # Load the custom YOLOv8 model with the configured backend (PyTorch or ONNX Runtime)
+    with span("load_model"):
+        backend_settings = read_backend_settings(settings_file)
+        model = load_model(current_model_path, backend_settings)
+
+    batch_size, queue_depth, decode_workers = read_inference_settings(settings_file)
+
+    # Videos are decoded straight into the model, without extracting JPGs first
+    videos = [input_folder] if single_video else list_videos(input_folder)
+    if videos:
+        video_settings = read_video_settings(settings_file)
+        for video in videos:
+            process_video(video, output_folder, model, batch_size, queue_depth,
+                          video_settings["frame_interval"], video_settings["extract_mode"],
+                          video_settings["save_frames"], video_settings["jpeg_quality"])
+    if single_video:
+        exit(0)
+
+    # Shard folders written by Prep-Media (input_path itself, or one per video
+    # under it) are read without unpacking
+    shard_folders = find_shard_folders(input_folder)
+    if shard_folders:
+        for shard_folder in shard_folders:
+            # Frame keys repeat between videos, so each folder keeps its own labels
+            subfolder = os.path.relpath(shard_folder, input_folder)
+            process_shards(shard_folder, output_folder, model, batch_size, decode_workers,
+                           subfolder="" if subfolder == "." else subfolder)
+        exit(0)
+
+    # Skip images whose labels are still valid for this model
+    manifest = LabelManifest(output_folder, current_model_path, backend_settings=backend_settings)
 
     # Process images
-    process_images(input_folder, output_folder, model)
+    if batch_size > 1:
+        process_images_batched(input_folder, output_folder, model, batch_size, queue_depth, decode_workers, manifest)
+    else:
+        process_images(input_folder, output_folder, model, manifest)
@@ -1,20 +1,40 @@
+# [terminax]
+# name = Prepare Media
+# menu = Machine Vision/Preparation
+# args =
+# resources = cpu=4 memory=2G
+# gpu_heavy = false
 import os
-import configparser
 from PIL import Image
 import cv2
 import glob
+import time
+import tempfile
+import numpy as np
+from collections import deque
+from itertools import repeat
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from shards import ShardWriter
+from video import iter_sampled_frames
+from appconfig import load_settings
+from tracing import span, count, traced_iter
+import tracing
+
+# Read once at import; os.umask can only be read by setting it
+UMASK = os.umask(0)
+os.umask(UMASK)
 
 def read_settings():
     """
     Reads the input and output paths from settings.ini.
     Returns a tuple (input_path, output_path).
     """
-    config = configparser.ConfigParser()
     if not os.path.exists('settings.ini'):
         print("Error: 'settings.ini' not found.")
         return None, None
 
-    config.read('settings.ini')
+    config = load_settings('settings.ini')
     try:
         input_path = config['Paths']['input_path']
         output_path = config['Paths']['output_path']
@@ -23,84 +43,350 @@ def read_settings():
         print(f"Missing key in settings.ini: {e}")
         return None, None
 
-def convert_images_to_jpg(input_folder, output_folder):
+def read_prep_settings():
+    """
+    Reads the optional [Prep] section of settings.ini.
+    Returns a dict of conversion and frame extraction options.
+    """
+    config = load_settings('settings.ini')
+    workers = config.getint('Prep', 'workers', fallback=0)
+    return {
+        "workers": workers if workers > 0 else (os.cpu_count() or 1),
+        "frame_interval": config.getfloat('Prep', 'frame_interval', fallback=1.0),
+        "extract_mode": config.get('Prep', 'extract_mode', fallback="seek"),
+        "jpeg_quality": config.getint('Prep', 'jpeg_quality', fallback=95),
+        "video_workers": max(1, config.getint('Prep', 'video_workers', fallback=2)),
+        "write_workers": max(1, config.getint('Prep', 'write_workers', fallback=4)),
+        "output_mode": config.get('Prep', 'output_mode', fallback="files"),
+        "shard_size_mb": max(1, config.getint('Prep', 'shard_size_mb', fallback=1024)),
+        "dedup": config.getboolean('Prep', 'dedup', fallback=False),
+        "dedup_distance": max(0, config.getint('Prep', 'dedup_distance', fallback=6)),
+        "dedup_window": max(0, config.getint('Prep', 'dedup_window', fallback=0)),
+    }
+
+def parse_time_range(text):
+    """
+    Parses "start-end" in seconds; either side may be blank.
+    Returns (start_time, end_time) with end_time None for the end of the video.
+    """
+    text = text.strip()
+    if not text:
+        return 0.0, None
+    start_text, _, end_text = text.partition("-")
+    start_time = float(start_text) if start_text.strip() else 0.0
+    end_time = float(end_text) if end_text.strip() else None
+    return start_time, end_time
+
+def convert_image_file(input_path, output_folder):
+    """
+    Converts one image to JPEG and deletes the original.
+    The JPEG is written to a temp file and renamed into place, so the
+    original is only removed once a complete JPEG exists.
+    Returns (file, error) where error is None on success.
+    """
+    file = os.path.basename(input_path)
+    base_name = os.path.splitext(file)[0]
+    output_path = os.path.join(output_folder, f"{base_name}.jpg")
+    temp_path = None
+
+    try:
+        with span("decode"), Image.open(input_path) as img:
+            img = img.convert("RGB")
+        with span("write"):
+            # A unique temp name, so workers converting other files never share one
+            fd, temp_path = tempfile.mkstemp(dir=output_folder, prefix=".", suffix=".tmp")
+            # mkstemp creates the file 0600; give the JPEG the usual permissions
+            os.fchmod(fd, 0o666 & ~UMASK)
+            with os.fdopen(fd, "wb") as f:
+                img.save(f, "JPEG")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, output_path)
+        # Never delete a file that was converted in place
+        if os.path.abspath(input_path) != os.path.abspath(output_path):
+            os.remove(input_path)
+        return file, None
+    except Exception as e:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return file, str(e)
+
+def convert_images_to_jpg(input_folder, output_folder, workers=1):
     os.makedirs(output_folder, exist_ok=True)
-    files = os.listdir(input_folder)
+    files = sorted(
+        os.path.join(input_folder, file) for file in os.listdir(input_folder)
+        if os.path.isfile(os.path.join(input_folder, file))
+    )
+    files, collisions = split_output_collisions(files)
+
+    if workers > 1:
+        # Spread files across processes; chunks keep the IPC overhead down
+        chunksize = max(1, min(64, len(files) // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outcomes = executor.map(convert_image_file, files, repeat(output_folder), chunksize=chunksize)
+            failures = _report_conversions(outcomes)
+    else:
+        outcomes = (convert_image_file(path, output_folder) for path in files)
+        failures = _report_conversions(outcomes)
+    failures.extend(collisions)
 
-    for file in files:
-        input_path = os.path.join(input_folder, file)
-        if not os.path.isfile(input_path):
+    total = len(files) + len(collisions)
+    print(f"Converted {total - len(failures)} of {total} files.")
+    for file, error in failures:
+        print(f"  {file}: {error}")
+
+def split_output_collisions(files):
+    """
+    Files such as IMG_1.PNG and IMG_1.HEIC would both become IMG_1.jpg, and
+    converting both would leave one JPEG for two deleted originals. The
+    first file of each name is kept; the others are returned as
+    (file, error) failures and left untouched.
+    """
+    owners = {}
+    kept = []
+    collisions = []
+    # A file that is already a JPEG (IMG_1.jpg, IMG_1.JPG) keeps its name ahead of IMG_1.PNG
+    for path in sorted(files, key=lambda path: not path.lower().endswith((".jpg", ".jpeg"))):
+        file = os.path.basename(path)
+        jpg_name = os.path.splitext(file)[0] + ".jpg"
+        if jpg_name in owners:
+            collisions.append((file, f"skipped, {owners[jpg_name]} also converts to {jpg_name}"))
             continue
+        owners[jpg_name] = file
+        kept.append(path)
+    return kept, collisions
+
+def _report_conversions(outcomes):
+    failures = []
+    for file, error in outcomes:
+        if error is None:
+            count("converted")
+            print(f"Converted and deleted original: {file}")
+        else:
+            print(f"Failed to convert {file}: {error}")
+            failures.append((file, error))
+    return failures
+
+def frame_hash(frame):
+    """64-bit difference hash (dHash) of a BGR frame."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
 
+class FrameHashIndex:
+    """
+    Finds kept frames within max_distance bits of a new frame hash.
+    Hashes are split into max_distance + 1 bands; any hash within range
+    shares at least one band exactly, so lookups only compare against
+    that band's bucket instead of every kept frame.
+    With window > 0 only the most recent window kept frames are matched.
+    """
+    def __init__(self, max_distance=6, window=0):
+        self.max_distance = max_distance
+        band_count = max_distance + 1
+        self.band_bits = [(64 * i // band_count, 64 * (i + 1) // band_count) for i in range(band_count)]
+        self.buckets = [{} for _ in range(band_count)]
+        self.window = window
+        self.recent = deque()
+
+    def _band_keys(self, value):
+        for start, end in self.band_bits:
+            yield (value >> start) & ((1 << (end - start)) - 1)
+
+    def is_duplicate(self, value):
+        for bucket, key in zip(self.buckets, self._band_keys(value)):
+            for kept in bucket.get(key, ()):
+                if (value ^ kept).bit_count() <= self.max_distance:
+                    return True
+        return False
+
+    def add(self, value):
+        for bucket, key in zip(self.buckets, self._band_keys(value)):
+            bucket.setdefault(key, []).append(value)
+        if self.window:
+            self.recent.append(value)
+            if len(self.recent) > self.window:
+                self._remove(self.recent.popleft())
+
+    def _remove(self, value):
+        for bucket, key in zip(self.buckets, self._band_keys(value)):
+            entries = bucket[key]
+            entries.remove(value)
+            if not entries:
+                del bucket[key]
+
+class FrameWriter:
+    """
+    Encodes and writes JPEG frames on a thread pool so decoding never waits
+    on disk. At most max_pending frames are queued; submit() blocks beyond that.
+    With a shard_writer the encoded frames are streamed into shards instead
+    of being written as loose files.
+    """
+    def __init__(self, output_folder, workers=4, max_pending=32, jpeg_quality=95, shard_writer=None):
+        self.output_folder = output_folder
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        self.shard_writer = shard_writer
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _write(self, name, frame):
         try:
-            with Image.open(input_path) as img:
-                img = img.convert("RGB")
-                base_name = os.path.splitext(file)[0]
-                output_path = os.path.join(output_folder, f"{base_name}.jpg")
-                img.save(output_path, "JPEG")
-                print(f"Converted: {file} -> {base_name}.jpg")
-                img.close()
-                os.remove(input_path)
-                print(f"Deleted original file: {file}")
+            with span("write"):
+                if self.shard_writer is not None:
+                    success, buffer = cv2.imencode(".jpg", frame, self.params)
+                    if success:
+                        self.shard_writer.write(name, {"jpg": buffer.tobytes()}, shape=frame.shape[:2])
+                else:
+                    success = cv2.imwrite(os.path.join(self.output_folder, f"{name}.jpg"), frame, self.params)
         except Exception as e:
-            print(f"Failed to convert {file}: {e}")
+            # e.g. cv2.error or a full disk; the future is never read, so report it here
+            print(f"Error writing frame {name}: {e}")
+            success = False
+        finally:
+            self.slots.release()
+        if not success:
+            with self._lock:
+                self.failures += 1
+
+    def submit(self, name, frame):
+        self.slots.acquire()
+        self.executor.submit(self._write, name, frame)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self.shard_writer is not None:
+            self.shard_writer.close()
 
-def extract_frames(video_path, output_folder, fps_interval=1):
+def extract_frames(video_path, output_folder, fps_interval=1, start_time=0.0, end_time=None, mode="seek",
+                   jpeg_quality=95, write_workers=4, output_mode="files", shard_size_mb=1024,
+                   dedup_distance=None, dedup_window=0):
     os.makedirs(output_folder, exist_ok=True)
     video_capture = cv2.VideoCapture(video_path)
+    video_name = os.path.basename(video_path)
 
     if not video_capture.isOpened():
         print(f"Error: Unable to open video file {video_path}")
-        return
+        return 0
 
-    frame_count = 0
+    shard_writer = ShardWriter(output_folder, shard_size_mb << 20) if output_mode == "shards" else None
+    writer = FrameWriter(output_folder, write_workers, max_pending=write_workers * 8,
+                         jpeg_quality=jpeg_quality, shard_writer=shard_writer)
+    # Near-duplicate frames are dropped before they are encoded
+    dedup_index = FrameHashIndex(dedup_distance, dedup_window) if dedup_distance is not None else None
     extracted_count = 0
-    fps = int(video_capture.get(cv2.CAP_PROP_FPS))
-    interval = max(1, int(fps * fps_interval))
-
-    success, frame = video_capture.read()
-    while success:
-        if frame_count % interval == 0:
-            frame_filename = os.path.join(output_folder, f"frame_{frame_count:06d}.jpg")
-            cv2.imwrite(frame_filename, frame)
+    dropped_count = 0
+    start = time.perf_counter()
+    last_report = start
+    try:
+        frames = iter_sampled_frames(video_capture, fps_interval, start_time, end_time, mode)
+        for frame_index, frame in traced_iter("decode", frames):
+            if dedup_index is not None:
+                value = frame_hash(frame)
+                if dedup_index.is_duplicate(value):
+                    dropped_count += 1
+                    continue
+                dedup_index.add(value)
+
+            writer.submit(f"frame_{frame_index:06d}", frame)
             extracted_count += 1
+            count("frames")
 
-        frame_count += 1
-        success, frame = video_capture.read()
+            now = time.perf_counter()
+            if now - last_report >= 2:
+                print(f"[{video_name}] {extracted_count} frames ({extracted_count / (now - start):.1f} frames/sec)")
+                last_report = now
+    finally:
+        writer.close()
+        video_capture.release()
 
-    video_capture.release()
-    print(f"Extraction complete. {extracted_count} frames saved to {output_folder}")
+    elapsed = time.perf_counter() - start
+    saved_count = extracted_count - writer.failures
+    rate = saved_count / elapsed if elapsed > 0 else 0.0
+    if writer.failures:
+        print(f"[{video_name}] Failed to write {writer.failures} frames")
+    if dedup_index is not None:
+        print(f"[{video_name}] Deduplication kept {extracted_count} frames and dropped {dropped_count}")
+    print(f"[{video_name}] Extraction complete. {saved_count} frames saved to {output_folder} "
+          f"in {elapsed:.2f}s ({rate:.1f} frames/sec)")
+    return saved_count
 
 def find_mov_files(directory):
     return glob.glob(os.path.join(directory, "*.mov"))
 
-def process_mov_files(input_directory, output_directory):
+def process_mov_files(input_directory, output_directory, fps_interval=1, start_time=0.0, end_time=None, mode="seek",
+                      jpeg_quality=95, video_workers=1, write_workers=4, output_mode="files", shard_size_mb=1024,
+                      dedup_distance=None, dedup_window=0):
     mov_files = find_mov_files(input_directory)
-    if mov_files:
-        for mov_file in mov_files:
-            base_name = os.path.splitext(os.path.basename(mov_file))[0]
-            video_output_directory = os.path.join(output_directory, base_name)
-            print(f"Processing {mov_file} into folder {video_output_directory}")
-            extract_frames(mov_file, video_output_directory, fps_interval=1)
-    else:
+    if not mov_files:
         print(f"No .mov files found in {input_directory}. Add .mov files and re-run.")
+        return
+
+    jobs = []
+    for mov_file in mov_files:
+        base_name = os.path.splitext(os.path.basename(mov_file))[0]
+        video_output_directory = os.path.join(output_directory, base_name)
+        print(f"Processing {mov_file} into folder {video_output_directory}")
+        jobs.append((mov_file, video_output_directory, fps_interval, start_time, end_time, mode,
+                     jpeg_quality, write_workers, output_mode, shard_size_mb, dedup_distance, dedup_window))
+
+    start = time.perf_counter()
+    total_frames = 0
+    if video_workers > 1 and len(jobs) > 1:
+        # Decode several videos at once, one process per video
+        with ProcessPoolExecutor(max_workers=min(video_workers, len(jobs))) as executor:
+            futures = [executor.submit(extract_frames, *job) for job in jobs]
+            for job, future in zip(jobs, futures):
+                try:
+                    total_frames += future.result()
+                except Exception as e:
+                    print(f"Failed to extract frames from {job[0]}: {e}")
+    else:
+        for job in jobs:
+            # One bad video must not stop the others, as in the parallel branch
+            try:
+                total_frames += extract_frames(*job)
+            except Exception as e:
+                print(f"Failed to extract frames from {job[0]}: {e}")
+
+    elapsed = time.perf_counter() - start
+    rate = total_frames / elapsed if elapsed > 0 else 0.0
+    print(f"Extracted {total_frames} frames from {len(jobs)} videos in {elapsed:.2f}s ({rate:.1f} frames/sec)")
 
 def main():
     input_folder, output_folder = read_settings()
     if not input_folder or not output_folder:
         print("Error: Missing or invalid settings. Please check 'settings.ini'.")
         return
+    # Per-stage timings go to logs_path when [Tracing] is enabled
+    tracing.start("Prepare Media")
 
     print("Select operation:")
     print("1. Convert images to JPG")
     print("2. Extract frames from .mov files")
     choice = input("Enter your choice (1/2): ")
+    prep_settings = read_prep_settings()
 
     if choice == "1":
-        convert_images_to_jpg(input_folder, output_folder)
+        convert_images_to_jpg(input_folder, output_folder, workers=prep_settings["workers"])
         print("Image conversion completed.")
     elif choice == "2":
-        process_mov_files(input_folder, output_folder)
+        try:
+            start_time, end_time = parse_time_range(input("Time range in seconds, e.g. 30-90 (blank for whole video): "))
+        except ValueError:
+            print("Invalid time range. Exiting.")
+            return
+        process_mov_files(input_folder, output_folder, prep_settings["frame_interval"],
+                          start_time, end_time, prep_settings["extract_mode"],
+                          jpeg_quality=prep_settings["jpeg_quality"],
+                          video_workers=prep_settings["video_workers"],
+                          write_workers=prep_settings["write_workers"],
+                          output_mode=prep_settings["output_mode"],
+                          shard_size_mb=prep_settings["shard_size_mb"],
+                          dedup_distance=prep_settings["dedup_distance"] if prep_settings["dedup"] else None,
+                          dedup_window=prep_settings["dedup_window"])
         print("Frame extraction completed.")
     else:
         print("Invalid choice. Exiting.")
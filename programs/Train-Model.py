@@ -1,9 +1,19 @@
-import configparser
+# [terminax]
+# name = Train Model
+# menu = Machine Vision/Train Model
+# args =
+# resources = gpu=1 cpu=8 memory=8G
+# gpu_heavy = true
+import os
+import json
+import socket
+from copy import deepcopy
+import torch
 from ultralytics import YOLO
+from appconfig import load_settings
 
 # Load settings from settings.ini
-config = configparser.ConfigParser()
-config.read("settings.ini")
+config = load_settings("settings.ini")
 
 # Extract paths from the config file
 input_path = config.get("Paths", "input_path")
@@ -11,21 +21,149 @@ output_path = config.get("Paths", "output_path")
 current_model_path = config.get("Paths", "current_model_path")
 training_model_path = config.get("Paths", "training_model_path")
 
+# "shards" trains straight from shard folders listed in data.yaml
+dataset_format = config.get("Training", "dataset_format", fallback="folders")
+
+# Also write a dynamic int8 quantized copy of the ONNX export for CPU inference
+export_int8 = config.getboolean("Training", "export_int8", fallback=False)
+
+# Training parameters set here override the detected hardware profile
+training_overrides = {
+    key: config.get("Training", key) for key in ("device", "batch", "workers", "imgsz", "epochs")
+    if config.has_option("Training", key)
+}
+
+# Estimated training memory per 640x640 image when no GPU is available
+CPU_BYTES_PER_IMAGE = 300 << 20
+
+def total_ram_bytes():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+def probe_hardware():
+    """Detects the GPUs, CPU cores and RAM available for training."""
+    gpus = []
+    if torch.cuda.is_available():
+        for i in range(torch.cuda.device_count()):
+            properties = torch.cuda.get_device_properties(i)
+            gpus.append({"name": properties.name, "memory": properties.total_memory})
+    return {
+        "host": socket.gethostname(),
+        # The cores this process may run on, so a job pinned by the scheduler
+        # does not size its threads and loaders for the whole machine
+        "cpu_count": len(os.sched_getaffinity(0)),
+        "ram": total_ram_bytes(),
+        "gpus": gpus,
+        "torch": torch.__version__,
+        "batch": {},
+    }
+
+def load_hardware_profile(cache_path):
+    """
+    Returns the cached hardware profile, re-probing when the machine or the
+    CPUs this process is pinned to have changed.
+    """
+    profile = probe_hardware()
+    try:
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+        if all(cached.get(key) == profile[key] for key in ("host", "cpu_count", "ram", "gpus", "torch")):
+            return cached
+    except (OSError, ValueError):
+        pass
+    save_hardware_profile(cache_path, profile)
+    return profile
+
+def save_hardware_profile(cache_path, profile):
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(profile, f, indent=4)
+
+def largest_batch_size(model, profile, imgsz, model_cfg):
+    """
+    Picks the largest batch that fits in memory. On GPU this is measured
+    once with ultralytics autobatch and cached in the profile.
+    """
+    cache_key = f"{model_cfg}@{imgsz}"
+    if cache_key in profile["batch"]:
+        return profile["batch"][cache_key]
+
+    if profile["gpus"]:
+        from ultralytics.utils.autobatch import autobatch
+        batch = autobatch(deepcopy(model.model).to("cuda:0").train(), imgsz, fraction=0.6)
+    else:
+        # Leave half the RAM for the data loaders and the rest of the system
+        per_image = CPU_BYTES_PER_IMAGE * (imgsz / 640) ** 2
+        batch = 1
+        while batch < 64 and (batch * 2) * per_image <= profile["ram"] * 0.5:
+            batch *= 2
+    profile["batch"][cache_key] = batch
+    return batch
+
+def choose_training_parameters(model, profile, model_cfg):
+    """
+    Derives device, batch, workers and imgsz from the hardware profile,
+    then applies any overrides from the [Training] section of settings.ini.
+    """
+    imgsz = int(training_overrides.get("imgsz", 640))
+    cpu_count = profile["cpu_count"]
+    ram_gb = profile["ram"] / (1 << 30)
+
+    if profile["gpus"]:
+        device = ",".join(str(i) for i in range(len(profile["gpus"])))
+        workers = min(8, cpu_count // len(profile["gpus"]), max(1, int(ram_gb // 2)))
+    else:
+        device = "cpu"
+        # Keep most cores for the training math itself
+        workers = min(4, cpu_count // 4)
+
+    parameters = {
+        "device": training_overrides.get("device", device),
+        "workers": int(training_overrides.get("workers", workers)),
+        "imgsz": imgsz,
+        "epochs": int(training_overrides.get("epochs", 100)),
+    }
+    if "batch" in training_overrides:
+        parameters["batch"] = float(training_overrides["batch"]) if "." in training_overrides["batch"] else int(training_overrides["batch"])
+    else:
+        parameters["batch"] = largest_batch_size(model, profile, imgsz, model_cfg)
+
+    if parameters["device"] == "cpu":
+        torch.set_num_threads(max(1, cpu_count - parameters["workers"]))
+    return parameters
+
 if __name__ == "__main__":
     data_yaml_path = f"{training_model_path}/data.yaml"
     project_path = f"{current_model_path}/RSV"
-    model = YOLO("yolo11n.yaml")   # Use the current model path from settings.ini
+    model_cfg = "yolo11n.yaml"
+    model = YOLO(model_cfg)   # Use the current model path from settings.ini
+
+    # Pick device, batch and workers for this machine
+    profile_path = os.path.join(training_model_path, "hardware_profile.json")
+    profile = load_hardware_profile(profile_path)
+    parameters = choose_training_parameters(model, profile, model_cfg)
+    save_hardware_profile(profile_path, profile)
+    print(f"Training with device={parameters['device']} batch={parameters['batch']} "
+          f"workers={parameters['workers']} imgsz={parameters['imgsz']}")
+
+    trainer = None
+    if dataset_format == "shards":
+        from shards import build_shard_trainer
+        trainer = build_shard_trainer()
 
     # Train the model
     model.train(
         data=data_yaml_path,        # Path to your dataset YAML file
-        epochs=100,                 # Number of training epochs
-        imgsz=640,                  # Image size for training (default: 640)
-        batch=32,                   # Batch size (adjust based on your system capabilities)
-        device=0,                   # Use '0' for GPU, 'cpu' for CPU training
-        workers=4,                  # Number of data loader workers (reduce to 0 if issues persist)
+        epochs=parameters["epochs"],    # Number of training epochs
+        imgsz=parameters["imgsz"],      # Image size for training (default: 640)
+        batch=parameters["batch"],      # Largest batch that fits, unless set in settings.ini
+        device=parameters["device"],    # GPUs when available, otherwise 'cpu'
+        workers=parameters["workers"],  # Number of data loader workers
         project=project_path,       # Project directory to save results
-        name="RSV"            # Run name (for tracking in saved results)
+        name="RSV",           # Run name (for tracking in saved results)
+        trainer=trainer             # Shard-reading trainer, or None for the default
     )
 
     # Evaluate the trained model
@@ -38,3 +176,7 @@ if __name__ == "__main__":
         path=current_model_path
     )
     print(f"Model exported to {export_path}")
+
+    if export_int8:
+        from backends import quantize_onnx_model
+        print(f"Quantized model exported to {quantize_onnx_model(export_path)}")
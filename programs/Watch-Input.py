@@ -0,0 +1,353 @@
+# [terminax]
+# name = Watch Input
+# menu = Machine Vision/Use Model
+# args =
+# resources = gpu=1 cpu=4 memory=4G
+# gpu_heavy = true
+import os
+import sys
+import time
+import queue
+import signal
+import threading
+import importlib.util
+import cv2
+from fswatch import IN_CLOSE_WRITE, IN_MODIFY, IN_MOVED_TO, IN_CREATE, IN_Q_OVERFLOW, inotify_watch, read_events
+from video import is_video_file, source_name
+from backends import load_model, read_backend_settings
+from appconfig import load_settings
+import labelstore
+import tracing
+
+PROGRAMS_DIR = os.path.dirname(os.path.abspath(__file__))
+WATCH_EVENTS = IN_CLOSE_WRITE | IN_MODIFY | IN_MOVED_TO | IN_CREATE | IN_Q_OVERFLOW
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp", ".heic")
+# Names used by copy tools and browsers while a file is still arriving
+PARTIAL_SUFFIXES = (".tmp", ".part", ".crdownload", ".partial", ".download")
+
+def load_program(file_name, module_name):
+    """Loads a script from programs/ (the file names are not importable)."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(PROGRAMS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def read_settings(settings_file):
+    config = load_settings(settings_file)
+
+    try:
+        input_path = config["Paths"]["input_path"]
+        output_path = config["Paths"]["output_path"]
+        current_model_path = config["Paths"]["current_model_path"]
+        return input_path, output_path, current_model_path
+    except KeyError as e:
+        print(f"Error: Missing key in settings file: {e}")
+        return None, None, None
+
+def read_watch_settings(settings_file):
+    """
+    Reads the optional [Watch] section of settings.ini.
+    Returns a dict with settle_seconds, queue_depth and convert_workers.
+    """
+    config = load_settings(settings_file)
+
+    return {
+        "settle_seconds": max(0.0, config.getfloat("Watch", "settle_seconds", fallback=2.0)),
+        "queue_depth": max(1, config.getint("Watch", "queue_depth", fallback=8)),
+        "convert_workers": max(1, config.getint("Watch", "convert_workers", fallback=2)),
+    }
+
+def is_wanted(name):
+    """Images and videos, skipping hidden files and downloads still in progress."""
+    lower = name.lower()
+    if name.startswith(".") or lower.endswith(PARTIAL_SUFFIXES):
+        return False
+    return lower.endswith(IMAGE_EXTENSIONS) or is_video_file(lower)
+
+class Debouncer:
+    """
+    Holds files that have changed until they are complete. A file is handed
+    on once no event has arrived for settle_seconds and its size and mtime
+    are the same on two checks in a row, so a file that is still being
+    copied in is never picked up half written.
+    """
+    def __init__(self, settle_seconds=2.0):
+        self.settle_seconds = settle_seconds
+        self.pending = {}  # path -> (last event time, last seen stat)
+        self._lock = threading.Lock()
+
+    def touch(self, path):
+        with self._lock:
+            stamp = self.pending.get(path, (0, None))[1]
+            self.pending[path] = (time.monotonic(), stamp)
+
+    def ready(self):
+        """Returns the paths that have settled and forgets them."""
+        now = time.monotonic()
+        settled = []
+        with self._lock:
+            for path, (last_event, last_stamp) in list(self.pending.items()):
+                if now - last_event < self.settle_seconds:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Removed or renamed away before it settled
+                    del self.pending[path]
+                    continue
+                stamp = (stat.st_size, stat.st_mtime_ns)
+                if stamp == last_stamp and stat.st_size > 0:
+                    del self.pending[path]
+                    settled.append(path)
+                else:
+                    self.pending[path] = (now, stamp)
+        return settled
+
+class WatchPipeline:
+    """
+    Pushes new files in input_folder through the same steps as running
+    Prepare Media and Model Infrence by hand. Images are converted to JPG in
+    output_folder and labelled in batches. Videos are decoded straight into
+    the model, without deduplication. Every stage has a bounded queue, so a
+    slow model holds back conversion instead of filling memory.
+    """
+    def __init__(self, input_folder, output_folder, model, prep, infer, batch_size=16, queue_depth=8,
+                 convert_workers=2, video_settings=None):
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.model = model
+        self.prep = prep
+        self.infer = infer
+        self.batch_size = batch_size
+        self.video_settings = video_settings or {}
+        self.convert_queue = queue.Queue(maxsize=queue_depth)
+        self.infer_queue = queue.Queue(maxsize=queue_depth * batch_size)
+        self.threads = [threading.Thread(target=self._convert, daemon=True) for _ in range(convert_workers)]
+        self.threads.append(threading.Thread(target=self._infer, daemon=True))
+        self.processed = 0
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, path):
+        """Queues a settled file. Blocks while the pipeline is full."""
+        if is_video_file(path):
+            self.infer_queue.put(("video", path, time.monotonic()))
+        else:
+            self.convert_queue.put((path, time.monotonic()))
+
+    def _convert(self):
+        while True:
+            item = self.convert_queue.get()
+            if item is None:
+                break
+            path, queued = item
+            file, error = self.prep.convert_image_file(path, self.output_folder)
+            if error is not None:
+                print(f"Failed to convert {file}: {error}")
+                continue
+            jpg_name = os.path.splitext(file)[0] + ".jpg"
+            self.infer_queue.put(("image", os.path.join(self.output_folder, jpg_name), queued))
+
+    def _infer(self):
+        finished = False
+        while not finished:
+            item = self.infer_queue.get()
+            if item is None:
+                break
+            if item[0] == "video":
+                self._infer_video(item[1], item[2])
+                continue
+
+            # Take whatever else is already waiting, up to one batch
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.infer_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    finished = True
+                    break
+                if item[0] == "video":
+                    self._infer_images(batch)
+                    batch = []
+                    self._infer_video(item[1], item[2])
+                    continue
+                batch.append(item)
+            if batch:
+                self._infer_images(batch)
+
+    def _infer_images(self, batch):
+        decoded = []
+        for _, path, queued in batch:
+            image = cv2.imread(path)
+            if image is None:
+                print(f"Failed to read image: {os.path.basename(path)}")
+                continue
+            decoded.append((path, image, queued))
+        if not decoded:
+            return
+        try:
+            results = self.model([image for _, image, _ in decoded])
+        except Exception as e:
+            # e.g. out of GPU memory; keep watching, these JPGs stay in output_folder without labels
+            names = ", ".join(os.path.basename(path) for path, _, _ in decoded)
+            print(f"Failed to label {names}: {e}")
+            return
+        now = time.monotonic()
+        for (path, image, queued), result in zip(decoded, results):
+            try:
+                self.infer.save_yolo_labels(image, [result], os.path.basename(path), self.output_folder)
+            except Exception as e:
+                print(f"Failed to save labels for {os.path.basename(path)}: {e}")
+                continue
+            self.processed += 1
+            print(f"Labelled {os.path.basename(path)} ({now - queued:.1f}s after it settled)")
+
+    def _infer_video(self, path, queued):
+        settings = self.video_settings
+        try:
+            self.infer.process_video(path, self.output_folder, self.model, self.batch_size,
+                                     frame_interval=settings.get("frame_interval", 1.0),
+                                     mode=settings.get("extract_mode", "seek"),
+                                     save_frames=settings.get("save_frames", False),
+                                     jpeg_quality=settings.get("jpeg_quality", 95))
+        except Exception as e:
+            # Keep watching; the video is not marked labelled, so a restart retries it
+            print(f"Failed to label {os.path.basename(path)}: {e}")
+            return
+        self.processed += 1
+        print(f"Labelled {os.path.basename(path)} ({time.monotonic() - queued:.1f}s after it settled)")
+
+    def close(self):
+        """Lets the queued files finish, then stops the stage threads."""
+        for _ in range(len(self.threads) - 1):
+            self.convert_queue.put(None)
+        for thread in self.threads[:-1]:
+            thread.join()
+        self.infer_queue.put(None)
+        self.threads[-1].join()
+
+def video_is_labelled(path, output_folder):
+    """
+    True when frames.csv for the video is newer than the video itself.
+    process_video only writes frames.csv once the whole video is labelled.
+    """
+    index_path = os.path.join(output_folder, source_name(path), "frames.csv")
+    try:
+        return os.stat(index_path).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+def image_is_labelled(path, output_folder):
+    """True when the image's label file in output_folder is newer than the image itself."""
+    label_path = os.path.join(output_folder, os.path.splitext(os.path.basename(path))[0] + ".txt")
+    try:
+        return os.stat(label_path).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+
+def watch_events(input_folder, debouncer, stop, output_folder=None):
+    """Event thread: feeds every write or rename in input_folder to the debouncer."""
+    fd = inotify_watch(input_folder, WATCH_EVENTS)
+    if fd is None:
+        print("inotify is unavailable, checking the folder every 2 seconds instead.")
+        watch_polling(input_folder, debouncer, stop)
+        return
+    while not stop.is_set():
+        try:
+            events = read_events(fd)
+        except OSError:
+            return
+        for mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # The kernel dropped events, so look at the folder once more
+                queue_existing(input_folder, debouncer, output_folder)
+            elif name and is_wanted(name):
+                debouncer.touch(os.path.join(input_folder, name))
+
+def watch_polling(input_folder, debouncer, stop, interval=2.0):
+    stamps = {}
+    while not stop.is_set():
+        try:
+            with os.scandir(input_folder) as entries:
+                current = {entry.path: entry.stat().st_mtime_ns for entry in entries
+                           if entry.is_file() and is_wanted(entry.name)}
+        except OSError:
+            current = {}
+        for path, mtime in current.items():
+            if stamps.get(path) != mtime:
+                debouncer.touch(path)
+        stamps = current
+        stop.wait(interval)
+
+def queue_existing(input_folder, debouncer, output_folder=None):
+    """
+    Picks up files that arrived while nothing was watching. Images and videos
+    whose labels are newer than the file were done by an earlier run and are skipped.
+    """
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or not is_wanted(entry.name):
+                continue
+            if output_folder is not None:
+                is_labelled = video_is_labelled if is_video_file(entry.name) else image_is_labelled
+                if is_labelled(entry.path, output_folder):
+                    continue
+            debouncer.touch(entry.path)
+
+if __name__ == "__main__":
+    # Path to the settings file
+    settings_file = "settings.ini"
+
+    input_folder, output_folder, current_model_path = read_settings(settings_file)
+    if not input_folder or not output_folder or not current_model_path:
+        print("Error: Invalid paths in settings file. Please check settings.ini.")
+        exit(1)
+    if not os.path.isdir(input_folder):
+        print(f"Error: Input folder {input_folder} does not exist.")
+        exit(1)
+    if os.path.abspath(input_folder) == os.path.abspath(output_folder):
+        # Converted JPGs would land back in the watched folder and be picked up again
+        print("Error: input_path and output_path must be different folders to watch input_path.")
+        exit(1)
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Per-stage timings go to logs_path when [Tracing] is enabled
+    tracing.start("Watch Input", settings_file)
+
+    prep = load_program("Prep-Media.py", "prep_media")
+    infer = load_program("Model-Infrence.py", "model_infrence")
+    watch_settings = read_watch_settings(settings_file)
+    batch_size, _, _ = infer.read_inference_settings(settings_file)
+
+    model = load_model(current_model_path, read_backend_settings(settings_file))
+    if infer.read_label_store_setting(settings_file):
+        labelstore.start(output_folder)
+
+    pipeline = WatchPipeline(input_folder, output_folder, model, prep, infer, batch_size,
+                             watch_settings["queue_depth"], watch_settings["convert_workers"],
+                             infer.read_video_settings(settings_file))
+    debouncer = Debouncer(watch_settings["settle_seconds"])
+    stop = threading.Event()
+    # Stopping the job from the menu lets queued files finish instead of leaving half-written output
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    pipeline.start()
+    threading.Thread(target=watch_events, args=(input_folder, debouncer, stop, output_folder), daemon=True).start()
+    queue_existing(input_folder, debouncer, output_folder)
+    print(f"Watching {input_folder} for new images and videos. Press Ctrl+C to stop.")
+
+    try:
+        while not stop.is_set():
+            for path in debouncer.ready():
+                pipeline.submit(path)
+            stop.wait(0.25)
+    except KeyboardInterrupt:
+        pass
+    print("Stopping, finishing queued files...")
+    pipeline.close()
+    print(f"Processed {pipeline.processed} files.")
@@ -0,0 +1,207 @@
+import os
+import json
+import threading
+import configparser
+
+class ConfigError(ValueError):
+    """Raised when settings.ini or config.json does not match its schema."""
+
+def positive_float(value):
+    number = float(value)
+    if not number > 0:
+        raise ValueError("must be greater than 0")
+    return number
+
+# Expected type of each known settings.ini option. A tuple lists the allowed values,
+# and a function such as positive_float converts the value or raises ValueError.
+# Options are all optional here; the readers in each program supply the fallbacks.
+SETTINGS_SCHEMA = {
+    "Paths": {
+        "input_path": str,
+        "output_path": str,
+        "logs_path": str,
+        "current_model_path": str,
+        "training_model_path": str,
+    },
+    "Inference": {
+        "batch_size": int,
+        "queue_depth": int,
+        "decode_workers": int,
+        "backend": ("pytorch", "onnx"),
+        "onnx_model_path": str,
+        "intra_op_threads": int,
+        "inter_op_threads": int,
+        "graph_optimization": ("disabled", "basic", "extended", "all"),
+        "imgsz": int,
+        "conf": float,
+        "iou": float,
+        "frame_interval": positive_float,
+        "extract_mode": ("seek", "grab", "read"),
+        "save_frames": bool,
+        "jpeg_quality": int,
+        "label_store": bool,
+    },
+    "Prep": {
+        "workers": int,
+        "frame_interval": positive_float,
+        "extract_mode": ("seek", "grab", "read"),
+        "jpeg_quality": int,
+        "video_workers": int,
+        "write_workers": int,
+        "output_mode": ("files", "shards"),
+        "shard_size_mb": int,
+        "dedup": bool,
+        "dedup_distance": int,
+        "dedup_window": int,
+    },
+    "Training": {
+        "dataset_format": ("folders", "shards"),
+        "export_int8": bool,
+        "device": str,
+        "batch": float,
+        "workers": int,
+        "imgsz": int,
+        "epochs": int,
+    },
+    "Watch": {
+        "settle_seconds": float,
+        "queue_depth": int,
+        "convert_workers": int,
+    },
+    "Tracing": {
+        "enabled": bool,
+        "flush_interval": float,
+        "max_file_mb": int,
+        "backups": int,
+        "sample_seconds": float,
+        "sample_interval_ms": float,
+        "cprofile": bool,
+    },
+    "Jsonify": {
+        "workers": int,
+    },
+    "Bandwidth": {
+        "servers": str,
+        "duration": int,
+        "num_streams": int,
+        "directions": str,
+        "udp": bool,
+        "udp_bandwidth": int,
+        "max_workers": int,
+    },
+}
+
+# Top level keys of config.json and their types
+CONFIG_SCHEMA = {
+    "menus": dict,
+    "banner": str,
+    "banner_cache": str,
+    "refresh_interval": (int, float),
+    "ping": dict,
+    "warm_workers": dict,
+    "scheduler": dict,
+    "apt_install": list,
+    "pip_install": list,
+}
+
+_cache = {}
+_lock = threading.Lock()
+
+def file_stamp(path):
+    """mtime and size, so an edit within the same mtime tick is still noticed."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def _cached(path, parse):
+    """Returns the parsed file, parsing it again only when its stamp changed."""
+    key = (os.path.abspath(path), parse)
+    stamp = file_stamp(path)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+    value = parse(path)
+    with _lock:
+        _cache[key] = (stamp, value)
+    return value
+
+def validate_settings(config):
+    problems = []
+    for section, options in SETTINGS_SCHEMA.items():
+        if not config.has_section(section):
+            continue
+        for option, expected in options.items():
+            if not config.has_option(section, option):
+                continue
+            value = config.get(section, option)
+            try:
+                if isinstance(expected, tuple):
+                    if value not in expected:
+                        raise ValueError(f"must be one of {', '.join(expected)}")
+                elif expected is bool:
+                    config.getboolean(section, option)
+                elif expected is not str:
+                    expected(value)
+            except ValueError as e:
+                problems.append(f"[{section}] {option} = {value!r}: {e}")
+    if problems:
+        raise ConfigError("Invalid settings.ini:\n  " + "\n  ".join(problems))
+
+def _parse_settings(path):
+    config = configparser.ConfigParser()
+    config.read(path)
+    validate_settings(config)
+    return config
+
+def load_settings(path="settings.ini"):
+    """
+    The parsed and validated settings.ini. The same ConfigParser is returned
+    until the file changes on disk, so treat it as read-only.
+    """
+    return _cached(path, _parse_settings)
+
+def validate_config(config_data):
+    if not isinstance(config_data, dict):
+        raise ConfigError("config.json must hold a JSON object")
+    problems = []
+    for key, expected in CONFIG_SCHEMA.items():
+        if key in config_data and not isinstance(config_data[key], expected):
+            problems.append(f"{key} has the wrong type ({type(config_data[key]).__name__})")
+    menus = config_data.get("menus", {})
+    for menu, programs in (menus.items() if isinstance(menus, dict) else []):
+        if not isinstance(programs, list):
+            problems.append(f"menu {menu!r} must be a list of programs")
+            continue
+        for program in programs:
+            if not isinstance(program, dict) or not isinstance(program.get("name"), str):
+                problems.append(f"menu {menu!r} has a program without a name")
+            elif not isinstance(program.get("script_path"), (str, type(None))):
+                problems.append(f"program {program['name']!r} has an invalid script_path")
+    if problems:
+        raise ConfigError("Invalid config.json:\n  " + "\n  ".join(problems))
+
+def _parse_config(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        config_data = json.load(f)
+    validate_config(config_data)
+    return config_data
+
+def load_config(path="config.json"):
+    """
+    The parsed and validated config.json, or {} when it does not exist.
+    Cached like load_settings; treat the result as read-only.
+    """
+    return _cached(path, _parse_config)
+
+if __name__ == "__main__":
+    try:
+        load_settings()
+        load_config()
+        print("settings.ini and config.json are valid.")
+    except (ConfigError, ValueError) as e:
+        print(e)
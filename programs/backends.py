@@ -0,0 +1,316 @@
+import os
+import sys
+import glob
+import numpy as np
+import cv2
+from appconfig import load_settings
+
+GRAPH_OPTIMIZATION_LEVELS = ("disabled", "basic", "extended", "all")
+
+# Model loaded ahead of time by a warm worker, reused by the jobs forked from it
+_PRELOADED_MODEL = {}
+
+def read_backend_settings(settings_file):
+    """
+    Reads the inference backend options from the [Inference] section of settings.ini.
+    """
+    config = load_settings(settings_file)
+    return {
+        "backend": config.get("Inference", "backend", fallback="pytorch"),
+        "onnx_model_path": config.get("Inference", "onnx_model_path", fallback=""),
+        "intra_op_threads": config.getint("Inference", "intra_op_threads", fallback=0),
+        "inter_op_threads": config.getint("Inference", "inter_op_threads", fallback=0),
+        "graph_optimization": config.get("Inference", "graph_optimization", fallback="all"),
+        "imgsz": config.getint("Inference", "imgsz", fallback=640),
+        "conf": config.getfloat("Inference", "conf", fallback=0.25),
+        "iou": config.getfloat("Inference", "iou", fallback=0.7),
+    }
+
+def find_onnx_model(model_path):
+    """Finds the exported .onnx file for a model file or model folder."""
+    if model_path.endswith(".onnx"):
+        return model_path
+    if os.path.isfile(model_path):
+        candidate = os.path.splitext(model_path)[0] + ".onnx"
+        return candidate if os.path.exists(candidate) else None
+    candidates = sorted(glob.glob(os.path.join(model_path, "**", "*.onnx"), recursive=True), key=os.path.getmtime)
+    return candidates[-1] if candidates else None
+
+class Boxes:
+    """Mirrors the part of ultralytics Boxes that save_yolo_labels reads."""
+    def __init__(self, data):
+        self.data = data
+
+class DetectionResult:
+    def __init__(self, data):
+        self.boxes = Boxes(data)
+
+class OnnxDetector:
+    """
+    Runs an ultralytics YOLO detection model exported to ONNX with ONNX Runtime.
+    Called like the ultralytics model: with one image or a list of BGR images,
+    it returns one result per image whose boxes.data rows are
+    (x1, y1, x2, y2, score, class_id) in original image pixels.
+    """
+    def __init__(self, onnx_path, imgsz=640, conf=0.25, iou=0.7, max_det=300,
+                 intra_op_threads=0, inter_op_threads=0, graph_optimization="all"):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = {
+            "disabled": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[graph_optimization]
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch_dim, _, height, width = model_input.shape
+        # Static exports fix the batch and image size; dynamic ones report names
+        self.fixed_batch = batch_dim if isinstance(batch_dim, int) else None
+        self.input_size = (height if isinstance(height, int) else imgsz, width if isinstance(width, int) else imgsz)
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+    def letterbox(self, image):
+        """Resizes with unchanged aspect ratio and pads to the input size, like ultralytics LetterBox."""
+        height, width = image.shape[:2]
+        target_h, target_w = self.input_size
+        ratio = min(target_h / height, target_w / width)
+        new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+        pad_w, pad_h = (target_w - new_w) / 2, (target_h - new_h) / 2
+
+        if (new_w, new_h) != (width, height):
+            image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+        left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        return image, ratio, (left, top)
+
+    def preprocess(self, images):
+        tensors, transforms = [], []
+        for image in images:
+            padded, ratio, offset = self.letterbox(image)
+            tensors.append(padded[:, :, ::-1].transpose(2, 0, 1))
+            transforms.append((ratio, offset, image.shape[:2]))
+        batch = np.ascontiguousarray(np.stack(tensors), dtype=np.float32) / 255.0
+        return batch, transforms
+
+    def postprocess(self, prediction, transform):
+        """Filters, runs class-aware NMS and maps boxes back to the original image."""
+        ratio, (left, top), (height, width) = transform
+        prediction = prediction.T
+        scores = prediction[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences > self.conf
+        if not keep.any():
+            return np.empty((0, 6), dtype=np.float32)
+
+        cx, cy, w, h = prediction[keep, :4].T
+        confidences, class_ids = confidences[keep], class_ids[keep]
+        xywh = np.column_stack((cx - w / 2, cy - h / 2, w, h))
+        indices = cv2.dnn.NMSBoxesBatched(xywh.tolist(), confidences.tolist(), class_ids.tolist(), self.conf, self.iou)
+        indices = np.array(indices, dtype=np.int64).reshape(-1)[:self.max_det]
+
+        x1 = np.clip((xywh[indices, 0] - left) / ratio, 0, width)
+        y1 = np.clip((xywh[indices, 1] - top) / ratio, 0, height)
+        x2 = np.clip((xywh[indices, 0] + xywh[indices, 2] - left) / ratio, 0, width)
+        y2 = np.clip((xywh[indices, 1] + xywh[indices, 3] - top) / ratio, 0, height)
+        return np.column_stack((x1, y1, x2, y2, confidences[indices], class_ids[indices])).astype(np.float32)
+
+    def __call__(self, images, **kwargs):
+        if isinstance(images, np.ndarray):
+            images = [images]
+        chunk = self.fixed_batch or len(images)
+        results = []
+        for first in range(0, len(images), chunk):
+            batch, transforms = self.preprocess(images[first:first + chunk])
+            predictions = self.session.run(None, {self.input_name: batch})[0]
+            results.extend(DetectionResult(self.postprocess(p, t)) for p, t in zip(predictions, transforms))
+        return results
+
+class UltralyticsDetector:
+    """
+    The ultralytics YOLO model with imgsz, conf and iou from settings.ini
+    applied to every call, as OnnxDetector does. Keyword arguments given to a
+    call still win; anything else is looked up on the YOLO model.
+    """
+    def __init__(self, weights_path, imgsz=640, conf=0.25, iou=0.7):
+        from ultralytics import YOLO
+
+        self.model = YOLO(weights_path)
+        self.options = {"imgsz": imgsz, "conf": conf, "iou": iou}
+
+    def __call__(self, images, **kwargs):
+        return self.model(images, **{**self.options, **kwargs})
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+def load_model(model_path, settings):
+    """
+    Loads the model for the configured backend: "pytorch" uses the ultralytics
+    YOLO wrapper, "onnx" runs the exported ONNX file with ONNX Runtime.
+    Both apply the imgsz, conf and iou settings.
+    """
+    if _PRELOADED_MODEL.get("key") == model_cache_key(model_path, settings):
+        print(f"Using preloaded model: {model_path}")
+        return _PRELOADED_MODEL["model"]
+
+    if settings["backend"] == "onnx":
+        onnx_path = resolve_model_file(model_path, settings)
+        if not onnx_path:
+            raise FileNotFoundError(f"No exported .onnx model found for {model_path}")
+        if settings["graph_optimization"] not in GRAPH_OPTIMIZATION_LEVELS:
+            raise ValueError(f"graph_optimization must be one of {', '.join(GRAPH_OPTIMIZATION_LEVELS)}")
+        print(f"Using ONNX Runtime backend: {onnx_path}")
+        return OnnxDetector(
+            onnx_path,
+            imgsz=settings["imgsz"],
+            conf=settings["conf"],
+            iou=settings["iou"],
+            intra_op_threads=settings["intra_op_threads"],
+            inter_op_threads=settings["inter_op_threads"],
+            graph_optimization=settings["graph_optimization"],
+        )
+
+    weights_path = resolve_model_file(model_path, settings)
+    if not weights_path:
+        raise FileNotFoundError(f"No .pt weights found in {model_path}")
+    return UltralyticsDetector(weights_path, imgsz=settings["imgsz"], conf=settings["conf"], iou=settings["iou"])
+
+def resolve_model_file(model_path, settings):
+    """
+    The file load_model opens for model_path: the exported .onnx for the
+    onnx backend, otherwise model_path itself or, for a model folder such as
+    Model/Current, the newest best.pt in it (the newest .pt when there is
+    none). None when there is no such file.
+    """
+    if settings["backend"] == "onnx":
+        return settings["onnx_model_path"] or find_onnx_model(model_path)
+    if not os.path.isdir(model_path):
+        return model_path
+    candidates = (glob.glob(os.path.join(model_path, "**", "best.pt"), recursive=True)
+                  or glob.glob(os.path.join(model_path, "**", "*.pt"), recursive=True))
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+def model_cache_key(model_path, settings):
+    """
+    Identifies the loaded model by the weight file load_model opens, so
+    retraining into the same model folder or replacing its weights changes
+    the key even though model_path does not.
+    """
+    weights_path = resolve_model_file(model_path, settings)
+    try:
+        stat = os.stat(weights_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+    except (OSError, TypeError):
+        stamp = None
+    return model_path, weights_path, stamp, tuple(sorted(settings.items()))
+
+def preload_model(model_path, settings):
+    """
+    Loads a model that later load_model calls with the same path, file and
+    settings return directly. Used by warm workers, which fork a process per job.
+    """
+    _PRELOADED_MODEL.clear()
+    if settings["backend"] == "onnx":
+        # ONNX Runtime thread pools do not survive fork, so each job builds its own session
+        import onnxruntime
+        return None
+
+    model = load_model(model_path, settings)
+    # The first prediction builds the predictor and fuses layers. Only done when
+    # there is no NVIDIA GPU, so CUDA is never initialised before the fork.
+    if not os.path.exists("/proc/driver/nvidia"):
+        model(np.zeros((settings["imgsz"], settings["imgsz"], 3), dtype=np.uint8), verbose=False)
+    _PRELOADED_MODEL.update(key=model_cache_key(model_path, settings), model=model)
+    return model
+
+def quantize_onnx_model(onnx_path):
+    """Writes a dynamic int8 quantized copy of an ONNX model and returns its path."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QUInt8)
+    return quantized_path
+
+def box_iou(a, b):
+    """IoU matrix between two (N, 4) and (M, 4) xyxy arrays."""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+def check_parity(reference_model, candidate_model, images, iou_threshold=0.5):
+    """
+    Compares the boxes of two backends on the same images. Each reference box
+    is matched to the best overlapping candidate box of the same class.
+    Returns a dict with match counts and the mean IoU of matched boxes.
+    """
+    matched, missed, extra, ious = 0, 0, 0, []
+    for image in images:
+        reference = _result_boxes(reference_model([image], verbose=False))
+        candidate = _result_boxes(candidate_model([image], verbose=False))
+        if not len(reference) or not len(candidate):
+            missed += len(reference)
+            extra += len(candidate)
+            continue
+
+        overlap = box_iou(reference[:, :4], candidate[:, :4])
+        overlap[reference[:, 5][:, None] != candidate[:, 5][None, :]] = 0
+        used = np.zeros(len(candidate), dtype=bool)
+        for row in np.argsort(-reference[:, 4]):
+            # Each candidate box can only be matched once
+            available = np.where(used, 0, overlap[row])
+            column = int(available.argmax())
+            if available[column] >= iou_threshold:
+                used[column] = True
+                matched += 1
+                ious.append(available[column])
+            else:
+                missed += 1
+        extra += int((~used).sum())
+
+    return {
+        "images": len(images),
+        "matched": matched,
+        "missed": missed,
+        "extra": extra,
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+    }
+
+def _result_boxes(results):
+    arrays = []
+    for result in results:
+        data = result.boxes.data
+        if hasattr(data, "cpu"):
+            data = data.cpu().numpy()
+        data = np.asarray(data, dtype=np.float64)
+        if data.size:
+            arrays.append(data.reshape(len(data), -1)[:, :6])
+    return np.concatenate(arrays) if arrays else np.empty((0, 6))
+
+if __name__ == "__main__":
+    if len(sys.argv) in (4, 5) and sys.argv[1] == "parity":
+        pt_path, image_folder = sys.argv[2], sys.argv[3]
+        limit = int(sys.argv[4]) if len(sys.argv) == 5 else 50
+        settings = read_backend_settings("settings.ini")
+        # Both backends run with the same imgsz, conf and iou
+        reference = load_model(pt_path, dict(settings, backend="pytorch"))
+        settings["backend"] = "onnx"
+        image_names = sorted(f for f in os.listdir(image_folder) if f.lower().endswith(".jpg"))[:limit]
+        images = [cv2.imread(os.path.join(image_folder, f)) for f in image_names]
+        report = check_parity(reference, load_model(pt_path, settings), [i for i in images if i is not None])
+        print(f"Parity over {report['images']} images: {report['matched']} boxes matched, "
+              f"{report['missed']} missed, {report['extra']} extra, mean IoU {report['mean_iou']:.4f}")
+    else:
+        print("Usage: python3 programs/backends.py parity <model.pt> <image_folder> [limit]")
@@ -0,0 +1,45 @@
+import os
+import struct
+
+BANNER_MAGIC = b"TXBN"
+BANNER_VERSION = 1
+HEADER = struct.Struct("<4sBHH")  # magic, version, height, width
+LINE_LENGTH = struct.Struct("<H")
+
+def measure(lines):
+    """Returns (height, width) of a list of lines."""
+    return len(lines), max((len(line) for line in lines), default=0)
+
+def write_banner_cache(path, lines):
+    """
+    Writes lines as a banner cache: a small header with the dimensions,
+    then every line as a length-prefixed UTF-8 string. Loading it needs no
+    splitting or measuring.
+    """
+    height, width = measure(lines)
+    parts = [HEADER.pack(BANNER_MAGIC, BANNER_VERSION, height, width)]
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(LINE_LENGTH.pack(len(data)))
+        parts.append(data)
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(temp_path, path)
+
+def read_banner_cache(path):
+    """Returns (lines, height, width) from a banner cache file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, height, width = HEADER.unpack_from(data)
+    if magic != BANNER_MAGIC or version != BANNER_VERSION:
+        raise ValueError(f"{path} is not a version {BANNER_VERSION} banner cache")
+    lines = []
+    offset = HEADER.size
+    view = memoryview(data)
+    for _ in range(height):
+        (length,) = LINE_LENGTH.unpack_from(data, offset)
+        offset += LINE_LENGTH.size
+        lines.append(str(view[offset:offset + length], "utf-8"))
+        offset += length
+    return lines, height, width
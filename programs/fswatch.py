@@ -0,0 +1,47 @@
+import os
+import struct
+
+# inotify event bits, from <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+def inotify_watch(path, mask=WATCH_MASK):
+    """Returns a blocking inotify descriptor watching path, or None where inotify is unavailable."""
+    try:
+        import ctypes
+
+        # The C library is already loaded into the interpreter
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(0)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(os.path.abspath(path)), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+def read_events(fd):
+    """
+    Blocks until events arrive on an inotify descriptor and returns them
+    as (mask, name) pairs, with name as a str. Raises OSError once fd is closed.
+    """
+    data = os.read(fd, 65536)
+    events = []
+    # Each event is a fixed header followed by a padded file name
+    offset = 0
+    while offset < len(data):
+        _, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+        name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_length].rstrip(b"\0")
+        offset += EVENT_HEADER.size + name_length
+        events.append((mask, os.fsdecode(name)))
+    return events
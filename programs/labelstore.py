@@ -0,0 +1,285 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+import numpy as np
+
+LABEL_STORE_FILE_NAME = "labels.db"
+LABEL_FORMAT = "%d %.6f %.6f %.6f %.6f\n"
+# Box area as a fraction of the image, for the size distribution in stats
+AREA_BUCKETS = (0.001, 0.01, 0.05, 0.2)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source TEXT,
+    frame INTEGER,
+    timestamp REAL,
+    width INTEGER,
+    height INTEGER,
+    boxes INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_boxes ON images (boxes);
+CREATE TABLE IF NOT EXISTS boxes (
+    image_id INTEGER NOT NULL,
+    class_id INTEGER NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    w REAL NOT NULL,
+    h REAL NOT NULL,
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS boxes_image ON boxes (image_id);
+CREATE INDEX IF NOT EXISTS boxes_class ON boxes (class_id, image_id);
+"""
+
+_store = None
+
+def format_labels(labels):
+    """The YOLO label file text for rows of (class_id, x_center, y_center, width, height)."""
+    if not len(labels):
+        return ""
+    # One format call for the whole file; %d truncates the class id like int()
+    return (LABEL_FORMAT * len(labels)) % tuple(np.asarray(labels, dtype=np.float64).ravel().tolist())
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    # WAL lets stats and queries run while inference appends
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+class LabelStore:
+    """
+    One SQLite index of every label under an output folder: a row per image
+    (name, source video, frame, timestamp, size, box count) and a row per
+    box (class, normalized centre and size, score). It is written next to
+    the per-image .txt files, not instead of them. record() only queues the
+    labels; a background thread writes them in one transaction every
+    flush_interval seconds. Labelling an image again replaces its boxes.
+    """
+    def __init__(self, path, flush_interval=2.0, max_queue=10000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_queue)
+        self._connection = connect(path)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.error = None
+        self._retry = []
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def record(self, name, width, height, labels, scores=None, source=None, frame=None, timestamp=None):
+        """
+        Queues the labels of one image. name is the label file's path under
+        the output folder without .txt, labels are the normalized YOLO rows.
+        Blocks while the queue is full rather than losing labels, and raises
+        the writer's error once the writer has stopped.
+        """
+        labels = np.asarray(labels, dtype=np.float64).reshape(-1, 5)
+        item = (name, source, frame, timestamp, width, height, labels, scores, time.time())
+        while True:
+            if self.error is not None:
+                raise RuntimeError(f"Label store writer stopped: {self.error}")
+            try:
+                self.pending.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def flush(self):
+        records, self._retry = self._retry, []
+        while True:
+            try:
+                records.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        if records:
+            try:
+                with self._lock, self._connection:
+                    write_records(self._connection, records)
+            except sqlite3.OperationalError:
+                # The transaction was rolled back; try these records again next time
+                self._retry = records
+                raise
+
+    def _write_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.OperationalError as e:
+                # Locked or busy; flush keeps the records for the next attempt
+                print(f"Error writing label store: {e}")
+            except Exception as e:
+                self.error = e
+                print(f"Label store writer stopped: {e}")
+                return
+
+    def close(self):
+        self._stop.set()
+        self._writer.join()
+        if self.error is None:
+            self.flush()
+        self._connection.close()
+
+def write_records(connection, records):
+    for name, source, frame, timestamp, width, height, labels, scores, updated in records:
+        connection.execute(
+            "INSERT INTO images (name, source, frame, timestamp, width, height, boxes, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET source = excluded.source, "
+            "frame = excluded.frame, timestamp = excluded.timestamp, width = excluded.width, "
+            "height = excluded.height, boxes = excluded.boxes, updated = excluded.updated",
+            (name, source, frame, timestamp, width, height, len(labels), updated))
+        image_id = connection.execute("SELECT id FROM images WHERE name = ?", (name,)).fetchone()[0]
+        connection.execute("DELETE FROM boxes WHERE image_id = ?", (image_id,))
+        if len(labels):
+            score_column = scores if scores is not None else [None] * len(labels)
+            connection.executemany("INSERT INTO boxes VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (image_id, int(row[0]), row[1], row[2], row[3], row[4],
+                 None if score is None else float(score))
+                for row, score in zip(labels.tolist(), score_column)
+            ])
+
+def start(output_folder):
+    """Opens the label store in output_folder that record() appends to. Returns the LabelStore."""
+    global _store
+    if _store is None:
+        os.makedirs(output_folder, exist_ok=True)
+        _store = LabelStore(os.path.join(output_folder, LABEL_STORE_FILE_NAME))
+        atexit.register(stop)
+    return _store
+
+def stop():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
+
+def record(name, width, height, labels, scores=None, source=None, frame=None, timestamp=None):
+    """Adds labels to the open store; does nothing when no store was started."""
+    if _store is not None:
+        _store.record(name, width, height, labels, scores, source, frame, timestamp)
+
+def import_labels(labels_folder, store_path):
+    """
+    Indexes existing .txt label files, e.g. an Output/ folder labelled
+    before the store existed. Files already indexed since they last changed
+    are skipped, so running it again only reads new or edited labels.
+    """
+    connection = connect(store_path)
+    known = dict(connection.execute("SELECT name, updated FROM images"))
+    records = []
+    imported = 0
+    skipped = []
+    for root, _, files in os.walk(labels_folder):
+        for file_name in files:
+            if not file_name.endswith(".txt"):
+                continue
+            path = os.path.join(root, file_name)
+            name = os.path.splitext(os.path.relpath(path, labels_folder))[0]
+            mtime = os.stat(path).st_mtime
+            if known.get(name, -1) >= mtime:
+                continue
+            try:
+                with open(path, "r") as f:
+                    rows = [line.split() for line in f if line.strip()]
+                if any(len(row) != 5 for row in rows):
+                    raise ValueError("not 5 values per line")
+                labels = np.array(rows, dtype=np.float64)
+            except (OSError, UnicodeDecodeError, ValueError) as e:
+                # e.g. classes.txt, or a damaged label file
+                skipped.append((name, e))
+                continue
+            records.append((name, None, None, None, None, None, labels.reshape(-1, 5), None, mtime))
+            if len(records) >= 5000:
+                with connection:
+                    write_records(connection, records)
+                imported += len(records)
+                records = []
+    with connection:
+        write_records(connection, records)
+    imported += len(records)
+    connection.close()
+    print(f"Indexed {imported} label files into {store_path}")
+    if skipped:
+        print(f"Skipped {len(skipped)} files that are not YOLO label files:")
+        for name, error in skipped:
+            print(f"  {name}.txt: {error}")
+
+def export_labels(store_path, labels_folder):
+    """Writes the per-image YOLO .txt layout that Train-Model expects, one file per image."""
+    connection = connect(store_path)
+    exported = 0
+    images = connection.execute("SELECT id, name FROM images ORDER BY id")
+    for image_id, name in images.fetchall():
+        labels = connection.execute(
+            "SELECT class_id, x, y, w, h FROM boxes WHERE image_id = ? ORDER BY rowid", (image_id,)).fetchall()
+        path = os.path.join(labels_folder, name + ".txt")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(format_labels(labels))
+        exported += 1
+    connection.close()
+    print(f"Exported {exported} label files to {labels_folder}")
+
+def print_stats(store_path):
+    """Image and box counts, per-class counts and the box size distribution."""
+    connection = connect(store_path)
+    image_count, empty_count = connection.execute(
+        "SELECT COUNT(*), COALESCE(SUM(boxes = 0), 0) FROM images").fetchone()
+    box_count, mean_score = connection.execute("SELECT COUNT(*), AVG(score) FROM boxes").fetchone()
+    print(f"Images: {image_count}  without detections: {empty_count}  boxes: {box_count}"
+          + (f"  mean score: {mean_score:.3f}" if mean_score is not None else ""))
+
+    print(f"\n{'Class':>6} {'Boxes':>10} {'Images':>10}")
+    for class_id, boxes, images in connection.execute(
+            "SELECT class_id, COUNT(*), COUNT(DISTINCT image_id) FROM boxes GROUP BY class_id ORDER BY class_id"):
+        print(f"{class_id:>6} {boxes:>10} {images:>10}")
+
+    bucket_case = " ".join(f"WHEN w * h < {limit} THEN {i}" for i, limit in enumerate(AREA_BUCKETS))
+    counts = dict(connection.execute(
+        f"SELECT CASE {bucket_case} ELSE {len(AREA_BUCKETS)} END AS bucket, COUNT(*) FROM boxes GROUP BY bucket"))
+    print("\nBox area (fraction of the image):")
+    bounds = (0,) + AREA_BUCKETS + (1,)
+    for i in range(len(bounds) - 1):
+        print(f"  {bounds[i]:>6.3f} - {bounds[i + 1]:<6.3f} {counts.get(i, 0):>10}")
+    connection.close()
+
+def query_images(store_path, kind, value=None):
+    """Prints the names of images with class value ("class"), or without detections ("empty")."""
+    connection = connect(store_path)
+    if kind == "class":
+        rows = connection.execute(
+            "SELECT name FROM images WHERE id IN (SELECT DISTINCT image_id FROM boxes WHERE class_id = ?) "
+            "ORDER BY name", (int(value),))
+    else:
+        rows = connection.execute("SELECT name FROM images WHERE boxes = 0 ORDER BY name")
+    for (name,) in rows:
+        print(name)
+    connection.close()
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "stats" and len(sys.argv) == 3:
+        print_stats(sys.argv[2])
+    elif command == "query" and len(sys.argv) == 5 and sys.argv[3] == "class":
+        query_images(sys.argv[2], "class", sys.argv[4])
+    elif command == "query" and len(sys.argv) == 4 and sys.argv[3] == "empty":
+        query_images(sys.argv[2], "empty")
+    elif command == "export" and len(sys.argv) == 4:
+        export_labels(sys.argv[2], sys.argv[3])
+    elif command == "import" and len(sys.argv) == 4:
+        import_labels(sys.argv[2], sys.argv[3])
+    else:
+        print("Usage: python3 programs/labelstore.py stats <labels.db>")
+        print("       python3 programs/labelstore.py query <labels.db> class <class_id>")
+        print("       python3 programs/labelstore.py query <labels.db> empty")
+        print("       python3 programs/labelstore.py export <labels.db> <labels_folder>")
+        print("       python3 programs/labelstore.py import <labels_folder> <labels.db>")
@@ -0,0 +1,280 @@
+import os
+import io
+import sys
+import json
+import mmap
+import tarfile
+import threading
+import numpy as np
+import cv2
+
+SHARD_PATTERN = "shard-{:06d}.tar"
+INDEX_SUFFIX = ".idx.json"
+TEMP_SUFFIX = ".tmp"
+
+def _is_shard_file(file_name, suffix=""):
+    return file_name.startswith("shard-") and file_name.endswith((".tar" + suffix, ".tar" + INDEX_SUFFIX + suffix))
+
+class ShardWriter:
+    """
+    Streams samples into a sequence of tar shards in output_folder.
+    Each sample is a key plus one or more members such as {"jpg": bytes, "txt": bytes}.
+    Next to every shard an index records each member's byte offset so
+    readers can memory-map the tar and slice samples out without unpacking.
+    The shards are written under temporary names and replace the folder's
+    existing shards on close(), so writing a folder again never leaves two
+    copies of a key.
+    """
+    def __init__(self, output_folder, max_shard_bytes=1 << 30):
+        os.makedirs(output_folder, exist_ok=True)
+        self.output_folder = output_folder
+        self.max_shard_bytes = max_shard_bytes
+        self._remove_shard_files(TEMP_SUFFIX)  # Left behind by a run that did not finish
+        self.shard_number = 0
+        self.tar = None
+        self.index = []
+        self.sample_count = 0
+        self._lock = threading.Lock()
+
+    def _remove_shard_files(self, suffix=""):
+        for file_name in os.listdir(self.output_folder):
+            if _is_shard_file(file_name, suffix):
+                os.remove(os.path.join(self.output_folder, file_name))
+
+    def _open_shard(self):
+        self.shard_path = os.path.join(self.output_folder, SHARD_PATTERN.format(self.shard_number))
+        self.tar = tarfile.open(self.shard_path + TEMP_SUFFIX, "w", format=tarfile.USTAR_FORMAT)
+        self.index = []
+
+    def _close_shard(self):
+        if self.tar is None:
+            return
+        self.tar.close()
+        with open(self.shard_path + INDEX_SUFFIX + TEMP_SUFFIX, "w") as f:
+            json.dump({"samples": self.index}, f)
+        self.tar = None
+        self.shard_number += 1
+
+    def _replace_shards(self):
+        self._remove_shard_files()
+        for shard_number in range(self.shard_number):
+            shard_path = os.path.join(self.output_folder, SHARD_PATTERN.format(shard_number))
+            os.replace(shard_path + TEMP_SUFFIX, shard_path)
+            # The index goes last; readers only list shards that have one
+            os.replace(shard_path + INDEX_SUFFIX + TEMP_SUFFIX, shard_path + INDEX_SUFFIX)
+
+    def write(self, key, members, shape=None):
+        """Appends one sample. shape is the optional (height, width) of the image."""
+        with self._lock:
+            if self.tar is None:
+                self._open_shard()
+
+            entry = {"key": key}
+            if shape is not None:
+                entry["shape"] = list(shape)
+            for extension, data in members.items():
+                info = tarfile.TarInfo(f"{key}.{extension}")
+                info.size = len(data)
+                header = info.tobuf(self.tar.format, self.tar.encoding, self.tar.errors)
+                entry[extension] = [self.tar.offset + len(header), len(data)]
+                self.tar.addfile(info, io.BytesIO(data))
+            self.index.append(entry)
+            self.sample_count += 1
+
+            if self.tar.offset >= self.max_shard_bytes:
+                self._close_shard()
+
+    def close(self):
+        with self._lock:
+            self._close_shard()
+            self._replace_shards()
+
+class ShardReader:
+    """
+    Random access to every sample in a directory of shards written by ShardWriter.
+    """
+    def __init__(self, shard_folder):
+        self.shard_folder = shard_folder
+        self.shard_paths = sorted(
+            os.path.join(shard_folder, f) for f in os.listdir(shard_folder)
+            if f.endswith(".tar") and os.path.exists(os.path.join(shard_folder, f + INDEX_SUFFIX))
+        )
+        self.samples = []
+        for shard_id, shard_path in enumerate(self.shard_paths):
+            with open(shard_path + INDEX_SUFFIX, "r") as f:
+                for entry in json.load(f)["samples"]:
+                    self.samples.append((shard_id, entry))
+        self._maps = {}
+
+    def __len__(self):
+        return len(self.samples)
+
+    def _map(self, shard_id):
+        # Maps are opened lazily so forked data loader workers get their own
+        shard_map = self._maps.get((os.getpid(), shard_id))
+        if shard_map is None:
+            with open(self.shard_paths[shard_id], "rb") as f:
+                shard_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[(os.getpid(), shard_id)] = shard_map
+        return shard_map
+
+    def key(self, i):
+        return self.samples[i][1]["key"]
+
+    def shape(self, i):
+        shape = self.samples[i][1].get("shape")
+        return tuple(shape) if shape else None
+
+    def read_bytes(self, i, extension="jpg"):
+        """Returns the raw bytes of one member of sample i, or None if it has none."""
+        shard_id, entry = self.samples[i]
+        if extension not in entry:
+            return None
+        offset, size = entry[extension]
+        return self._map(shard_id)[offset:offset + size]
+
+    def read_image(self, i, flags=cv2.IMREAD_COLOR):
+        data = self.read_bytes(i, "jpg")
+        if data is None:
+            return None
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+    def read_label(self, i):
+        data = self.read_bytes(i, "txt")
+        return data.decode() if data is not None else None
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.key(i), self.read_image(i)
+
+def is_shard_folder(folder):
+    """True when folder holds at least one indexed shard."""
+    try:
+        return any(f.endswith(".tar" + INDEX_SUFFIX) for f in os.listdir(folder))
+    except OSError:
+        return False
+
+def find_shard_folders(folder):
+    """
+    The shard folders to read for folder: folder itself when it holds
+    shards, otherwise its subfolders that do, such as the output/<video>/
+    folders Prep-Media writes.
+    """
+    if is_shard_folder(folder):
+        return [folder]
+    try:
+        subfolders = sorted(os.path.join(folder, f) for f in os.listdir(folder))
+    except OSError:
+        return []
+    return [subfolder for subfolder in subfolders if os.path.isdir(subfolder) and is_shard_folder(subfolder)]
+
+def pack_folder(images_folder, labels_folder, output_folder, max_shard_bytes=1 << 30):
+    """
+    Packs existing JPG files and their YOLO label files into shards for training.
+    Images without a label file are packed as backgrounds.
+    """
+    writer = ShardWriter(output_folder, max_shard_bytes)
+    images = sorted(f for f in os.listdir(images_folder) if f.lower().endswith(".jpg"))
+    for image_name in images:
+        key = os.path.splitext(image_name)[0]
+        with open(os.path.join(images_folder, image_name), "rb") as f:
+            members = {"jpg": f.read()}
+        image = cv2.imdecode(np.frombuffer(members["jpg"], dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Skipping unreadable image: {image_name}")
+            continue
+        label_path = os.path.join(labels_folder, key + ".txt")
+        if os.path.exists(label_path):
+            with open(label_path, "rb") as f:
+                members["txt"] = f.read()
+        writer.write(key, members, shape=image.shape[:2])
+    writer.close()
+    print(f"Packed {writer.sample_count} samples into {output_folder}")
+
+# Shard images are exposed to ultralytics as virtual paths inside the shard folder
+_VIRTUAL_IMAGES = {}
+
+def _shard_imread(original_imread):
+    def imread(filename, flags=cv2.IMREAD_COLOR):
+        sample = _VIRTUAL_IMAGES.get(str(filename))
+        if sample is None:
+            return original_imread(filename, flags=flags)
+        reader, i = sample
+        return reader.read_image(i, flags)
+    return imread
+
+def build_shard_trainer():
+    """
+    Returns a DetectionTrainer subclass whose datasets read images and labels
+    straight from shard folders. Pass it as model.train(trainer=...); the
+    train/val entries of data.yaml then point at shard folders.
+    """
+    from ultralytics.data import base as data_base
+    from ultralytics.data.dataset import YOLODataset
+    from ultralytics.models.yolo.detect import DetectionTrainer
+    from ultralytics.utils import colorstr
+
+    if not getattr(data_base.imread, "_reads_shards", False):
+        data_base.imread = _shard_imread(data_base.imread)
+        data_base.imread._reads_shards = True
+
+    class ShardYOLODataset(YOLODataset):
+        def get_img_files(self, img_path):
+            self.reader = ShardReader(img_path)
+            files = []
+            for i in range(len(self.reader)):
+                path = os.path.join(img_path, self.reader.key(i) + ".jpg")
+                _VIRTUAL_IMAGES[path] = (self.reader, i)
+                files.append(path)
+            if not files:
+                raise FileNotFoundError(f"{self.prefix}No shards found in {img_path}")
+            return files
+
+        def get_labels(self):
+            labels = []
+            for i, im_file in enumerate(self.im_files):
+                shape = self.reader.shape(i) or self.reader.read_image(i).shape[:2]
+                text = self.reader.read_label(i) or ""
+                rows = [line.split() for line in text.splitlines() if line.strip()]
+                lb = np.array(rows, dtype=np.float32).reshape(-1, 5)
+                labels.append({
+                    "im_file": im_file,
+                    "shape": shape,
+                    "cls": lb[:, 0:1],
+                    "bboxes": lb[:, 1:],
+                    "segments": [],
+                    "keypoints": None,
+                    "normalized": True,
+                    "bbox_format": "xywh",
+                })
+            return labels
+
+    class ShardDetectionTrainer(DetectionTrainer):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            model = getattr(self.model, "module", self.model)
+            gs = max(int(model.stride.max() if model else 0), 32)
+            return ShardYOLODataset(
+                img_path=img_path,
+                imgsz=self.args.imgsz,
+                batch_size=batch,
+                augment=mode == "train",
+                hyp=self.args,
+                rect=self.args.rect or mode == "val",
+                cache=self.args.cache or None,
+                single_cls=self.args.single_cls or False,
+                stride=gs,
+                pad=0.0 if mode == "train" else 0.5,
+                prefix=colorstr(f"{mode}: "),
+                task=self.args.task,
+                classes=self.args.classes,
+                data=self.data,
+                fraction=self.args.fraction if mode == "train" else 1.0,
+            )
+
+    return ShardDetectionTrainer
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "pack":
+        pack_folder(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        print("Usage: python3 programs/shards.py pack <images_folder> <labels_folder> <output_folder>")
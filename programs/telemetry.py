@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+
+TELEMETRY_FILE_NAME = "telemetry.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS latency (
+    ts REAL NOT NULL,
+    target TEXT NOT NULL,
+    latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS latency_target_ts ON latency (target, ts);
+CREATE TABLE IF NOT EXISTS bandwidth (
+    ts REAL NOT NULL,
+    server TEXT NOT NULL,
+    port INTEGER,
+    protocol TEXT,
+    direction TEXT,
+    streams INTEGER,
+    sent_mbps REAL,
+    received_mbps REAL,
+    duration REAL,
+    error TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS bandwidth_server_ts ON bandwidth (server, ts);
+"""
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    # WAL lets the menu read history while a writer appends
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+class TelemetryStore:
+    """
+    Append-only SQLite store for latency samples and bandwidth test results.
+    record_* calls only queue the row; a background thread writes queued
+    rows in one transaction every flush_interval seconds, so callers never
+    wait on disk.
+    """
+    def __init__(self, logs_path, flush_interval=5.0, max_queue=10000):
+        os.makedirs(logs_path, exist_ok=True)
+        self.path = os.path.join(logs_path, TELEMETRY_FILE_NAME)
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._connection = connect(self.path)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _queue(self, table, row):
+        try:
+            self.pending.put_nowait((table, row))
+        except queue.Full:
+            # Never block the caller; losing a sample beats stalling the UI
+            self.dropped += 1
+
+    def record_latency(self, results, timestamp=None):
+        """Queues one probe round: a dict of target name -> latency in ms (None for a lost probe)."""
+        timestamp = timestamp or time.time()
+        for target, latency in results.items():
+            self._queue("latency", (timestamp, target, latency))
+
+    def record_bandwidth(self, server, port, protocol, direction, streams, sent_mbps, received_mbps,
+                         duration, error=None, details=None, timestamp=None):
+        self._queue("bandwidth", (
+            timestamp or time.time(), server, port, protocol, direction, streams,
+            sent_mbps, received_mbps, duration, error, json.dumps(details) if details is not None else None,
+        ))
+
+    def flush(self):
+        rows = {"latency": [], "bandwidth": []}
+        while True:
+            try:
+                table, row = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            rows[table].append(row)
+        if not rows["latency"] and not rows["bandwidth"]:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT INTO latency VALUES (?, ?, ?)", rows["latency"])
+            self._connection.executemany(
+                "INSERT INTO bandwidth VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows["bandwidth"])
+
+    def _write_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Error writing telemetry: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._writer.join()
+        self.flush()
+        self._connection.close()
+
+    def latency_targets(self):
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT DISTINCT target FROM latency ORDER BY target")]
+
+    def latency_history(self, target, seconds, buckets):
+        """
+        Returns buckets evenly spaced over the last seconds, oldest first.
+        Each bucket is (mean latency or None, loss fraction or None when empty).
+        """
+        now = time.time()
+        since = now - seconds
+        width = seconds / buckets
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT CAST((ts - ?) / ? AS INTEGER) AS bucket, AVG(latency_ms), "
+                "SUM(latency_ms IS NULL), COUNT(*) FROM latency "
+                "WHERE target = ? AND ts >= ? GROUP BY bucket",
+                (since, width, target, since),
+            ).fetchall()
+        history = [(None, None)] * buckets
+        for bucket, mean, lost, count in rows:
+            if 0 <= bucket < buckets:
+                history[bucket] = (mean, lost / count)
+        return history
+
+    def bandwidth_history(self, limit=50):
+        """The most recent bandwidth results, oldest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT ts, server, port, protocol, direction, streams, sent_mbps, received_mbps, error "
+                "FROM bandwidth ORDER BY ts DESC LIMIT ?", (limit,),
+            ).fetchall()
+        return rows[::-1]
+
+def record_bandwidth_result(logs_path, **result):
+    """Writes one bandwidth result straight away, for short-lived scripts."""
+    os.makedirs(logs_path, exist_ok=True)
+    connection = connect(os.path.join(logs_path, TELEMETRY_FILE_NAME))
+    details = result.get("details")
+    with connection:
+        connection.execute("INSERT INTO bandwidth VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            result.get("timestamp") or time.time(), result["server"], result.get("port"),
+            result.get("protocol"), result.get("direction"), result.get("streams"),
+            result.get("sent_mbps"), result.get("received_mbps"), result.get("duration"),
+            result.get("error"), json.dumps(details) if details is not None else None,
+        ))
+    connection.close()
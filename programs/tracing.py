@@ -0,0 +1,401 @@
+import os
+import sys
+import glob
+import json
+import time
+import atexit
+import signal
+import resource
+import threading
+from collections import Counter
+from appconfig import load_settings
+
+TRACE_FOLDER_NAME = "traces"
+TRACE_KEEP_DAYS = 7
+PROFILE_SIGNAL = signal.SIGUSR1
+
+_tracer = None
+
+def trace_folder(logs_path):
+    return os.path.join(logs_path, TRACE_FOLDER_NAME)
+
+def trace_path(logs_path, pid, parent=None):
+    """The rolling trace file of one process. A forked worker's file also names its parent."""
+    if parent is not None:
+        return os.path.join(trace_folder(logs_path), f"trace-{parent}-{pid}.jsonl")
+    return os.path.join(trace_folder(logs_path), f"trace-{pid}.jsonl")
+
+def read_tracing_settings(settings_file="settings.ini"):
+    """
+    Reads the [Tracing] section of settings.ini. TERMINAX_TRACE=1 in the
+    environment turns tracing on for one run without editing the file.
+    """
+    config = load_settings(settings_file)
+    enabled = config.getboolean("Tracing", "enabled", fallback=False)
+    if os.environ.get("TERMINAX_TRACE"):
+        enabled = os.environ["TERMINAX_TRACE"] not in ("0", "false", "no")
+    return {
+        "enabled": enabled,
+        "logs_path": config.get("Paths", "logs_path", fallback="Logs"),
+        "flush_interval": max(0.1, config.getfloat("Tracing", "flush_interval", fallback=1.0)),
+        "max_file_mb": max(1, config.getint("Tracing", "max_file_mb", fallback=8)),
+        "backups": max(0, config.getint("Tracing", "backups", fallback=2)),
+        "sample_seconds": max(0.1, config.getfloat("Tracing", "sample_seconds", fallback=10.0)),
+        "sample_interval_ms": max(1.0, config.getfloat("Tracing", "sample_interval_ms", fallback=5.0)),
+        "cprofile": config.getboolean("Tracing", "cprofile", fallback=False),
+    }
+
+def prune_traces(logs_path, keep_days=TRACE_KEEP_DAYS):
+    """Removes trace and profile files older than keep_days."""
+    cutoff = time.time() - keep_days * 86400
+    try:
+        with os.scandir(trace_folder(logs_path)) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+    except OSError:
+        pass
+
+class _NullSpan:
+    """Returned by span() while tracing is off, so a disabled span costs one call."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    __slots__ = ("tracer", "name", "started")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add(self.name, time.perf_counter() - self.started)
+        return False
+
+def current_rss_kb():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return 0
+
+class Tracer:
+    """
+    Collects span timings and counters for one process. A background thread
+    appends a cumulative snapshot to the process's trace file every
+    flush_interval seconds, rolling the file over at max_file_mb. Sending
+    the process SIGUSR1 records a sampling profile of every thread.
+    parent is set for forked workers, whose snapshots read_latest_snapshot
+    adds to the parent's. Every fork gets one, so a worker's tracer leaves
+    the folder to its parent and only starts its flush thread, and only
+    writes a file, once it records something.
+    """
+    def __init__(self, program, logs_path, flush_interval=1.0, max_file_mb=8, backups=2,
+                 sample_seconds=10.0, sample_interval_ms=5.0, cprofile=False, parent=None):
+        self.program = program
+        self.logs_path = logs_path
+        self.parent = parent
+        self.path = trace_path(logs_path, os.getpid(), parent)
+        if parent is None:
+            os.makedirs(trace_folder(logs_path), exist_ok=True)
+            prune_traces(logs_path)
+            if os.path.exists(self.path):
+                # Left by an earlier process that had the same pid
+                os.remove(self.path)
+        self.pid = os.getpid()
+        self.flush_interval = flush_interval
+        self.max_bytes = max_file_mb << 20
+        self.backups = backups
+        self.sample_seconds = sample_seconds
+        self.sample_interval = sample_interval_ms / 1000
+        self.started = time.time()
+        self.spans = {}  # name -> [count, total seconds, max seconds]
+        self.counters = Counter()
+        self.profiles = []
+        self._version = 0
+        self._written = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampling = False
+        self._profiler = None
+        if cprofile:
+            import cProfile
+
+            # cProfile only follows the thread it was enabled on, here the main thread
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._thread = None
+        if parent is None:
+            self._start_flushing()
+
+    def _start_flushing(self):
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def add(self, name, seconds):
+        with self._lock:
+            if self._thread is None:
+                self._start_flushing()
+            stats = self.spans.get(name)
+            if stats is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                if seconds > stats[2]:
+                    stats[2] = seconds
+            self._version += 1
+
+    def count(self, name, amount=1):
+        with self._lock:
+            if self._thread is None:
+                self._start_flushing()
+            self.counters[name] += amount
+            self._version += 1
+
+    def snapshot(self):
+        with self._lock:
+            spans = {name: {"count": count, "total_s": round(total, 6), "max_ms": round(longest * 1000, 3)}
+                     for name, (count, total, longest) in self.spans.items()}
+            counters = dict(self.counters)
+            profiles = list(self.profiles)
+        return {
+            "ts": time.time(),
+            "pid": self.pid,
+            "parent": self.parent,
+            "program": self.program,
+            "elapsed_s": round(time.time() - self.started, 3),
+            "spans": spans,
+            "counters": counters,
+            "rss_kb": current_rss_kb(),
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "profiles": profiles,
+        }
+
+    def flush(self, force=False):
+        """Appends a snapshot when anything changed since the last one."""
+        if not force and self._written == self._version:
+            return
+        self._written = self._version
+        line = json.dumps(self.snapshot()) + "\n"
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._roll_over()
+            with open(self.path, "a") as f:
+                f.write(line)
+        except OSError:
+            pass
+
+    def _roll_over(self):
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{number}"):
+                os.replace(f"{self.path}.{number}", f"{self.path}.{number + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def sample(self):
+        """
+        Samples the stack of every thread for sample_seconds and writes the
+        counts as folded stacks (one "frame;frame;frame count" line each),
+        the input format of flamegraph tools. Runs on its own thread.
+        """
+        if self._sampling:
+            return
+        self._sampling = True
+        threading.Thread(target=self._sample, daemon=True).start()
+
+    def _sample(self):
+        stacks = Counter()
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.sample_seconds
+        try:
+            while time.monotonic() < deadline:
+                # Thread ids are reused, so names are looked up again on every sample
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                flusher = self._thread.ident if self._thread is not None else None
+                for ident, frame in sys._current_frames().items():
+                    if ident == own or ident == flusher:
+                        continue
+                    frames = []
+                    while frame is not None:
+                        code = frame.f_code
+                        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    stacks[";".join([names.get(ident, str(ident))] + frames[::-1])] += 1
+                time.sleep(self.sample_interval)
+            path = os.path.join(trace_folder(self.logs_path), f"profile-{self.pid}-{int(time.time())}.folded")
+            with open(path, "w") as f:
+                for stack, samples in stacks.most_common():
+                    f.write(f"{stack} {samples}\n")
+            with self._lock:
+                self.profiles.append(path)
+                self._version += 1
+        finally:
+            self._sampling = False
+
+    def close(self):
+        self._stop.set()
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(os.path.join(trace_folder(self.logs_path), f"cprofile-{self.pid}.prof"))
+            with self._lock:
+                self.profiles.append(os.path.join(trace_folder(self.logs_path), f"cprofile-{self.pid}.prof"))
+        if self._thread is None:
+            # A worker that never recorded anything leaves no trace file
+            return
+        self.flush(force=True)
+
+def start(program, settings_file="settings.ini"):
+    """
+    Turns tracing on for this process when [Tracing] enabled is set.
+    Returns the Tracer, or None when tracing is off.
+    """
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    try:
+        settings = read_tracing_settings(settings_file)
+    except Exception as e:
+        print(f"Error reading tracing settings: {e}")
+        return None
+    if not settings["enabled"]:
+        return None
+    try:
+        _tracer = Tracer(program, settings["logs_path"], settings["flush_interval"], settings["max_file_mb"],
+                         settings["backups"], settings["sample_seconds"], settings["sample_interval_ms"],
+                         settings["cprofile"])
+    except OSError as e:
+        print(f"Error starting tracing: {e}")
+        return None
+    atexit.register(stop)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(PROFILE_SIGNAL, lambda signum, frame: _tracer is not None and _tracer.sample())
+    return _tracer
+
+def stop():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+def _trace_child():
+    """
+    A forked worker, such as a ProcessPoolExecutor process, does not own the
+    parent's trace file or flush thread. It gets a tracer of its own that
+    writes trace-<parent>-<pid>.jsonl, so spans timed in workers still show
+    up under the parent's job. Workers started with the spawn or forkserver
+    methods do not inherit tracing, and a worker that is killed loses what
+    it timed since its last flush.
+    """
+    global _tracer
+    inherited = _tracer
+    _tracer = None
+    if inherited is None:
+        return
+    try:
+        # Workers of workers are still reported under the top-level job
+        _tracer = Tracer(inherited.program, inherited.logs_path, inherited.flush_interval,
+                         inherited.max_bytes >> 20, inherited.backups,
+                         parent=inherited.parent if inherited.parent is not None else inherited.pid)
+    except OSError:
+        return
+    # multiprocessing workers leave with os._exit, which skips atexit but runs
+    # its finalizers. The worker clears those on startup, then runs its
+    # after-fork callbacks, so the finalizer is registered from one of those.
+    # Only a process that has multiprocessing loaded can fork such a worker.
+    util = sys.modules.get("multiprocessing.util")
+    if util is not None:
+        util.register_after_fork(_tracer, lambda tracer: util.Finalize(None, stop, exitpriority=0))
+    atexit.register(stop)
+
+os.register_at_fork(after_in_child=_trace_child)
+
+def span(name):
+    """Times a block: with span("decode"): ..."""
+    if _tracer is None:
+        return NULL_SPAN
+    return Span(_tracer, name)
+
+def count(name, amount=1):
+    if _tracer is not None:
+        _tracer.count(name, amount)
+
+def traced_iter(name, iterable):
+    """Times every step of an iterator as a span, e.g. each decoded frame of a video."""
+    if _tracer is None:
+        return iterable
+    return _traced_iter(name, iterable)
+
+def _traced_iter(name, iterable):
+    iterator = iter(iterable)
+    while True:
+        with span(name):
+            item = next(iterator, _END)
+        if item is _END:
+            return
+        yield item
+
+_END = object()
+
+def read_latest_snapshot(logs_path, pid, since=0.0):
+    """
+    The last snapshot in a process's trace file, or None when it has none.
+    Snapshots older than since belong to an earlier process with the same pid.
+    The snapshots of the process's forked workers are merged in: span and
+    counter totals are added up, rss_kb covers the workers still running,
+    peak_rss_kb is the largest single process and workers counts them.
+    """
+    snapshot = _read_last_snapshot(trace_path(logs_path, pid), since)
+    if snapshot is None:
+        return None
+    workers = [_read_last_snapshot(path, since)
+               for path in glob.glob(os.path.join(trace_folder(logs_path), f"trace-{pid}-*.jsonl"))]
+    workers = [worker for worker in workers if worker is not None]
+    snapshot["workers"] = len(workers)
+    for worker in workers:
+        for name, stats in worker["spans"].items():
+            merged = snapshot["spans"].setdefault(name, {"count": 0, "total_s": 0.0, "max_ms": 0.0})
+            merged["count"] += stats["count"]
+            merged["total_s"] += stats["total_s"]
+            merged["max_ms"] = max(merged["max_ms"], stats["max_ms"])
+        for name, value in worker["counters"].items():
+            snapshot["counters"][name] = snapshot["counters"].get(name, 0) + value
+        if os.path.exists(f"/proc/{worker['pid']}"):
+            snapshot["rss_kb"] += worker["rss_kb"]
+        snapshot["peak_rss_kb"] = max(snapshot["peak_rss_kb"], worker["peak_rss_kb"])
+    return snapshot
+
+def _read_last_snapshot(path, since):
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 65536))
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    for line in reversed(lines):
+        try:
+            snapshot = json.loads(line)
+        except ValueError:
+            continue
+        return snapshot if snapshot.get("ts", 0) >= since else None
+    return None
@@ -0,0 +1,102 @@
+import os
+import re
+import cv2
+
+VIDEO_EXTENSIONS = (".mov", ".mp4")
+DEVICE_PATTERN = re.compile(r"^(?:/dev/video)?(\d+)$")
+
+def is_video_file(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+def device_index(source):
+    """Returns the camera index for "/dev/video2" or "2", otherwise None."""
+    match = DEVICE_PATTERN.match(str(source).strip())
+    return int(match.group(1)) if match else None
+
+def open_capture(source):
+    """Opens a video file or a video device for reading."""
+    index = device_index(source)
+    return cv2.VideoCapture(index if index is not None else source)
+
+def source_name(source):
+    """Folder-friendly name for a source: the file's base name, or camera<N> for a device."""
+    index = device_index(source)
+    if index is not None:
+        return f"camera{index}"
+    return os.path.splitext(os.path.basename(source))[0]
+
+# Gaps shorter than this are skipped with grab() rather than a seek
+SEEK_MIN_GAP = 8
+
+def sample_frame_indices(fps, fps_interval=1, start_time=0.0, end_time=None, frame_total=0):
+    """
+    Yields the frame indices to keep: one every fps_interval seconds between
+    start_time and end_time. fps may be fractional (e.g. 29.97).
+    """
+    if fps_interval <= 0:
+        raise ValueError(f"fps_interval must be greater than 0, got {fps_interval}")
+    step = fps * fps_interval
+    first = start_time * fps
+    last_index = -1
+    k = 0
+    while True:
+        index = int(round(first + k * step))
+        k += 1
+        if end_time is not None and index >= end_time * fps:
+            return
+        if frame_total and index >= frame_total:
+            return
+        if index > last_index:
+            last_index = index
+            yield index
+
+def iter_sampled_frames(video_capture, fps_interval=1, start_time=0.0, end_time=None, mode="seek"):
+    """
+    Yields (frame_index, frame) for the sampled frames of an open capture.
+    mode "seek" jumps to each kept frame, "grab" skips frames without
+    decoding them to images, and "read" decodes every frame.
+    Seeking falls back to grab when the container reports a bad position.
+    """
+    if fps_interval <= 0:
+        raise ValueError(f"fps_interval must be greater than 0, got {fps_interval}")
+    fps = video_capture.get(cv2.CAP_PROP_FPS)
+    if fps <= 0:
+        # Unknown frame rate: keep every frame, as the sequential reader did
+        fps = 1.0 / fps_interval
+    frame_total = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    if mode == "seek" and frame_total <= 0:
+        mode = "grab"
+
+    position = 0
+    for target in sample_frame_indices(fps, fps_interval, start_time, end_time, frame_total):
+        if mode == "seek" and target - position >= SEEK_MIN_GAP:
+            video_capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+            success, frame = video_capture.read()
+            actual = int(video_capture.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+            if success and actual == target:
+                position = target + 1
+                yield target, frame
+                continue
+            print("Seeking is unreliable for this video, falling back to sequential grab.")
+            mode = "grab"
+            position = max(0, actual + 1)
+
+        if position > target:
+            # The failed seek landed past this frame and a sequential reader cannot go back
+            print(f"Skipping frame {target}, the stream is already at frame {position}.")
+            continue
+
+        while position < target:
+            if mode == "read":
+                success, _ = video_capture.read()
+            else:
+                success = video_capture.grab()
+            if not success:
+                return
+            position += 1
+
+        success, frame = video_capture.read()
+        if not success:
+            return
+        position += 1
+        yield target, frame
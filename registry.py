@@ -0,0 +1,160 @@
+import os
+import time
+import threading
+import configparser
+from fswatch import inotify_watch, read_events
+
+HEADER_SECTION = "terminax"
+HEADER_MAX_LINES = 30
+SIZE_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+def parse_size(text):
+    """Parses a size such as 512M or 4G into bytes."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+def parse_resources(text):
+    """
+    Parses a resources line such as "gpu=1 cpu=4 memory=4G" into
+    {"gpu": 1, "cpu": 4, "memory": 4294967296}. Missing entries are 0.
+    """
+    resources = {"gpu": 0, "cpu": 0, "memory": 0}
+    for item in text.replace(",", " ").split():
+        key, _, value = item.partition("=")
+        key = key.strip().lower()
+        if key not in resources:
+            raise ValueError(f"unknown resource {key!r}")
+        resources[key] = parse_size(value) if key == "memory" else int(value)
+    return resources
+
+def read_metadata(script_path):
+    """
+    Reads the metadata header from the leading comment block of a script:
+
+        # [terminax]
+        # name = Model Infrence
+        # menu = Machine Vision/Use Model
+        # args =
+        # resources = gpu=1 cpu=4 memory=4G
+        # gpu_heavy = true
+        # nice = 0
+        # affinity = auto
+
+    affinity is "auto" (pin to the cores the scheduler assigns), "none" or a
+    CPU list such as 0-3. Only the comment lines are read, so the script
+    itself is never imported. Returns None for files without a header,
+    such as shared modules.
+    """
+    lines = []
+    with open(script_path, "r", encoding="utf-8", errors="replace") as f:
+        for _ in range(HEADER_MAX_LINES):
+            line = f.readline()
+            if not line.startswith("#"):
+                break
+            lines.append(line[1:].strip())
+    if f"[{HEADER_SECTION}]" not in lines:
+        return None
+
+    header = configparser.ConfigParser()
+    header.read_string("\n".join(lines[lines.index(f"[{HEADER_SECTION}]"):]))
+    section = header[HEADER_SECTION]
+    return {
+        "name": section.get("name", os.path.splitext(os.path.basename(script_path))[0]),
+        "menu": section.get("menu", "Main").strip("/") or "Main",
+        "launch_args": section.get("args", ""),
+        "resources": parse_resources(section.get("resources", "")),
+        "gpu_heavy": section.getboolean("gpu_heavy", fallback=False),
+        "nice": section.getint("nice", fallback=0),
+        "affinity": section.get("affinity", "auto").strip() or "auto",
+    }
+
+class ProgramRegistry:
+    """
+    The programs found in programs_dir, read from their metadata headers.
+    scan() only lists the directory again when its mtime changed and only
+    re-reads headers of scripts whose mtime or size changed.
+    """
+    def __init__(self, programs_dir="programs"):
+        self.programs_dir = programs_dir
+        self.programs = {}  # script_path -> metadata
+        self.errors = {}  # script_path -> header error
+        self._dir_stamp = None
+        self._file_stamps = {}
+        self.changed = threading.Event()
+        self._watcher = None
+
+    def scan(self):
+        """Returns the programs, rescanning only what changed. Safe to call often."""
+        try:
+            dir_stamp = os.stat(self.programs_dir).st_mtime_ns
+        except OSError:
+            self.programs, self._file_stamps, self._dir_stamp = {}, {}, None
+            return self.programs
+
+        if dir_stamp != self._dir_stamp:
+            names = sorted(f for f in os.listdir(self.programs_dir) if f.endswith(".py"))
+            paths = [os.path.join(self.programs_dir, f) for f in names]
+            self._dir_stamp = dir_stamp
+        else:
+            paths = list(self._file_stamps)
+
+        programs, errors, stamps = {}, {}, {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stamps[path] = (stat.st_mtime_ns, stat.st_size)
+            if self._file_stamps.get(path) == stamps[path]:
+                if path in self.programs:
+                    programs[path] = self.programs[path]
+                if path in self.errors:
+                    errors[path] = self.errors[path]
+                continue
+            try:
+                metadata = read_metadata(path)
+            except (OSError, ValueError, configparser.Error) as e:
+                errors[path] = str(e)
+                continue
+            if metadata is not None:
+                programs[path] = metadata
+
+        self.programs, self.errors, self._file_stamps = programs, errors, stamps
+        return self.programs
+
+    def watch(self):
+        """
+        Sets self.changed whenever a script in programs_dir is added, removed
+        or written. Uses inotify when available, otherwise polls the directory.
+        """
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        fd = inotify_watch(self.programs_dir)
+        if fd is None:
+            self._watch_polling()
+            return
+        while True:
+            try:
+                events = read_events(fd)
+            except OSError:
+                return
+            if any(name.endswith(".py") for _, name in events):
+                self.changed.set()
+
+    def _watch_polling(self, interval=2.0):
+        stamps = None
+        while True:
+            try:
+                current = {f: os.stat(os.path.join(self.programs_dir, f)).st_mtime_ns
+                           for f in os.listdir(self.programs_dir) if f.endswith(".py")}
+            except OSError:
+                current = {}
+            if stamps is not None and current != stamps:
+                self.changed.set()
+            stamps = current
+            time.sleep(interval)
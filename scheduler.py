@@ -0,0 +1,199 @@
+import os
+import time
+import threading
+from registry import parse_size
+
+def parse_cpu_list(text):
+    """Parses a CPU list such as "0-3,6" into [0, 1, 2, 3, 6]."""
+    cpus = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+def detect_gpu_count():
+    """Number of NVIDIA GPUs from the driver's /proc entries, without initialising CUDA."""
+    try:
+        return len(os.listdir("/proc/driver/nvidia/gpus"))
+    except OSError:
+        return 0
+
+def total_memory_bytes():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+def available_memory_bytes():
+    """MemAvailable from /proc/meminfo, which also counts what other users' processes hold."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+def read_capacity(scheduler_config):
+    """
+    Capacity from the "scheduler" block of config.json. "auto" detects GPUs,
+    the CPUs this process may run on and physical memory less memory_reserve.
+    """
+    gpus = scheduler_config.get("gpu_slots", "auto")
+    cpus = scheduler_config.get("cpu_cores", "auto")
+    memory = scheduler_config.get("memory", "auto")
+    reserve = parse_size(str(scheduler_config.get("memory_reserve", "1G")))
+    return {
+        "gpu": list(range(detect_gpu_count())) if gpus == "auto" else list(range(int(gpus))),
+        "cpu": sorted(os.sched_getaffinity(0)) if cpus == "auto" else parse_cpu_list(str(cpus)),
+        "memory": max(0, total_memory_bytes() - reserve) if memory == "auto" else parse_size(str(memory)),
+    }
+
+class QueuedJob:
+    """A launch request waiting for resources."""
+    def __init__(self, queue_id, program):
+        self.id = f"q{queue_id}"
+        self.name = program.name
+        self.program = program
+        self.nice = program.nice
+        self.affinity = program.affinity
+        self.queued = time.time()
+        self.error = None  # Set when starting it failed
+
+    @property
+    def waited(self):
+        return time.time() - self.queued
+
+class Scheduler:
+    """
+    Starts launched programs only when their declared resources are free.
+    Each program declares GPU slots, CPU cores and memory in its metadata
+    header. Requests are served in order, but a later request that fits
+    starts ahead of one that does not, until the oldest request has waited
+    backfill_limit seconds. Jobs are given their own GPUs and cores through
+    CUDA_VISIBLE_DEVICES and CPU affinity.
+    """
+    def __init__(self, runner, capacity, backfill_limit=60.0, interval=0.5):
+        self.runner = runner
+        self.capacity = capacity
+        self.backfill_limit = backfill_limit
+        self.interval = interval
+        self.queue = []
+        self.failed = []  # QueuedJobs that could not be started, with their error
+        self.allocations = {}  # job -> {"gpu": [...], "cpu": [...], "memory": bytes}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def needs(self, program):
+        """
+        The program's request, capped at the machine's capacity so an
+        oversized request still runs once the machine is otherwise idle.
+        """
+        resources = program.resources
+        return {
+            "gpu": min(resources.get("gpu", 0), len(self.capacity["gpu"])),
+            "cpu": min(resources.get("cpu", 0), len(self.capacity["cpu"])),
+            "memory": min(resources.get("memory", 0), self.capacity["memory"]),
+        }
+
+    def submit(self, program):
+        """
+        Starts the program now if it fits, otherwise queues it. Returns the
+        Job or QueuedJob, and raises the error when starting it now failed.
+        """
+        with self._lock:
+            queued = QueuedJob(self._next_id, program)
+            self._next_id += 1
+            self.queue.append(queued)
+            started = self._schedule()
+            if queued.error is not None:
+                self.failed.remove(queued)
+                raise queued.error
+        return started.get(queued, queued)
+
+    def free(self):
+        used_gpus = {g for a in self.allocations.values() for g in a["gpu"]}
+        used_cpus = {c for a in self.allocations.values() for c in a["cpu"]}
+        return {
+            "gpu": [g for g in self.capacity["gpu"] if g not in used_gpus],
+            "cpu": [c for c in self.capacity["cpu"] if c not in used_cpus],
+            "memory": self.capacity["memory"] - sum(a["memory"] for a in self.allocations.values()),
+        }
+
+    def _release_finished(self):
+        for job in [job for job in self.allocations if not job.running]:
+            del self.allocations[job]
+
+    def _schedule(self):
+        """Starts every queued request that fits. Returns {QueuedJob: Job} for the ones started."""
+        self._release_finished()
+        started = {}
+        free = self.free()
+        live_memory = available_memory_bytes()
+        for queued in list(self.queue):
+            needs = self.needs(queued.program)
+            # An explicit CPU list reserves exactly those cores, as far as they exist here
+            explicit = ([c for c in parse_cpu_list(queued.affinity) if c in self.capacity["cpu"]]
+                        if queued.affinity not in ("auto", "none") else [])
+            if explicit:
+                cores = explicit
+                fits_cpu = all(c in free["cpu"] for c in cores)
+            else:
+                cores = free["cpu"][:needs["cpu"]]
+                fits_cpu = needs["cpu"] <= len(free["cpu"])
+            if (not fits_cpu or needs["gpu"] > len(free["gpu"]) or needs["memory"] > free["memory"]
+                    or (live_memory is not None and needs["memory"] > live_memory)):
+                if queued.waited > self.backfill_limit:
+                    # Hold everything behind it so it is not starved by smaller jobs
+                    break
+                continue
+            allocation = {"gpu": free["gpu"][:needs["gpu"]], "cpu": cores, "memory": needs["memory"]}
+            self.queue.remove(queued)
+            try:
+                job = self._start(queued, allocation)
+            except Exception as e:
+                # Kept for the Jobs view, which lists it as failed
+                queued.error = e
+                self.failed.append(queued)
+                continue
+            self.allocations[job] = allocation
+            started[queued] = job
+            free = self.free()
+            if live_memory is not None:
+                live_memory -= needs["memory"]
+        return started
+
+    def _start(self, queued, allocation):
+        program = queued.program
+        pinned = allocation["cpu"] if queued.affinity != "none" else []
+        env = {}
+        if allocation["gpu"]:
+            env["CUDA_VISIBLE_DEVICES"] = ",".join(str(g) for g in allocation["gpu"])
+        if pinned:
+            # Thread pools size themselves to the core count, not the affinity mask
+            env["OMP_NUM_THREADS"] = str(len(pinned))
+        return self.runner.start(
+            program.name, program.script_path, program.launch_args,
+            env=env, cpus=pinned or None, nice=queued.nice,
+        )
+
+    def cancel(self, queued):
+        """Removes a queued request, or dismisses one that failed to start."""
+        with self._lock:
+            if queued in self.queue:
+                self.queue.remove(queued)
+            if queued in self.failed:
+                self.failed.remove(queued)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if self.queue or self.allocations:
+                    self._schedule()
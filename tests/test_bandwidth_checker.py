@@ -0,0 +1,110 @@
+import os
+import sys
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+import subprocess
+import ctypes.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(REPO_DIR, "programs"))
+
+try:
+    import BandwidthChecker
+except ImportError:
+    BandwidthChecker = None
+
+HAVE_IPERF3 = (BandwidthChecker is not None and shutil.which("iperf3") is not None
+               and ctypes.util.find_library("iperf") is not None)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server():
+    """An iperf3 server on localhost that exits after one test. Returns (process, port)."""
+    port = free_port()
+    process = subprocess.Popen(["iperf3", "-s", "-1", "-p", str(port), "-B", "127.0.0.1"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Wait until it listens; probing with a connection would use up its one test
+    for _ in range(50):
+        if process.poll() is not None:
+            raise RuntimeError("iperf3 -s exited")
+        with socket.socket() as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind(("127.0.0.1", port))
+            except OSError:
+                return process, port
+        time.sleep(0.1)
+    raise RuntimeError("iperf3 -s did not start listening")
+
+@unittest.skipUnless(HAVE_IPERF3, "needs the iperf3 binary, libiperf and the iperf3 module")
+class BandwidthCheckerTest(unittest.TestCase):
+    def setUp(self):
+        # Results are only saved when settings.ini sets logs_path; run where there is none
+        self.workdir = tempfile.mkdtemp()
+        self.previous_dir = os.getcwd()
+        os.chdir(self.workdir)
+        self.servers = []
+
+    def tearDown(self):
+        for process in self.servers:
+            process.kill()
+            process.wait()
+        os.chdir(self.previous_dir)
+        shutil.rmtree(self.workdir)
+
+    def server(self):
+        process, port = start_server()
+        self.servers.append(process)
+        return port
+
+    def run_test(self, direction, protocol):
+        # libiperf is not safe to run twice in one process, as in run_batch
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            return executor.submit(BandwidthChecker.run_test, "127.0.0.1", self.server(),
+                                   direction, protocol, 1, 1, 10_000_000).result()
+
+    def check_report(self, test, direction, protocol):
+        self.assertNotIn("error", test)
+        self.assertEqual((test["direction"], test["protocol"]), (direction, protocol))
+        self.assertGreater(test["sent_mbps"], 0)
+        self.assertGreater(test["received_mbps"], 0)
+        self.assertTrue(test["intervals"])
+        self.assertTrue(all(interval["mbps"] >= 0 for interval in test["intervals"]))
+
+    def test_tcp_upload(self):
+        self.check_report(self.run_test("upload", "tcp"), "upload", "tcp")
+
+    def test_tcp_reverse(self):
+        self.check_report(self.run_test("download", "tcp"), "download", "tcp")
+
+    def test_udp(self):
+        test = self.run_test("upload", "udp")
+        self.check_report(test, "upload", "udp")
+        self.assertGreaterEqual(test["lost_percent"], 0)
+        self.assertGreaterEqual(test["jitter_ms"], 0)
+
+    def test_batch_keeps_server_order(self):
+        ports = [self.server(), self.server()]
+        report = BandwidthChecker.run_batch({
+            "servers": [("127.0.0.1", port) for port in ports],
+            "duration": 1,
+            "num_streams": 1,
+            "directions": ["upload"],
+            "udp": False,
+            "udp_bandwidth": 10_000_000,
+            "max_workers": 2,
+        })
+        self.assertEqual([test["port"] for test in report["results"]], ports)
+        for test in report["results"]:
+            self.check_report(test, "upload", "tcp")
+
+if __name__ == "__main__":
+    unittest.main()
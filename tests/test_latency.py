@@ -0,0 +1,82 @@
+import os
+import sys
+import socket
+import asyncio
+import unittest
+from unittest import mock
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, REPO_DIR)
+
+import latency
+from latency import LatencyProber, LatencyRing
+
+def closed_port():
+    """A localhost port with nothing listening on it."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class LatencyProberTest(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_round_trip_to_listener(self):
+        prober = LatencyProber([{"host": "127.0.0.1", "port": self.port}], timeout=2, history=4, method="tcp")
+        results = asyncio.run(prober.probe_all())
+        sample = results[f"127.0.0.1:{self.port}"]
+        self.assertIsNotNone(sample)
+        self.assertGreaterEqual(sample, 0)
+        self.assertLess(sample, 2000)
+        self.assertTrue(prober.online())
+        stats = prober.primary_stats()
+        self.assertEqual(stats["p50"], sample)
+        self.assertEqual(stats["loss"], 0.0)
+
+    def test_refused_port_is_a_round_trip(self):
+        port = closed_port()
+        prober = LatencyProber([{"host": "127.0.0.1", "port": port}], timeout=2, method="tcp")
+        results = asyncio.run(prober.probe_all())
+        self.assertIsNotNone(results[f"127.0.0.1:{port}"])
+        self.assertTrue(prober.online())
+
+    def test_icmp_unavailable(self):
+        real_socket = socket.socket
+
+        def no_icmp(family=-1, type=-1, proto=-1, *args):
+            # As when net.ipv4.ping_group_range leaves the user out
+            if proto == socket.IPPROTO_ICMP:
+                raise PermissionError("ICMP echo sockets are not allowed")
+            return real_socket(family, type, proto, *args)
+
+        with mock.patch.object(latency.socket, "socket", no_icmp):
+            self.assertFalse(latency.icmp_available())
+            self.assertEqual(LatencyProber([{"host": "127.0.0.1", "port": self.port}]).method, "tcp")
+            prober = LatencyProber([{"host": "127.0.0.1"}], timeout=1, method="icmp")
+            results = asyncio.run(prober.probe_all())
+        self.assertIsNone(results["127.0.0.1:53"])
+        self.assertFalse(prober.online())
+        self.assertEqual(prober.primary_stats()["loss"], 1.0)
+
+class LatencyRingTest(unittest.TestCase):
+    def test_stats_with_loss(self):
+        ring = LatencyRing(size=4)
+        for sample in (10.0, None, 30.0, 20.0, 40.0):
+            ring.add(sample)
+        # The first sample has been overwritten
+        self.assertEqual(ring.ordered(), [None, 30.0, 20.0, 40.0])
+        stats = ring.stats()
+        self.assertEqual(stats["p50"], 30.0)
+        self.assertEqual(stats["p95"], 40.0)
+        self.assertEqual(stats["mean"], 30.0)
+        self.assertEqual(stats["jitter"], 15.0)
+        self.assertEqual(stats["loss"], 0.25)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,283 @@
+import os
+import io
+import sys
+import json
+import time
+import runpy
+import select
+import signal
+import socket
+import tempfile
+import importlib
+import subprocess
+from jobs import apply_placement
+
+REQUEST_LIMIT = 65536
+MODEL_CHECK_INTERVAL = 2.0
+
+def socket_folder():
+    """Per-user folder for worker sockets and logs."""
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    folder = os.path.join(base, f"terminax-{os.getuid()}")
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    return folder
+
+def worker_name(script_path):
+    return os.path.splitext(os.path.basename(script_path))[0]
+
+class WarmProcess:
+    """
+    A job forked by a warm worker. It is a child of the worker, not of the
+    menu, so its exit code and peak RSS arrive as a message on the socket.
+    Offers the parts of Popen that JobRunner uses.
+    """
+    def __init__(self, pid, stdin, stdout, connection):
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.returncode = None
+        self.connection = connection
+        self._reply = b""
+
+    def reap(self):
+        """Returns (exit_code, peak_rss_kb) once the job has finished, otherwise None."""
+        try:
+            data = self.connection.recv(4096)
+        except BlockingIOError:
+            return None
+        except OSError:
+            data = b""
+        self._reply += data
+        if b"\n" in self._reply:
+            reply = json.loads(self._reply.split(b"\n", 1)[0])
+            self.connection.close()
+            return reply["exit_code"], reply["peak_rss_kb"]
+        if not data:
+            # The worker died without reporting, so the job went with it
+            self.connection.close()
+            return -signal.SIGKILL, 0
+        return None
+
+    def terminate(self):
+        try:
+            os.kill(self.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+class WarmPool:
+    """
+    Keeps one pre-forked worker per heavy program, with its modules imported
+    and, for inference, the model loaded. Each job is forked from the worker,
+    so it starts with everything already in memory.
+    """
+    def __init__(self, programs, settings_file="settings.ini"):
+        self.programs = programs
+        self.settings_file = settings_file
+        self.folder = socket_folder()
+        self.workers = {}
+
+    def socket_path(self, script_path):
+        return os.path.join(self.folder, worker_name(script_path) + ".sock")
+
+    def start(self):
+        """Starts the workers in the background; a worker serves jobs once its warm-up finishes."""
+        for script_path, options in self.programs.items():
+            socket_path = self.socket_path(script_path)
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            command = [sys.executable, os.path.abspath(__file__), script_path, socket_path,
+                       json.dumps(options.get("preload", [])), "1" if options.get("preload_model") else "0",
+                       self.settings_file]
+            with open(os.path.join(self.folder, worker_name(script_path) + ".log"), "a") as log:
+                self.workers[script_path] = subprocess.Popen(
+                    command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+    def launch(self, script_path, args, cwd=None, env=None, cpus=None, nice=0):
+        """
+        Runs script_path in its warm worker. Returns a WarmProcess, or None when
+        there is no ready worker so the caller can start a fresh interpreter.
+        """
+        worker = self.workers.get(script_path)
+        if worker is None or worker.poll() is not None:
+            return None
+        stdin_read, stdin_write = os.pipe()
+        stdout_read, stdout_write = os.pipe()
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.settimeout(2)
+            connection.connect(self.socket_path(script_path))
+            request = json.dumps({
+                "args": args, "cwd": cwd or os.getcwd(), "env": env or {}, "cpus": cpus, "nice": nice,
+            }).encode() + b"\n"
+            socket.send_fds(connection, [request], [stdin_read, stdout_write])
+            reply = b""
+            while not reply.endswith(b"\n"):
+                data = connection.recv(4096)
+                if not data:
+                    raise ConnectionError("worker closed the connection")
+                reply += data
+            pid = json.loads(reply)["pid"]
+        except (OSError, ValueError, KeyError):
+            connection.close()
+            os.close(stdin_write)
+            os.close(stdout_read)
+            return None
+        finally:
+            # The job holds its own copies of these ends now
+            os.close(stdin_read)
+            os.close(stdout_write)
+        connection.setblocking(False)
+        return WarmProcess(pid, os.fdopen(stdin_write, "wb", buffering=0),
+                           os.fdopen(stdout_read, "rb", buffering=0), connection)
+
+    def stop(self):
+        for script_path, worker in self.workers.items():
+            if worker.poll() is None:
+                worker.terminate()
+            try:
+                os.unlink(self.socket_path(script_path))
+            except OSError:
+                pass
+
+def model_state(settings_file):
+    """
+    What the preloaded model depends on: current_model_path, the weight file
+    load_model opens from it and the backend settings.
+    """
+    from appconfig import load_settings
+    from backends import model_cache_key, read_backend_settings
+
+    config = load_settings(settings_file)
+    model_path = config.get("Paths", "current_model_path", fallback="")
+    settings = read_backend_settings(settings_file)
+    return model_path, model_cache_key(model_path, settings), settings
+
+def run_job(script_path, connection, server, request, fds):
+    """Runs in the forked child: attach the job's pipes and run the script as __main__."""
+    server.close()
+    connection.close()
+    os.setsid()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    stdin_fd, stdout_fd = fds
+    os.dup2(stdin_fd, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stdout_fd, 2)
+    os.close(stdin_fd)
+    os.close(stdout_fd)
+    # Unbuffered like PYTHONUNBUFFERED so progress shows up as it is printed
+    sys.stdin = io.TextIOWrapper(io.FileIO(0, "r", closefd=False))
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), write_through=True)
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), write_through=True)
+
+    exit_code = 0
+    try:
+        os.environ.update(request.get("env", {}))
+        apply_placement(request.get("cpus"), request.get("nice", 0))
+        if request.get("cpus") and "torch" in sys.modules:
+            # The worker already sized torch's thread pool for the whole machine
+            sys.modules["torch"].set_num_threads(len(request["cpus"]))
+        os.chdir(request["cwd"])
+        sys.argv = [script_path] + request["args"]
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+def serve(script_path, socket_path, preload, preload_model, settings_file):
+    """
+    Worker main loop. The model is only loaded on the CPU here; CUDA is never
+    initialised in the worker because it does not survive fork.
+    """
+    started = time.perf_counter()
+    script_path = os.path.abspath(script_path)
+    sys.path.insert(0, os.path.dirname(script_path))
+    for module in preload:
+        importlib.import_module(module)
+
+    loaded_state = None
+    last_check = 0.0
+    def refresh_model():
+        nonlocal loaded_state
+        from backends import preload_model as load
+        state = model_state(settings_file)
+        if state != loaded_state:
+            loaded_state = state
+            print(f"Loading model {state[0]}", flush=True)
+            try:
+                load(state[0], state[2])
+            except Exception as e:
+                # Jobs still start warm and load the model themselves
+                print(f"Error preloading model: {e}", flush=True)
+
+    if preload_model:
+        refresh_model()
+    print(f"Warm worker for {script_path} ready in {time.perf_counter() - started:.1f}s", flush=True)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    parent = os.getppid()
+    jobs = {}  # pid -> connection to report the exit on
+
+    while os.getppid() == parent:
+        ready, _, _ = select.select([server], [], [], 0.2)
+        if ready:
+            connection, _ = server.accept()
+            try:
+                message, fds, _, _ = socket.recv_fds(connection, REQUEST_LIMIT, 2)
+                request = json.loads(message)
+                if len(fds) != 2:
+                    raise ValueError("expected stdin and stdout descriptors")
+                if preload_model:
+                    # Pick up a changed current_model_path before the job starts
+                    refresh_model()
+                    last_check = time.monotonic()
+            except (OSError, ValueError) as e:
+                print(f"Rejected job request: {e}", flush=True)
+                connection.close()
+                continue
+            pid = os.fork()
+            if pid == 0:
+                run_job(script_path, connection, server, request, fds)
+            for fd in fds:
+                os.close(fd)
+            connection.sendall(json.dumps({"pid": pid}).encode() + b"\n")
+            jobs[pid] = connection
+
+        while jobs:
+            pid, status, usage = os.wait4(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            connection = jobs.pop(pid, None)
+            if connection is not None:
+                try:
+                    # ru_maxrss is in kilobytes on Linux
+                    connection.sendall(json.dumps({"exit_code": os.waitstatus_to_exitcode(status),
+                                                   "peak_rss_kb": usage.ru_maxrss}).encode() + b"\n")
+                except OSError:
+                    pass
+                connection.close()
+
+        if preload_model and time.monotonic() - last_check >= MODEL_CHECK_INTERVAL:
+            refresh_model()
+            last_check = time.monotonic()
+
+    server.close()
+    os.unlink(socket_path)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 6:
+        print("Usage: python3 warm.py <script_path> <socket_path> <preload_json> <preload_model> <settings_file>")
+        sys.exit(1)
+    serve(sys.argv[1], sys.argv[2], json.loads(sys.argv[3]), sys.argv[4] == "1", sys.argv[5])